@@ -155,6 +155,28 @@ if 'DATABASE_URL' in os.environ:
 # }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Shared by every worker process: cached counts, search responses and pedigree
+# data are invalidated by bumping version keys, which a per-process cache
+# would keep from reaching the other workers. Redis when REDIS_URL is set,
+# otherwise a table in the database (created by a migration).
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'website_cache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
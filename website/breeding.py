@@ -0,0 +1,138 @@
+"""
+Breeding pair recommendations.
+
+Every living, non-breeding male of a strain is paired with every such female
+and the pairs are scored at once with NumPy broadcasting. Per-mouse features
+(age, genotype, availability) are loaded in one query; kinship comes from a
+``KinshipIndex`` over the whole strain and its ancestors, which is the
+expensive part and is cached until the strain's pedigree changes.
+"""
+import datetime as dt
+
+import numpy as np
+from django.core.cache import cache
+
+from .kinship import KinshipIndex
+from .pedigree import strain_pedigree_version
+
+KINSHIP_INDEX_CACHE_TIMEOUT = 60 * 60
+
+# Share of the score given to each criterion
+YIELD_WEIGHT = 0.5
+KINSHIP_WEIGHT = 0.3
+AGE_WEIGHT = 0.2
+
+# Kinship at which the kinship part of the score reaches zero (full siblings)
+KINSHIP_CEILING = 0.25
+
+# Age window (in days) in which a mouse is considered a prime breeder, and the
+# ages either side of it at which its age score falls to zero
+PRIME_AGE_DAYS = (42, 240)
+AGE_LIMIT_DAYS = (28, 365)
+
+# Probability of passing on the modified allele for each genotype. Mice that
+# have not been genotyped ('na') are treated as unknown and never count
+# towards the target genotype.
+ALLELE_PROBABILITY = {'wt': 0.0, 'ht': 0.5, 'ko': 1.0}
+
+
+def age_scores(ages):
+    """Score ages in days: 1 inside the prime window, falling linearly to 0 at the limits."""
+    young, old = AGE_LIMIT_DAYS
+    prime_start, prime_end = PRIME_AGE_DAYS
+    rising = (ages - young) / (prime_start - young)
+    falling = (old - ages) / (old - prime_end)
+    return np.clip(np.minimum(rising, falling), 0.0, 1.0)
+
+
+def genotype_yield(male_alleles, female_alleles, target):
+    """
+    Expected share of offspring with the ``target`` genotype for every
+    male x female pair, given each parent's probability of passing on the
+    modified allele (NaN when unknown).
+    """
+    male = male_alleles[:, np.newaxis]
+    female = female_alleles[np.newaxis, :]
+    if target == 'ko':
+        result = male * female
+    elif target == 'ht':
+        result = male * (1 - female) + female * (1 - male)
+    else:
+        result = (1 - male) * (1 - female)
+    return np.nan_to_num(result, nan=0.0)
+
+
+def _features(mice, today):
+    """Vectorise the mice of one sex: ids, age scores and allele probabilities."""
+    ids = np.array([mouse_id for mouse_id, _, _ in mice], dtype=np.int64)
+    ages = np.array([(today - dob).days for _, dob, _ in mice], dtype=np.float32)
+    alleles = np.array([ALLELE_PROBABILITY.get(genotype, np.nan) for _, _, genotype in mice], dtype=np.float32)
+    return ids, age_scores(ages), alleles
+
+
+def recommend_pairs(strain_id, target_genotype=None, limit=10, today=None):
+    """
+    Rank the available male x female pairs of a strain, best first.
+
+    Pairs score higher for low kinship, a high expected share of offspring
+    with ``target_genotype`` (ignored when not given) and both parents being
+    of prime breeding age. Returns at most ``limit`` dicts.
+    """
+    from .models import Mouse
+
+    today = today or dt.date.today()
+    available = Mouse.objects.filter(strain_id=strain_id, state='alive').order_by('mouse_id')
+    candidates = list(available.values_list('mouse_id', 'dob', 'genotype', 'sex'))
+    males = [mouse[:3] for mouse in candidates if mouse[3] == 'M']
+    females = [mouse[:3] for mouse in candidates if mouse[3] == 'F']
+    if not males or not females:
+        return []
+
+    index = strain_kinship_index(strain_id, [mouse_id for mouse_id, _, _, _ in candidates])
+    return _rank_pairs(index, males, females, target_genotype, limit, today)
+
+
+def strain_kinship_index(strain_id, mouse_ids=()):
+    """
+    ``KinshipIndex`` of the whole strain, cached until its pedigree changes.
+    Rebuilt early if any of ``mouse_ids`` is missing from it, e.g. a mouse
+    moved over from another strain.
+    """
+    key = f"kinship-index:{strain_id}:{strain_pedigree_version(strain_id)}"
+    index = cache.get(key)
+    if index is None or any(mouse_id not in index.positions for mouse_id in mouse_ids):
+        index = KinshipIndex.for_strain(strain_id)
+        cache.set(key, index, KINSHIP_INDEX_CACHE_TIMEOUT)
+    return index
+
+
+def _rank_pairs(index, males, females, target_genotype, limit, today):
+    """Score every male x female pair and return the best ``limit`` as dicts."""
+
+    male_ids, male_age, male_alleles = _features(males, today)
+    female_ids, female_age, female_alleles = _features(females, today)
+
+    kinship = index.pairs(male_ids.tolist(), female_ids.tolist())
+
+    scores = KINSHIP_WEIGHT * (1.0 - np.clip(kinship / KINSHIP_CEILING, 0.0, 1.0))
+    scores += AGE_WEIGHT * np.outer(male_age, female_age)
+    if target_genotype:
+        expected_yield = genotype_yield(male_alleles, female_alleles, target_genotype)
+        scores += YIELD_WEIGHT * expected_yield
+    else:
+        expected_yield = None
+
+    # Only sort the best ``limit`` pairs rather than all of them
+    flat = scores.ravel()
+    limit = min(limit, flat.size)
+    best = np.argpartition(-flat, limit - 1)[:limit]
+    best = best[np.argsort(-flat[best], kind='stable')]
+    rows, columns = np.unravel_index(best, scores.shape)
+
+    return [{
+        'male_id': int(male_ids[row]),
+        'female_id': int(female_ids[column]),
+        'score': round(float(scores[row, column]), 4),
+        'kinship': round(float(kinship[row, column]), 4),
+        'expected_yield': None if expected_yield is None else round(float(expected_yield[row, column]), 4),
+    } for row, column in zip(rows, columns)]
@@ -0,0 +1,106 @@
+"""
+Cached result counts for listings.
+
+Pages that say "N results" do not need a live ``COUNT(*)`` on every request.
+``cached_count`` keeps the count of a listing under a key made of the view,
+the user, the normalized filter and a version token for every model the
+listing reads. Saving or deleting a row of one of ``COUNTED_MODELS`` (see
+models.py) replaces that model's token once the transaction commits, so
+affected counts are recomputed on their next use; writes that bypass signals (bulk imports, ``update()``) call
+``touch_counts`` or are picked up when the short timeout expires.
+
+A listing with no filter at all on a large table is not counted: the row
+estimate kept by the database planner is shown instead, as "about N".
+"""
+import hashlib
+import uuid
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db import connection
+
+COUNT_CACHE_TIMEOUT = 60
+
+# Unfiltered tables estimated above this many rows are not counted exactly
+ESTIMATE_THRESHOLD = 100_000
+
+
+class ResultCount(NamedTuple):
+    value: int
+    approximate: bool = False
+
+    def __str__(self):
+        return f"about {self.value:,}" if self.approximate else str(self.value)
+
+
+def _version_key(model):
+    return f"count-version:{model._meta.label_lower}"
+
+
+def count_version(models):
+    """Opaque token that changes whenever a row of any of ``models`` is written."""
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return ':'.join(versions[key] for key in keys)
+
+
+def touch_counts(*models):
+    """Invalidate every cached count that reads any of ``models``."""
+    cache.set_many({_version_key(model): uuid.uuid4().hex for model in models}, None)
+
+
+def estimated_rows(model):
+    """Row count of the model's table according to the planner statistics, or None."""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)", [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+                [table],
+            )
+        elif connection.vendor == 'sqlite':
+            # sqlite_stat1 only exists once ANALYZE has run
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+    # sqlite_stat1 stores "rows [rows per key...]"
+    estimate = int(str(row[0]).split()[0])
+    # PostgreSQL reports -1 for tables never analyzed
+    return estimate if estimate >= 0 else None
+
+
+def cached_count(queryset, view, user=None, filters='', depends_on=()):
+    """
+    ``ResultCount`` of ``queryset`` as listed by ``view`` for ``user`` with
+    ``filters`` (any string identifying the filter, e.g. the normalized search
+    query). ``depends_on`` names further models whose writes change the count.
+    """
+    models = (queryset.model, *depends_on)
+    token = f"{view}:{user.pk if user else ''}:{filters}:{count_version(models)}"
+    key = f"count:{hashlib.md5(token.encode()).hexdigest()}"
+    count = cache.get(key)
+    if count is not None:
+        return ResultCount(*count)
+
+    count = None
+    query = queryset.query
+    if not query.where and not query.distinct and not query.is_sliced:
+        estimate = estimated_rows(queryset.model)
+        if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+            count = ResultCount(estimate, approximate=True)
+    if count is None:
+        count = ResultCount(queryset.count())
+    cache.set(key, tuple(count), COUNT_CACHE_TIMEOUT)
+    return count
@@ -1,8 +1,58 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, PasswordResetForm
 from django.core.exceptions import ValidationError
+from django.urls import reverse_lazy
+from django.utils.http import urlencode
 from django.utils.translation import gettext_lazy as _
 from .models import *  # Import your custom User model
+from .kinship import pair_kinship
+
+
+class TypeaheadSelect(forms.Select):
+    """
+    A select for a model choice field that only renders the chosen option.
+    The rest are fetched as the user types from a typeahead endpoint
+    (``url`` with the fixed query ``params``), so the page never lists the
+    whole table. Pages using it include partials/typeahead_script.html.
+    """
+    template_name = 'widgets/typeahead_select.html'
+
+    def __init__(self, url, params=None, attrs=None):
+        super().__init__(attrs={'class': 'form-select', **(attrs or {})})
+        self.url = url
+        self.params = params or {}
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        url = str(self.url)
+        if self.params:
+            url += '?' + urlencode(self.params, doseq=True)
+        context['widget']['typeahead_url'] = url
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        field = self.choices.field
+        selected = [v for v in value if v]
+        choices = [('', field.empty_label or '')] if field.empty_label is not None else []
+        if selected:
+            try:
+                chosen = list(field.queryset.filter(pk__in=selected))
+            except (ValueError, TypeError, ValidationError):
+                chosen = []
+            choices += [(obj.pk, field.label_from_instance(obj)) for obj in chosen]
+        all_choices, self.choices = self.choices, choices
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = all_choices
+
+
+def mouse_typeahead(**params):
+    return TypeaheadSelect(reverse_lazy('mouse_typeahead'), params)
+
+
+def cage_typeahead():
+    return TypeaheadSelect(reverse_lazy('cage_typeahead'))
 
 
 class UserPasswordResetForm(PasswordResetForm):
@@ -94,6 +144,8 @@ class AddMouseForm(forms.ModelForm):
             'clipped_date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
             'cull_date': forms.DateTimeInput(attrs={'type': 'datetime-local', 'class': 'form-control'}),
             'weaned_date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+            'father': mouse_typeahead(sex='M'),
+            'mother': mouse_typeahead(sex='F'),
         }
 
     def clean_earmark(self):
@@ -177,6 +229,19 @@ class AddMouseForm(forms.ModelForm):
 
         return instance
 
+class ImportMiceForm(forms.Form):
+    file = forms.FileField(label='CSV or TSV file')
+    team = forms.ModelChoiceField(queryset=Team.objects.none(), required=False, label='Keeping team')
+    create_strains = forms.BooleanField(required=False, initial=True, label='Create strains that do not exist yet')
+    dry_run = forms.BooleanField(required=False, label='Only check the file, do not import')
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user', None)
+        super().__init__(*args, **kwargs)
+        # Same team choices as AddMouseForm
+        if user is not None:
+            self.fields['team'].queryset = Team.objects.filter(teammembership__user=user)
+
 class TeamForm(forms.ModelForm):
     class Meta:
         model = Team
@@ -195,6 +260,9 @@ class TransferRequestForm(forms.ModelForm):
         model = TransferRequest
         fields = ['mouse', 'source_cage', 'destination_cage', 'comments']
         widgets = {
+            'mouse': mouse_typeahead(exclude_state='deceased'),
+            'source_cage': cage_typeahead(),
+            'destination_cage': cage_typeahead(),
             'comments': forms.Textarea(attrs={'rows': 4, 'placeholder': 'Enter any additional comments...'}),
         }
 
@@ -246,6 +314,9 @@ class BreedingRequestForm(forms.ModelForm):
         model = BreedingRequest
         fields = ['male_mouse', 'female_mouse', 'cage', 'comments']
         widgets = {
+            'male_mouse': mouse_typeahead(sex='M'),
+            'female_mouse': mouse_typeahead(sex='F'),
+            'cage': cage_typeahead(),
             'comments': forms.Textarea(attrs={'rows': 4, 'placeholder': 'Enter any additional comments...'}),
         }
 
@@ -255,12 +326,26 @@ class BreedingRequestForm(forms.ModelForm):
         self.fields['male_mouse'].queryset = Mouse.objects.filter(sex='M')
         self.fields['female_mouse'].queryset = Mouse.objects.filter(sex='F')
         self.fields['cage'].queryset = Cage.objects.all()
+        # Kinship of the selected pair, filled in by clean()
+        self.kinship = None
+
+    def clean(self):
+        cleaned_data = super().clean()
+        male_mouse = cleaned_data.get('male_mouse')
+        female_mouse = cleaned_data.get('female_mouse')
+
+        # Record how related the pair is so the breeder can see it
+        if male_mouse and female_mouse:
+            self.kinship = pair_kinship(male_mouse, female_mouse)
+
+        return cleaned_data
 
 class CullingRequestForm(forms.ModelForm):
     class Meta:
         model = CullingRequest
         fields = ['mouse', 'comments']
         widgets = {
+            'mouse': mouse_typeahead(exclude_state='deceased'),
             'comments': forms.Textarea(attrs={'rows': 4, 'placeholder': 'Enter any additional comments...'}),
         }
 
@@ -0,0 +1,131 @@
+"""
+Point-in-time view of the colony.
+
+Cage placements, keepers and breeding pairs are stored as intervals
+(``start_date``/``end_date``), so their state at a moment is one indexed query
+each. Mouse fields (``Mouse.HISTORY_FIELDS``) are rebuilt from the
+``MouseChange`` log: start from the latest ``ColonySnapshot`` taken at or
+before the moment and replay only the changes logged between the two, so the
+work depends on the snapshot interval rather than the age of the colony.
+Snapshots are taken with the ``snapshot_colony`` command, e.g. nightly.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .models import Breed, CageHistory, ColonySnapshot, Mouse, MouseChange, MouseKeeper, MouseSnapshot
+
+SNAPSHOT_BATCH_SIZE = 2000
+
+
+def _encoded(values):
+    """Round-trip values through the JSON encoder so they match what the log stores."""
+    return json.loads(json.dumps(values, cls=DjangoJSONEncoder))
+
+
+def take_snapshot():
+    """Materialise the history fields of every mouse as of now."""
+    fields = Mouse.HISTORY_FIELDS
+    with transaction.atomic():
+        snapshot = ColonySnapshot.objects.create(taken_at=timezone.now())
+        batch = []
+        for mouse_id, *values in Mouse.objects.values_list('mouse_id', *fields).iterator(chunk_size=SNAPSHOT_BATCH_SIZE):
+            batch.append(MouseSnapshot(snapshot=snapshot, mouse_id=mouse_id, values=dict(zip(fields, values))))
+            if len(batch) >= SNAPSHOT_BATCH_SIZE:
+                MouseSnapshot.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            MouseSnapshot.objects.bulk_create(batch)
+    return snapshot
+
+
+def earliest_moment():
+    """The first moment the history covers (the oldest logged change or snapshot), or None."""
+    moments = [
+        MouseChange.objects.aggregate(first=Min('changed_at'))['first'],
+        ColonySnapshot.objects.aggregate(first=Min('taken_at'))['first'],
+    ]
+    moments = [moment for moment in moments if moment is not None]
+    return min(moments) if moments else None
+
+
+def _only(queryset, mouse_ids, field='mouse_id'):
+    return queryset if mouse_ids is None else queryset.filter(**{f'{field}__in': mouse_ids})
+
+
+def mouse_values_at(moment, mouse_ids=None):
+    """
+    ``{mouse_id: {field: value}}`` of the history fields of every mouse (or
+    only those in ``mouse_ids``) that existed at ``moment``, with dates as ISO
+    strings.
+    """
+    snapshot = ColonySnapshot.objects.filter(taken_at__lte=moment).order_by('-taken_at').first()
+    values = {}
+    changes = _only(MouseChange.objects.filter(changed_at__lte=moment), mouse_ids)
+    if snapshot is not None:
+        values = dict(_only(snapshot.mice.all(), mouse_ids).values_list('mouse_id', 'values'))
+        changes = changes.filter(changed_at__gt=snapshot.taken_at)
+
+    for mouse_id, created, diff in changes.order_by('changed_at', 'id').values_list('mouse_id', 'created', 'changes'):
+        if created:
+            values[mouse_id] = {field: new for field, (old, new) in diff.items()}
+        elif mouse_id in values:
+            values[mouse_id].update({field: new for field, (old, new) in diff.items()})
+
+    # Mice from before the change log that no snapshot covers: take their
+    # current values and undo whatever changed after the moment.
+    legacy = (
+        _only(Mouse.objects.filter(dob__lte=timezone.localdate(moment)), mouse_ids)
+        .exclude(changes__created=True)
+        .exclude(mouse_id__in=MouseSnapshot.objects.filter(snapshot=snapshot).values('mouse_id'))
+    )
+    unlogged = {
+        mouse_id: _encoded(dict(zip(Mouse.HISTORY_FIELDS, current)))
+        for mouse_id, *current in legacy.values_list('mouse_id', *Mouse.HISTORY_FIELDS)
+        if mouse_id not in values
+    }
+    if unlogged:
+        for mouse_id, diff in MouseChange.objects.filter(
+            mouse__in=legacy, changed_at__gt=moment
+        ).order_by('-changed_at', '-id').values_list('mouse_id', 'changes'):
+            if mouse_id in unlogged:
+                unlogged[mouse_id].update({field: old for field, (old, new) in diff.items()})
+        values.update(unlogged)
+    return values
+
+
+def _in_effect(moment):
+    return Q(start_date__lte=moment) & (Q(end_date__isnull=True) | Q(end_date__gt=moment))
+
+
+def colony_at(moment, mouse_ids=None):
+    """
+    Reconstruct the colony (or only the mice in ``mouse_ids`` and the pairs
+    they sire) as of ``moment``. Returns ``{'mice': {mouse_id:
+    {...history fields, 'cage_id', 'keepers'}}, 'breeding_pairs': [...]}``
+    where keepers are ``{'user_id', 'team_id'}`` dicts and breeding pairs
+    ``{'male_id', 'female_id', 'cage_id'}`` dicts.
+    """
+    mice = mouse_values_at(moment, mouse_ids)
+    for row in mice.values():
+        row['cage_id'] = None
+        row['keepers'] = []
+
+    for mouse_id, cage_id in _only(CageHistory.objects.at(moment), mouse_ids).values_list('mouse_id', 'cage_id'):
+        if mouse_id in mice:
+            mice[mouse_id]['cage_id'] = cage_id
+    for mouse_id, user_id, team_id in _only(MouseKeeper.objects.filter(_in_effect(moment)), mouse_ids).values_list(
+        'mouse_id', 'user_id', 'team_id'
+    ):
+        if mouse_id in mice:
+            mice[mouse_id]['keepers'].append({'user_id': user_id, 'team_id': team_id})
+
+    breeding_pairs = [
+        {'male_id': male_id, 'female_id': female_id, 'cage_id': cage_id}
+        for male_id, female_id, cage_id in _only(Breed.objects.filter(_in_effect(moment)), mouse_ids, 'male_id')
+        .values_list('male_id', 'female_id', 'cage_id')
+    ]
+    return {'mice': mice, 'breeding_pairs': breeding_pairs}
@@ -0,0 +1,357 @@
+"""
+Bulk mouse import from CSV or TSV files.
+
+The file is read as a stream and handled ``IMPORT_CHUNK_SIZE`` rows at a time.
+Every chunk is validated, its strains, parents and cages are resolved with a
+few set-based queries, and its ``Mouse``, ``MouseKeeper`` and ``CageHistory``
+rows are written with ``bulk_create`` in one transaction. Invalid rows are
+skipped and reported by line number, the rest of the file is still imported.
+
+Columns are matched by header name, in any order:
+
+    strain, tube_id, dob, sex        required
+    father, mother                   tube IDs of the parents
+    father_strain, mother_strain     strain of a parent, when not the mouse's own
+    earmark                          clipped positions, e.g. "TL BR"
+    clipped_date, state, cull_date, weaned, weaned_date, genotype
+    cage                             cage number to put the mouse in
+
+Parents must already be in the database or appear earlier in the file.
+"""
+import csv
+import datetime as dt
+import itertools
+import re
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .access import refresh_access
+from .counts import touch_counts
+from .models import Cage, CageHistory, Mouse, MouseChange, MouseKeeper, Strain
+from .search_index import refresh_documents
+from .pedigree import add_lineage
+
+IMPORT_CHUNK_SIZE = 2000
+
+REQUIRED_COLUMNS = ('strain', 'tube_id', 'dob', 'sex')
+OPTIONAL_COLUMNS = (
+    'father', 'mother', 'father_strain', 'mother_strain', 'earmark', 'clipped_date',
+    'state', 'cull_date', 'weaned', 'weaned_date', 'genotype', 'cage',
+)
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+FALSE_VALUES = {'', '0', 'false', 'no', 'n'}
+
+SEXES = {code for code, _ in Mouse.SEX_CHOICES}
+STATES = {code for code, _ in Mouse.STATE_CHOICES}
+GENOTYPES = {code for code, _ in Mouse.GENOTYPE_CHOICES}
+EARMARKS = {code for code, _ in Mouse.CLIPPED_CHOICES}
+
+
+class ImportReport:
+    """Outcome of an import: how many mice were created and which lines failed."""
+
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+def _date(value, column):
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValidationError(f"{column}: '{value}' is not a date (use YYYY-MM-DD).")
+    return parsed
+
+
+def _datetime(value, column):
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError(f"{column}: '{value}' is not a date/time (use YYYY-MM-DD HH:MM).")
+        parsed = dt.datetime.combine(day, dt.time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _tube_id(value, column):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError(f"{column}: '{value}' is not a whole number.")
+
+
+def parse_row(row):
+    """Validate one row and convert it to Python values. Raises ValidationError."""
+    for column in REQUIRED_COLUMNS:
+        if not row.get(column):
+            raise ValidationError(f"{column} is required.")
+
+    sex = row['sex'].upper()
+    if sex not in SEXES:
+        raise ValidationError(f"sex: '{row['sex']}' must be M or F.")
+    state = row.get('state', '').lower() or 'alive'
+    if state not in STATES:
+        raise ValidationError(f"state: '{row['state']}' is not one of {', '.join(sorted(STATES))}.")
+    genotype = row.get('genotype', '').lower() or 'na'
+    if genotype not in GENOTYPES:
+        raise ValidationError(f"genotype: '{row['genotype']}' is not one of {', '.join(sorted(GENOTYPES))}.")
+    earmark = [code for code in re.split(r'[\s,;]+', row.get('earmark', '').upper()) if code]
+    if set(earmark) - EARMARKS:
+        raise ValidationError(f"earmark: '{row['earmark']}' may only contain {', '.join(sorted(EARMARKS))}.")
+
+    weaned_text = row.get('weaned', '').lower()
+    if weaned_text not in TRUE_VALUES | FALSE_VALUES:
+        raise ValidationError(f"weaned: '{row['weaned']}' must be yes or no.")
+    weaned = weaned_text in TRUE_VALUES
+    weaned_date = _date(row.get('weaned_date'), 'weaned_date')
+    # Same rules as AddMouseForm
+    if weaned and not weaned_date:
+        raise ValidationError("weaned_date is required when weaned is yes.")
+    if weaned_date and not weaned:
+        raise ValidationError("weaned_date given but weaned is not yes.")
+
+    strain = row['strain']
+    return {
+        'strain': strain,
+        'tube_id': _tube_id(row['tube_id'], 'tube_id'),
+        'dob': _date(row['dob'], 'dob'),
+        'sex': sex,
+        'father': (row.get('father_strain') or strain, _tube_id(row['father'], 'father')) if row.get('father') else None,
+        'mother': (row.get('mother_strain') or strain, _tube_id(row['mother'], 'mother')) if row.get('mother') else None,
+        # Stored comma separated, as AddMouseForm does
+        'earmark': ','.join(earmark),
+        'clipped_date': _date(row.get('clipped_date'), 'clipped_date'),
+        'state': state,
+        'cull_date': _datetime(row.get('cull_date'), 'cull_date'),
+        'weaned': weaned,
+        'weaned_date': weaned_date,
+        'genotype': genotype,
+        'cage': row.get('cage') or None,
+    }
+
+
+class MouseImporter:
+    """
+    Imports mice for a keeper (a user, or a team when one is given), creating
+    strains that do not exist yet unless ``create_strains`` is off.
+    """
+
+    def __init__(self, user=None, team=None, create_strains=True, chunk_size=IMPORT_CHUNK_SIZE):
+        if user is None and team is None:
+            raise ValueError("Imported mice need a keeper: pass a user or a team.")
+        self.user = user
+        self.team = team
+        self.create_strains = create_strains
+        self.chunk_size = chunk_size
+        self.report = ImportReport()
+        self.strains = {}
+        # (strain_id, tube_id) -> (mouse_id, sex) of every mouse looked up or imported so far
+        self.known = {}
+
+    def run(self, file, delimiter=None, dry_run=False):
+        """Import every row of a text file. With ``dry_run`` nothing is kept."""
+        first_line = file.readline()
+        if delimiter is None:
+            delimiter = '\t' if '\t' in first_line else ','
+        reader = csv.DictReader(itertools.chain([first_line], file), delimiter=delimiter)
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+        missing = [column for column in REQUIRED_COLUMNS if column not in reader.fieldnames]
+        if missing:
+            self.report.add_error(1, f"Missing columns: {', '.join(missing)}.")
+            return self.report
+
+        rows = (
+            (reader.line_num, {key: (value or '').strip() for key, value in row.items() if key})
+            for row in reader
+        )
+        chunks = iter(lambda: list(itertools.islice(rows, self.chunk_size)), [])
+        if dry_run:
+            with transaction.atomic():
+                for chunk in chunks:
+                    self.import_chunk(chunk)
+                transaction.set_rollback(True)
+        else:
+            # One transaction per chunk, so a failure part way keeps the chunks before it
+            for chunk in chunks:
+                self.import_chunk(chunk)
+        # Parse errors are found before lookup errors within a chunk
+        self.report.errors.sort()
+        return self.report
+
+    def import_chunk(self, chunk):
+        """Validate and write a list of ``(line, row)`` pairs."""
+        parsed = []
+        for line, row in chunk:
+            try:
+                parsed.append((line, parse_row(row)))
+            except ValidationError as error:
+                self.report.add_error(line, error.messages[0])
+
+        self._load_strains(parsed)
+        self._load_mice(parsed)
+        cages = dict(Cage.objects.filter(
+            cage_number__in={values['cage'] for _, values in parsed if values['cage']}
+        ).values_list('cage_number', 'cage_id'))
+
+        mice = []
+        pending = {}
+        links = []
+        for line, values in parsed:
+            try:
+                if values['cage'] and values['cage'] not in cages:
+                    raise ValidationError(f"cage: '{values['cage']}' does not exist.")
+                mouse, parent_keys = self._build_mouse(values, pending, cages.get(values['cage']))
+            except ValidationError as error:
+                self.report.add_error(line, error.messages[0])
+                continue
+            pending[(mouse.strain_id, mouse.tube_id)] = mouse
+            mice.append(mouse)
+            links.append(parent_keys)
+        if not mice:
+            return
+
+        with transaction.atomic():
+            Mouse.objects.bulk_create(mice, batch_size=self.chunk_size)
+            # Not every backend hands back primary keys from bulk_create, so read them back
+            ids = self._mouse_ids(pending)
+            for mouse in mice:
+                mouse.mouse_id = ids[(mouse.strain_id, mouse.tube_id)]
+                self.known[(mouse.strain_id, mouse.tube_id)] = (mouse.mouse_id, mouse.sex)
+
+            # Parents imported in this same chunk only have an id now
+            linked = []
+            for mouse, (father_key, mother_key) in zip(mice, links):
+                if father_key or mother_key:
+                    mouse.father_id = ids[father_key] if father_key else mouse.father_id
+                    mouse.mother_id = ids[mother_key] if mother_key else mouse.mother_id
+                    linked.append(mouse)
+            if linked:
+                Mouse.objects.bulk_update(linked, ['father', 'mother'], batch_size=self.chunk_size)
+
+            now = timezone.now()
+            MouseKeeper.objects.bulk_create([
+                MouseKeeper(mouse_id=mouse.mouse_id, user=None if self.team else self.user,
+                            team=self.team, start_date=now)
+                for mouse in mice
+            ], batch_size=self.chunk_size)
+            refresh_access(mouse_ids=[mouse.mouse_id for mouse in mice])
+            refresh_documents([mouse.mouse_id for mouse in mice])
+            CageHistory.objects.bulk_create([
+                CageHistory(cage_id_id=mouse.current_cage_id, mouse_id_id=mouse.mouse_id, start_date=now)
+                for mouse in mice if mouse.current_cage_id
+            ], batch_size=self.chunk_size)
+
+            # bulk_create sends no post_save, so log the initial values and
+            # build the pedigree rows here
+            MouseChange.objects.bulk_create([
+                MouseChange(mouse_id=mouse.mouse_id, changed_at=now, created=True, changes={
+                    field: [None, getattr(mouse, field)] for field in Mouse.HISTORY_FIELDS
+                })
+                for mouse in mice
+            ], batch_size=self.chunk_size)
+            add_lineage({
+                mouse.mouse_id: [p for p in (mouse.father_id, mouse.mother_id) if p]
+                for mouse in mice if mouse.father_id or mouse.mother_id
+            }, {mouse.strain_id for mouse in mice})
+            transaction.on_commit(lambda: touch_counts(Mouse, MouseKeeper, CageHistory))
+        self.report.created += len(mice)
+
+    def _load_strains(self, parsed):
+        names = set()
+        for _, values in parsed:
+            names.add(values['strain'])
+            names.update(key[0] for key in (values['father'], values['mother']) if key)
+        names -= set(self.strains)
+        if not names:
+            return
+        self.strains.update(Strain.objects.filter(name__in=names).values_list('name', 'id'))
+        new_names = {values['strain'] for _, values in parsed} - set(self.strains)
+        if new_names and self.create_strains:
+            Strain.objects.bulk_create([Strain(name=name) for name in sorted(new_names)])
+            self.strains.update(Strain.objects.filter(name__in=new_names).values_list('name', 'id'))
+
+    def _load_mice(self, parsed):
+        """Look up the mice of this chunk (for duplicates) and their parents in one query."""
+        wanted = {}
+        for _, values in parsed:
+            for key in ((values['strain'], values['tube_id']), values['father'], values['mother']):
+                if not key:
+                    continue
+                strain, tube_id = key
+                if strain in self.strains and (self.strains[strain], tube_id) not in self.known:
+                    wanted.setdefault(self.strains[strain], set()).add(tube_id)
+        if not wanted:
+            return
+        query = reduce(or_, (Q(strain_id=strain_id, tube_id__in=tube_ids) for strain_id, tube_ids in wanted.items()))
+        for mouse_id, strain_id, tube_id, sex in Mouse.objects.filter(query).values_list(
+            'mouse_id', 'strain_id', 'tube_id', 'sex'
+        ):
+            self.known[(strain_id, tube_id)] = (mouse_id, sex)
+
+    def _mouse_ids(self, keys):
+        query = reduce(or_, (
+            Q(strain_id=strain_id, tube_id__in=[tube_id for _, tube_id in group])
+            for strain_id, group in itertools.groupby(sorted(keys), key=lambda key: key[0])
+        ))
+        return {(strain_id, tube_id): mouse_id for mouse_id, strain_id, tube_id in Mouse.objects.filter(query)
+                .values_list('mouse_id', 'strain_id', 'tube_id')}
+
+    def _build_mouse(self, values, pending, cage_id):
+        """
+        Build an unsaved Mouse. Returns it with the keys of any parents that
+        are still waiting to be inserted in the same chunk.
+        """
+        if values['strain'] not in self.strains:
+            raise ValidationError(f"strain: '{values['strain']}' does not exist.")
+        key = (self.strains[values['strain']], values['tube_id'])
+        if key in self.known or key in pending:
+            raise ValidationError(f"Tube ID {values['tube_id']} already exists in strain {values['strain']}.")
+
+        mouse = Mouse(
+            strain_id=key[0], tube_id=values['tube_id'], dob=values['dob'], sex=values['sex'],
+            earmark=values['earmark'], clipped_date=values['clipped_date'], state=values['state'],
+            cull_date=values['cull_date'], weaned=values['weaned'], weaned_date=values['weaned_date'],
+            genotype=values['genotype'], current_cage_id=cage_id,
+        )
+        parent_keys = [None, None]
+        for position, (column, sex) in enumerate((('father', 'M'), ('mother', 'F'))):
+            if not values[column]:
+                continue
+            strain, tube_id = values[column]
+            parent_key = (self.strains.get(strain), tube_id)
+            if parent_key in self.known:
+                parent_id, parent_sex = self.known[parent_key]
+                setattr(mouse, f"{column}_id", parent_id)
+            elif parent_key in pending:
+                parent_sex = pending[parent_key].sex
+                parent_keys[position] = parent_key
+            else:
+                raise ValidationError(f"{column}: no mouse with tube ID {tube_id} in strain {strain}.")
+            if parent_sex != sex:
+                raise ValidationError(f"{column}: tube ID {tube_id} in strain {strain} is not {'male' if sex == 'M' else 'female'}.")
+        return mouse, parent_keys
+
+
+def import_mice(file, user=None, team=None, create_strains=True, delimiter=None, dry_run=False):
+    """Import mice from a CSV/TSV text file and return an ``ImportReport``."""
+    importer = MouseImporter(user=user, team=team, create_strains=create_strains)
+    return importer.run(file, delimiter=delimiter, dry_run=dry_run)
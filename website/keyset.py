@@ -0,0 +1,145 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of ``OFFSET n`` (which reads and throws away ``n`` rows) and a
+``COUNT(*)`` per page, a page starts right after the last row of the page
+before: ``WHERE (sort_value, pk) > (last_value, last_pk) ORDER BY sort_value,
+pk LIMIT per_page + 1``. Every page costs the same as the first, and the
+primary key as tie-breaker keeps the order stable however many rows share a
+sort value. NULL sort values always come last.
+
+The position is handed to the browser as an opaque, URL-safe cursor that also
+records the sort it belongs to, so a cursor from another sort is ignored.
+"""
+import base64
+import datetime as dt
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # Keep microseconds, which DjangoJSONEncoder rounds away
+        if isinstance(o, (dt.datetime, dt.date)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(sort_key, value, pk):
+    data = json.dumps([sort_key, value, pk], cls=_CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort_key, output_field=None):
+    """
+    ``(value, pk)`` from a cursor made for ``sort_key``, with the value
+    converted by ``output_field`` when given; raises InvalidCursor otherwise.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        cursor_sort, value, pk = data
+        if cursor_sort != sort_key or not isinstance(pk, int):
+            raise InvalidCursor(cursor)
+        # A well-formed cursor can still carry a value of the wrong type
+        if output_field is not None and value is not None:
+            value = output_field.to_python(value)
+    except (ValidationError, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    return value, pk
+
+
+class KeysetPage:
+    """One page of rows plus the cursors of its neighbours (None at either end)."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+def _after(value, pk, descending, pk_name):
+    """Rows after (value, pk) in the ordering, NULL values last."""
+    op = 'lt' if descending else 'gt'
+    if value is None:
+        return Q(sort_value__isnull=True, **{f'{pk_name}__{op}': pk})
+    return (
+        Q(**{f'sort_value__{op}': value})
+        | Q(sort_value=value, **{f'{pk_name}__{op}': pk})
+        | Q(sort_value__isnull=True)
+    )
+
+
+def _before(value, pk, descending, pk_name):
+    """Rows before (value, pk) in the ordering, NULL values last."""
+    op = 'gt' if descending else 'lt'
+    if value is None:
+        return Q(sort_value__isnull=False) | Q(sort_value__isnull=True, **{f'{pk_name}__{op}': pk})
+    return Q(**{f'sort_value__{op}': value}) | Q(sort_value=value, **{f'{pk_name}__{op}': pk})
+
+
+def keyset_page(queryset, sort_key, sort_expression, descending=False, after=None, before=None, per_page=10):
+    """
+    The page of ``queryset`` ordered by ``sort_expression`` (then primary key)
+    that follows the ``after`` cursor, precedes the ``before`` cursor, or
+    starts the listing when neither is given. Unusable cursors raise
+    InvalidCursor.
+    """
+    pk_name = queryset.model._meta.pk.name
+    queryset = queryset.annotate(sort_value=sort_expression)
+    output_field = queryset.query.annotations['sort_value'].output_field
+    forward = [
+        F('sort_value').desc(nulls_last=True) if descending else F('sort_value').asc(nulls_last=True),
+        f'-{pk_name}' if descending else pk_name,
+    ]
+    backward = [
+        F('sort_value').asc(nulls_first=True) if descending else F('sort_value').desc(nulls_first=True),
+        pk_name if descending else f'-{pk_name}',
+    ]
+
+    if before is not None:
+        value, pk = decode_cursor(before, sort_key, output_field)
+        rows = list(queryset.filter(_before(value, pk, descending, pk_name)).order_by(*backward)[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_previous, has_next = has_more, True
+    else:
+        if after is not None:
+            value, pk = decode_cursor(after, sort_key, output_field)
+            queryset = queryset.filter(_after(value, pk, descending, pk_name))
+        rows = list(queryset.order_by(*forward)[:per_page + 1])
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_previous = after is not None
+
+    if not rows:
+        return KeysetPage([], None, None)
+    first, last = rows[0], rows[-1]
+    return KeysetPage(
+        rows,
+        encode_cursor(sort_key, last.sort_value, last.pk) if has_next else None,
+        encode_cursor(sort_key, first.sort_value, first.pk) if has_previous else None,
+    )
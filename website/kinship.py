@@ -0,0 +1,181 @@
+"""
+Kinship and inbreeding coefficients over the Mouse father/mother pedigree.
+
+Kinship is half the additive relationship matrix A = T D T', where T counts
+the paths from each mouse down to its descendants and D holds the variance
+each mouse adds beyond its parents. A is never formed: the columns needed for
+a set of target mice come from one pass up the pedigree (T') and one pass
+down (T), each a NumPy operation per generation. Memory grows with the number
+of mice times the number of columns solved at once, so a strain of tens of
+thousands of mice never needs an n x n matrix.
+"""
+import numpy as np
+from django.db.models import Q
+
+from .pedigree import _topological_order
+
+# Target mice solved for at once; bounds the working array to n x COLUMN_CHUNK
+COLUMN_CHUNK = 256
+
+
+class KinshipIndex:
+    """Pedigree of a set of mice, answering kinship queries by mouse_id."""
+
+    def __init__(self, mouse_ids, sires, dams):
+        """
+        ``mouse_ids`` must be in topological order; ``sires[i]`` and ``dams[i]``
+        are the positions of mouse ``i``'s parents (-1 if unknown).
+        """
+        sires, dams = np.asarray(sires, dtype=np.int64), np.asarray(dams, dtype=np.int64)
+        generation = []
+        for sire, dam in zip(sires.tolist(), dams.tolist()):
+            generation.append(1 + max(generation[sire] if sire >= 0 else -1, generation[dam] if dam >= 0 else -1))
+        generation = np.array(generation, dtype=np.int64)
+
+        # Renumber the mice generation by generation, so every generation is a
+        # contiguous block that only refers to the blocks before it. Unknown
+        # parents stay -1: the last row of every working array is kept at zero.
+        order = np.argsort(generation, kind='stable')
+        renumber = np.empty(len(order) + 1, dtype=np.int64)
+        renumber[order] = np.arange(len(order))
+        renumber[-1] = -1
+        self.mouse_ids = [mouse_ids[position] for position in order.tolist()]
+        self.positions = {mouse_id: position for position, mouse_id in enumerate(self.mouse_ids)}
+        self.sires = renumber[sires[order]]
+        self.dams = renumber[dams[order]]
+        self.generation = generation[order]
+        self.level_ends = np.searchsorted(self.generation, np.arange(self.generation.max(initial=-1) + 1), side='right')
+
+        # Per generation, the (child, parent) links split into rounds in which
+        # no parent repeats, so passing values up is a plain fancy-index add
+        # rather than a slow unbuffered np.add.at
+        self._parent_rounds = []
+        for start, end in self._levels(len(self.level_ends) - 1):
+            children = np.tile(np.arange(start, end), 2)
+            parents = np.concatenate([self.sires[start:end], self.dams[start:end]])
+            grouping = np.argsort(parents, kind='stable')
+            children, parents = children[grouping], parents[grouping]
+            _, starts, counts = np.unique(parents, return_index=True, return_counts=True)
+            rank = np.arange(len(parents)) - np.repeat(starts, counts)
+            self._parent_rounds.append([(children[rank == r], parents[rank == r]) for r in range(counts.max())])
+
+        self._inbreeding = np.zeros(len(order) + 1)
+        self._variance = np.zeros(len(order) + 1)
+        self._fill_inbreeding()
+
+    def _levels(self, top):
+        """``(start, end)`` of every generation from the first with parents up to ``top``."""
+        return zip(self.level_ends[:top].tolist(), self.level_ends[1:top + 1].tolist())
+
+    @classmethod
+    def from_parents(cls, parents):
+        """Build the index from a ``{mouse_id: (father_id, mother_id)}`` mapping."""
+        order = _topological_order({
+            mouse_id: [p for p in mouse_parents if p in parents]
+            for mouse_id, mouse_parents in parents.items()
+        })
+        positions = {mouse_id: position for position, mouse_id in enumerate(order)}
+        sires = [positions.get(parents[mouse_id][0], -1) for mouse_id in order]
+        dams = [positions.get(parents[mouse_id][1], -1) for mouse_id in order]
+        return cls(order, sires, dams)
+
+    @classmethod
+    def for_queryset(cls, mice):
+        """Build the index for a Mouse queryset plus all of their ancestors, in one query."""
+        from .models import Mouse, MouseLineage
+
+        members = mice.values('mouse_id')
+        ancestors = MouseLineage.objects.filter(descendant_id__in=members).values('ancestor_id')
+        rows = Mouse.objects.filter(Q(mouse_id__in=members) | Q(mouse_id__in=ancestors)).values_list(
+            'mouse_id', 'father_id', 'mother_id'
+        )
+        return cls.from_parents({mouse_id: (father_id, mother_id) for mouse_id, father_id, mother_id in rows})
+
+    @classmethod
+    def for_mice(cls, mouse_ids):
+        """Build the index for the given mice plus all of their ancestors."""
+        from .models import Mouse
+
+        return cls.for_queryset(Mouse.objects.filter(mouse_id__in=list(mouse_ids)))
+
+    @classmethod
+    def for_strain(cls, strain):
+        """Build the index for every mouse of ``strain`` plus all of their ancestors."""
+        from .models import Mouse
+
+        return cls.for_queryset(Mouse.objects.filter(strain=strain))
+
+    def _relationship_columns(self, targets, top):
+        """
+        Columns of A for the mice at positions ``targets``, for every mouse up
+        to generation ``top`` (which must cover the targets).
+        """
+        end = self.level_ends[top]
+        column = np.zeros((end + 1, len(targets)), dtype=np.float32)
+        column[targets, np.arange(len(targets))] = 1.0
+        # Up the pedigree: each mouse passes half its value to both parents
+        for rounds in reversed(self._parent_rounds[:top]):
+            for children, parents in rounds:
+                column[parents] += 0.5 * column[children]
+        column[:end] *= self._variance[:end, np.newaxis]
+        column[-1] = 0.0
+        # Down the pedigree: each mouse adds half of each parent's value
+        for start, stop in self._levels(top):
+            column[start:stop] += 0.5 * (column[self.sires[start:stop]] + column[self.dams[start:stop]])
+        return column
+
+    def _fill_inbreeding(self):
+        """
+        Inbreeding coefficients, one generation at a time: a mouse's F is the
+        kinship of its parents, which only needs the variances of earlier
+        generations.
+        """
+        self._variance[:self.level_ends[0] if len(self.level_ends) else 0] = 1.0
+        for generation, (start, end) in enumerate(self._levels(len(self.level_ends) - 1), start=1):
+            sires, dams = self.sires[start:end], self.dams[start:end]
+            self._variance[start:end] = (1.0 - 0.25 * (sires >= 0) * (1.0 + self._inbreeding[sires])
+                                         - 0.25 * (dams >= 0) * (1.0 + self._inbreeding[dams]))
+            both = start + np.flatnonzero((sires >= 0) & (dams >= 0))
+            if len(both):
+                self._inbreeding[both] = self._kinship_block(self.sires[both], self.dams[both], generation - 1,
+                                                             paired=True)
+
+    def _kinship_block(self, rows, columns, top, paired=False):
+        """
+        Kinship of the mice at positions ``rows`` with those at ``columns``: a
+        ``len(rows) x len(columns)`` array, or when ``paired`` the kinship of
+        ``rows[i]`` with ``columns[i]``.
+        """
+        targets, inverse = np.unique(columns, return_inverse=True)
+        result = np.empty(len(rows) if paired else (len(rows), len(columns)))
+        for start in range(0, len(targets), COLUMN_CHUNK):
+            chunk = self._relationship_columns(targets[start:start + COLUMN_CHUNK], top)
+            mask = np.flatnonzero((inverse >= start) & (inverse < start + COLUMN_CHUNK))
+            if paired:
+                result[mask] = 0.5 * chunk[rows[mask], inverse[mask] - start]
+            else:
+                result[:, mask] = 0.5 * chunk[np.ix_(rows, inverse[mask] - start)]
+        return result
+
+    def kinship(self, first_id, second_id):
+        """Kinship coefficient of two mice (the inbreeding coefficient of their offspring)."""
+        return float(self.pairs([first_id], [second_id])[0, 0])
+
+    def inbreeding(self, mouse_id):
+        """Inbreeding coefficient of a mouse."""
+        return float(self._inbreeding[self.positions[mouse_id]])
+
+    def pairs(self, male_ids, female_ids):
+        """Kinship of every male x female pair as a ``len(male_ids) x len(female_ids)`` array."""
+        rows = np.array([self.positions[mouse_id] for mouse_id in male_ids], dtype=np.int64)
+        columns = np.array([self.positions[mouse_id] for mouse_id in female_ids], dtype=np.int64)
+        if not len(rows) or not len(columns):
+            return np.zeros((len(rows), len(columns)), dtype=np.float32)
+        top = int(max(self.generation[rows].max(), self.generation[columns].max()))
+        return self._kinship_block(rows, columns, top).astype(np.float32)
+
+
+def pair_kinship(male, female):
+    """Kinship coefficient of a single candidate breeding pair."""
+    index = KinshipIndex.for_mice([male.mouse_id, female.mouse_id])
+    return index.kinship(male.mouse_id, female.mouse_id)
@@ -0,0 +1,50 @@
+import time
+import tracemalloc
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from website.kinship import KinshipIndex
+
+
+class Command(BaseCommand):
+    help = "Time kinship of the candidate pairs of a synthetic strain (no database needed)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mice', type=int, default=20000, help="Mice in the strain, living and dead")
+        parser.add_argument('--candidates', type=int, default=2000,
+                            help="Youngest mice taken as breeding candidates")
+        parser.add_argument('--founders', type=int, default=50, help="Founders of the strain")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        mice = options['mice']
+        founders = min(options['founders'], mice)
+        candidates = min(options['candidates'], mice)
+
+        # Each mouse after the founders gets two random earlier parents
+        sires = np.full(mice, -1, dtype=np.int64)
+        dams = np.full(mice, -1, dtype=np.int64)
+        for i in range(founders, mice):
+            sires[i], dams[i] = rng.integers(0, i, size=2)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        index = KinshipIndex(range(mice), sires, dams)
+        build_time = time.perf_counter() - start
+
+        pool = np.arange(mice - candidates, mice)
+        sexes = rng.integers(0, 2, size=candidates).astype(bool)
+        males, females = pool[sexes].tolist(), pool[~sexes].tolist()
+        start = time.perf_counter()
+        index.pairs(males, females)
+        pair_time = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        self.stdout.write(
+            f"{mice} mice: pedigree indexed in {build_time:.2f}s, "
+            f"{len(males) * len(females)} candidate pairs scored in {pair_time:.2f}s, "
+            f"peak memory {peak / 2 ** 20:.0f} MiB"
+        )
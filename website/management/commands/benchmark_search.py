@@ -0,0 +1,58 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from website.search import _compiled, compile_node, parse, search_filter
+
+TERMS = [
+    'male', 'female', 'alive', 'breeding', 'to be culled', 'BR', 'TL', 'yes', 'm{n}', 't{n}', '{n}',
+    'C57BL/6', 'BALB/c', '{d}/{m}/2024', '2024-{m}-{d}', 'dob:{d}.{m}.24', 'sex:male', 'state:deceased',
+    'tube_id:{n}', 'strain:Ai14', 'cull_date:{m}/{d}/2025',
+]
+
+
+class Command(BaseCommand):
+    help = "Time search query parsing and compilation, with and without the compiled query cache (no database needed)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=20000, help="Number of queries to run")
+        parser.add_argument('--distinct', type=int, default=200, help="Number of distinct queries among them")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        def term():
+            return rng.choice(TERMS).format(n=rng.randint(1, 5000), d=rng.randint(1, 28), m=rng.randint(1, 12))
+
+        def query():
+            groups = [
+                ' AND '.join(('NOT ' if rng.random() < 0.2 else '') + term() for _ in range(rng.randint(1, 3)))
+                for _ in range(rng.randint(1, 3))
+            ]
+            return ' OR '.join(groups)
+
+        distinct = [query() for _ in range(options['distinct'])]
+        workload = [rng.choice(distinct) for _ in range(options['queries'])]
+
+        start = time.perf_counter()
+        for text in workload:
+            compile_node(parse(text))
+        uncached = time.perf_counter() - start
+
+        _compiled.cache_clear()
+        search_filter.cache_clear()
+        start = time.perf_counter()
+        for text in workload:
+            search_filter(text)
+        cached = time.perf_counter() - start
+        info = search_filter.cache_info()
+
+        count = len(workload)
+        self.stdout.write(
+            f"{count} queries ({options['distinct']} distinct): "
+            f"parse+compile {count / uncached:,.0f}/s, "
+            f"cached {count / cached:,.0f}/s "
+            f"({info.hits} hits, {info.misses} misses)"
+        )
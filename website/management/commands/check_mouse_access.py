@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from website.access import check_access, refresh_access
+
+
+class Command(BaseCommand):
+    help = "Check the mouse visibility table (MouseAccess) against the keepers and team memberships."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Add the missing rows and remove the extra ones")
+        parser.add_argument('--show', type=int, default=20, help="Number of differing pairs to list (default 20)")
+
+    def handle(self, *args, **options):
+        missing, extra = check_access()
+        if not missing and not extra:
+            self.stdout.write(self.style.SUCCESS("Mouse visibility table is consistent."))
+            return
+
+        for label, pairs in (("Missing", missing), ("Extra", extra)):
+            for user_id, mouse_id in pairs[:options['show']]:
+                self.stdout.write(f"{label}: user {user_id} / mouse {mouse_id}")
+        summary = f"{len(missing)} missing and {len(extra)} extra rows"
+        if not options['fix']:
+            raise CommandError(f"Mouse visibility table is out of date: {summary}. Run with --fix or rebuild_mouse_access.")
+        refresh_access()
+        self.stdout.write(self.style.SUCCESS(f"Fixed {summary}."))
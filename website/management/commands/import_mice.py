@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from website.imports import import_mice
+from website.models import Team, User
+
+
+class Command(BaseCommand):
+    help = "Import mice in bulk from a CSV or TSV file, printing every rejected line."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or TSV file with a header row")
+        parser.add_argument('--user', help="Username of the keeper of the imported mice")
+        parser.add_argument('--team', help="Name of the team keeping the imported mice")
+        parser.add_argument('--delimiter', help="Column separator (detected from the header by default)")
+        parser.add_argument('--no-create-strains', action='store_true',
+                            help="Reject rows whose strain does not exist instead of creating it")
+        parser.add_argument('--dry-run', action='store_true', help="Validate the file without keeping anything")
+
+    def handle(self, *args, **options):
+        if not options['user'] and not options['team']:
+            raise CommandError("Give the keeper of the mice with --user or --team.")
+        try:
+            user = User.objects.get(username=options['user']) if options['user'] else None
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist.")
+        try:
+            team = Team.objects.get(name=options['team']) if options['team'] else None
+        except Team.DoesNotExist:
+            raise CommandError(f"Team '{options['team']}' does not exist.")
+
+        started = time.perf_counter()
+        with open(options['path'], newline='', encoding='utf-8-sig') as file:
+            report = import_mice(
+                file,
+                user=user,
+                team=team,
+                create_strains=not options['no_create_strains'],
+                delimiter=options['delimiter'],
+                dry_run=options['dry_run'],
+            )
+        elapsed = time.perf_counter() - started
+
+        for line, message in report.errors:
+            self.stderr.write(f"line {line}: {message}")
+        verb = "Validated" if options['dry_run'] else "Imported"
+        summary = f"{verb} {report.created} mice in {elapsed:.1f}s, {len(report.errors)} lines rejected."
+        self.stdout.write(self.style.SUCCESS(summary) if report.ok else self.style.WARNING(summary))
@@ -0,0 +1,38 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from website.kinship import KinshipIndex
+from website.models import Mouse, Strain
+
+
+class Command(BaseCommand):
+    help = "Write the kinship coefficient of every available (alive) male x female pair in a strain as CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('strain', help="Name of the strain")
+        parser.add_argument('--output', help="CSV file to write (defaults to stdout)")
+
+    def handle(self, *args, **options):
+        try:
+            strain = Strain.objects.get(name=options['strain'])
+        except Strain.DoesNotExist:
+            raise CommandError(f"Strain '{options['strain']}' does not exist.")
+
+        candidates = Mouse.objects.filter(strain=strain, state='alive').order_by('mouse_id')
+        males = list(candidates.filter(sex='M').values_list('mouse_id', flat=True))
+        females = list(candidates.filter(sex='F').values_list('mouse_id', flat=True))
+
+        index = KinshipIndex.for_queryset(candidates)
+        coefficients = index.pairs(males, females)
+
+        output = open(options['output'], 'w', newline='') if options['output'] else self.stdout
+        try:
+            writer = csv.writer(output)
+            writer.writerow(['male_id', 'female_id', 'kinship'])
+            for row, male_id in enumerate(males):
+                for column, female_id in enumerate(females):
+                    writer.writerow([male_id, female_id, f"{coefficients[row, column]:.6f}"])
+        finally:
+            if options['output']:
+                output.close()
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from website.pedigree import rebuild_lineage
+
+
+class Command(BaseCommand):
+    help = "Rebuild the pedigree closure table (MouseLineage) from every mouse's father and mother."
+
+    def handle(self, *args, **options):
+        rows = rebuild_lineage()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt pedigree closure table with {rows} rows."))
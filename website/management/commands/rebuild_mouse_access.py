@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from website.access import rebuild_access
+
+
+class Command(BaseCommand):
+    help = "Rebuild the mouse visibility table (MouseAccess) from the keepers and team memberships."
+
+    def handle(self, *args, **options):
+        rows = rebuild_access()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt mouse visibility table with {rows} rows."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from website.search_index import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the mouse search documents and their full-text index."
+
+    def handle(self, *args, **options):
+        count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt search index for {count} mice."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from website.history import take_snapshot
+
+
+class Command(BaseCommand):
+    help = "Snapshot the history fields of every mouse so point-in-time queries replay fewer changes."
+
+    def handle(self, *args, **options):
+        snapshot = take_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"Took colony snapshot {snapshot.id} of {snapshot.mice.count()} mice at {snapshot.taken_at.isoformat()}."
+        ))
@@ -0,0 +1,85 @@
+# Generated by Django 5.1.2 on 2026-10-17 09:00
+
+import django.db.models.deletion
+from collections import deque
+from django.db import migrations, models
+
+
+# Frozen copies of the closure computation in website.pedigree as of this
+# migration, so later changes to that module cannot alter the backfill.
+
+def topological_order(parents):
+    """Order mice so each comes after its parents; mice in a parent cycle are dropped."""
+    children = {mouse_id: [] for mouse_id in parents}
+    pending = {}
+    for mouse_id, mouse_parents in parents.items():
+        internal = [p for p in mouse_parents if p in parents]
+        pending[mouse_id] = len(internal)
+        for parent_id in internal:
+            children[parent_id].append(mouse_id)
+
+    queue = deque(mouse_id for mouse_id, count in pending.items() if count == 0)
+    order = []
+    while queue:
+        mouse_id = queue.popleft()
+        order.append(mouse_id)
+        for child_id in children[mouse_id]:
+            pending[child_id] -= 1
+            if pending[child_id] == 0:
+                queue.append(child_id)
+    return order
+
+
+def lineage_rows(parents):
+    """Yield ``(ancestor_id, descendant_id, depth)`` for every mouse in ``parents``."""
+    ancestry = {}
+    for mouse_id in topological_order(parents):
+        ancestors = {}
+        for parent_id in parents[mouse_id]:
+            if ancestors.get(parent_id, 2) > 1:
+                ancestors[parent_id] = 1
+            for ancestor_id, depth in ancestry.get(parent_id, {}).items():
+                if ancestors.get(ancestor_id, depth + 2) > depth + 1:
+                    ancestors[ancestor_id] = depth + 1
+        ancestry[mouse_id] = ancestors
+        for ancestor_id, depth in ancestors.items():
+            yield ancestor_id, mouse_id, depth
+
+
+def build_lineage(apps, schema_editor):
+    """Populate the closure table for mice that already exist."""
+    Mouse = apps.get_model('website', 'Mouse')
+    MouseLineage = apps.get_model('website', 'MouseLineage')
+
+    parents = {
+        mouse_id: [p for p in (father_id, mother_id) if p]
+        for mouse_id, father_id, mother_id in Mouse.objects.values_list('mouse_id', 'father_id', 'mother_id')
+    }
+    MouseLineage.objects.bulk_create(
+        (MouseLineage(ancestor_id=a, descendant_id=d, depth=depth) for a, d, depth in lineage_rows(parents)),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0012_remove_phenotype_mouse_mouse_genotype_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MouseLineage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='website.mouse')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='website.mouse')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='lineage_descendant_depth_idx'), models.Index(fields=['ancestor', 'depth'], name='lineage_ancestor_depth_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(build_lineage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.2 on 2026-10-17 14:00
+
+import django.db.models.deletion
+from collections import defaultdict
+from django.db import migrations, models
+
+
+def fill_current_cage(apps, schema_editor):
+    """Close duplicate open placements (keeping the latest) and copy the rest to Mouse.current_cage."""
+    CageHistory = apps.get_model('website', 'CageHistory')
+    Mouse = apps.get_model('website', 'Mouse')
+
+    latest = {}
+    for history_id, mouse_id, cage_id, start_date in CageHistory.objects.filter(end_date__isnull=True).order_by(
+        'mouse_id', '-start_date', '-id'
+    ).values_list('id', 'mouse_id', 'cage_id', 'start_date'):
+        if mouse_id in latest:
+            # An older open row: it ended when the newer one started
+            CageHistory.objects.filter(id=history_id).update(end_date=latest[mouse_id][1])
+        else:
+            latest[mouse_id] = (cage_id, start_date)
+
+    mice_by_cage = defaultdict(list)
+    for mouse_id, (cage_id, _) in latest.items():
+        mice_by_cage[cage_id].append(mouse_id)
+    for cage_id, mouse_ids in mice_by_cage.items():
+        for start in range(0, len(mouse_ids), 500):
+            Mouse.objects.filter(mouse_id__in=mouse_ids[start:start + 500]).update(current_cage_id=cage_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0014_updated_at_and_deletedrecord'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mouse',
+            name='current_cage',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='current_mice', to='website.cage'),
+        ),
+        migrations.RunPython(fill_current_cage, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cagehistory',
+            constraint=models.UniqueConstraint(condition=models.Q(('end_date__isnull', True)), fields=('mouse_id',), name='cagehistory_one_open_per_mouse'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.2 on 2026-10-17 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0015_mouse_current_cage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cagehistory',
+            index=models.Index(fields=['cage_id', 'start_date', 'end_date'], name='cagehistory_cage_interval_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cagehistory',
+            index=models.Index(fields=['mouse_id', 'start_date', 'end_date'], name='cagehistory_mouse_interval_idx'),
+        ),
+    ]
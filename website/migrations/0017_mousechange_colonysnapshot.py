@@ -0,0 +1,48 @@
+# Generated by Django 5.1.2 on 2026-10-17 16:00
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0016_cagehistory_interval_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColonySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MouseChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('changed_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('created', models.BooleanField(default=False)),
+                ('changes', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('mouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='website.mouse')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['mouse', 'changed_at'], name='mousechange_mouse_time_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MouseSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('values', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('mouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='website.mouse')),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mice', to='website.colonysnapshot')),
+            ],
+            options={
+                'unique_together': {('snapshot', 'mouse')},
+            },
+        ),
+    ]
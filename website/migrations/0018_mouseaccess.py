@@ -0,0 +1,40 @@
+# Generated by Django 5.1.2 on 2026-10-17 17:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_access(apps, schema_editor):
+    MouseAccess = apps.get_model('website', 'MouseAccess')
+    MouseKeeper = apps.get_model('website', 'MouseKeeper')
+    pairs = set(MouseKeeper.objects.filter(user__isnull=False).values_list('user_id', 'mouse_id'))
+    pairs.update(
+        MouseKeeper.objects.filter(team__teammembership__isnull=False)
+        .values_list('team__teammembership__user_id', 'mouse_id')
+    )
+    MouseAccess.objects.bulk_create(
+        [MouseAccess(user_id=user_id, mouse_id=mouse_id) for user_id, mouse_id in pairs], batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0017_mousechange_colonysnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MouseAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='access', to='website.mouse')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mouse_access', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'mouse')},
+            },
+        ),
+        migrations.RunPython(fill_access, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.1.2 on 2026-10-17 18:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_TABLE = 'website_mousesearch_fts'
+DOCUMENT_TABLE = 'website_mousesearchdocument'
+
+SQLITE_FORWARD = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(text, content='{DOCUMENT_TABLE}', content_rowid='mouse_id', prefix='2 3')",
+    f"""CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.mouse_id, new.text);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.mouse_id, old.text);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.mouse_id, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.mouse_id, new.text);
+    END""",
+]
+SQLITE_BACKWARD = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX mousesearch_text_trgm_idx ON {DOCUMENT_TABLE} USING gin (text gin_trgm_ops)",
+]
+POSTGRES_BACKWARD = ["DROP INDEX IF EXISTS mousesearch_text_trgm_idx"]
+
+
+def _run(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_text_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD})
+
+
+def drop_text_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD})
+
+
+# Frozen copy of website.search_index.document_text as of this migration,
+# so later changes to that module cannot alter the backfill.
+MOUSE_COLUMNS = ('mouse_id', 'strain__name', 'tube_id', 'genotype', 'state', 'earmark', 'current_cage__cage_number')
+KEEPER_COLUMNS = ('mouse_id', 'user__username', 'user__first_name', 'user__last_name', 'team__name')
+LABELS = {
+    'wt': 'Wild type', 'ht': 'Heterozygous', 'ko': 'Knock out', 'na': 'N/A',
+    'alive': 'Alive', 'breeding': 'Breeding', 'to_be_culled': 'To Be Culled', 'deceased': 'Deceased',
+}
+
+
+def document_text(mouse, keepers, labels=LABELS):
+    earmark = mouse['earmark'] or []
+    if isinstance(earmark, str):
+        earmark = earmark.split(',')
+    parts = [
+        mouse['strain__name'], str(mouse['tube_id']),
+        mouse['genotype'], labels.get(mouse['genotype']),
+        labels.get(mouse['state']), *earmark, mouse['current_cage__cage_number'],
+    ]
+    for keeper in keepers:
+        parts.extend(keeper[column] for column in KEEPER_COLUMNS[1:])
+    return ' '.join(part.strip() for part in parts if part and part.strip()).lower()
+
+
+def fill_documents(apps, schema_editor):
+    Mouse = apps.get_model('website', 'Mouse')
+    MouseKeeper = apps.get_model('website', 'MouseKeeper')
+    MouseSearchDocument = apps.get_model('website', 'MouseSearchDocument')
+    keepers = {}
+    for keeper in MouseKeeper.objects.values(*KEEPER_COLUMNS):
+        keepers.setdefault(keeper['mouse_id'], []).append(keeper)
+    MouseSearchDocument.objects.bulk_create([
+        MouseSearchDocument(mouse_id=mouse['mouse_id'], text=document_text(mouse, keepers.get(mouse['mouse_id'], [])))
+        for mouse in Mouse.objects.values(*MOUSE_COLUMNS).iterator(chunk_size=2000)
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0018_mouseaccess'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MouseSearchDocument',
+            fields=[
+                ('mouse', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='website.mouse')),
+                ('text', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.RunPython(create_text_index, drop_text_index),
+        migrations.RunPython(fill_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.1.2 on 2026-10-17 20:00
+
+from django.db import migrations, models
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """
+    AddIndex that builds the index with CREATE INDEX CONCURRENTLY on
+    PostgreSQL, so the tables stay writable while it is built; other
+    databases build it as usual.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.add_index(model, self.index, concurrently=True)
+        else:
+            schema_editor.add_index(model, self.index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.remove_index(model, self.index, concurrently=True)
+        else:
+            schema_editor.remove_index(model, self.index)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('website', '0019_mousesearchdocument'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='breedingrequest',
+            index=models.Index(fields=['status', 'requester'], name='breedingrequest_status_req_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='cullingrequest',
+            index=models.Index(fields=['status', 'requester'], name='cullingrequest_status_req_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transferrequest',
+            index=models.Index(fields=['status', 'requester'], name='transferrequest_status_req_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='mouse',
+            index=models.Index(fields=['state', 'sex'], name='mouse_state_sex_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='mousekeeper',
+            index=models.Index(fields=['user', 'mouse'], name='mousekeeper_user_mouse_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='mousekeeper',
+            index=models.Index(fields=['team', 'mouse'], name='mousekeeper_team_mouse_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'created_at'], name='notification_recip_time_idx'),
+        ),
+    ]
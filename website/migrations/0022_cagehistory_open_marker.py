@@ -0,0 +1,26 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0021_cache_table'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='cagehistory',
+            name='cagehistory_one_open_per_mouse',
+        ),
+        migrations.AddField(
+            model_name='cagehistory',
+            name='open_marker',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(end_date__isnull=True, then=models.Value(True)), default=None), output_field=models.BooleanField(null=True)),
+        ),
+        migrations.AddConstraint(
+            model_name='cagehistory',
+            constraint=models.UniqueConstraint(fields=('mouse_id', 'open_marker'), name='cagehistory_one_open_per_mouse'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:00
+
+from django.db import migrations
+
+# Indexes serving cage_number__istartswith, which the plain unique index
+# cannot: SQLite's LIKE only uses a NOCASE index, and PostgreSQL compiles
+# the lookup to UPPER(cage_number::text) LIKE UPPER(...), which needs a
+# matching expression index with pattern ops. MySQL's case-insensitive
+# collation already lets the unique index serve it.
+FORWARD = {
+    'sqlite': ["CREATE INDEX cage_number_prefix_idx ON website_cage (cage_number COLLATE NOCASE)"],
+    'postgresql': ["CREATE INDEX cage_number_prefix_idx ON website_cage (UPPER(cage_number::text) text_pattern_ops)"],
+}
+BACKWARD = {
+    'sqlite': ["DROP INDEX IF EXISTS cage_number_prefix_idx"],
+    'postgresql': ["DROP INDEX IF EXISTS cage_number_prefix_idx"],
+}
+
+
+def _run(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_prefix_index(apps, schema_editor):
+    _run(schema_editor, FORWARD)
+
+
+def drop_prefix_index(apps, schema_editor):
+    _run(schema_editor, BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0022_cagehistory_open_marker'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_index, drop_prefix_index),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:30
+
+from django.db import migrations
+
+# Indexes serving username__istartswith, which the plain unique index
+# cannot: SQLite's LIKE only uses a NOCASE index, and PostgreSQL compiles
+# the lookup to UPPER(username::text) LIKE UPPER(...), which needs a
+# matching expression index with pattern ops. MySQL's case-insensitive
+# collation already lets the unique index serve it.
+FORWARD = {
+    'sqlite': ["CREATE INDEX username_prefix_idx ON website_user (username COLLATE NOCASE)"],
+    'postgresql': ["CREATE INDEX username_prefix_idx ON website_user (UPPER(username::text) text_pattern_ops)"],
+}
+BACKWARD = {
+    'sqlite': ["DROP INDEX IF EXISTS username_prefix_idx"],
+    'postgresql': ["DROP INDEX IF EXISTS username_prefix_idx"],
+}
+
+
+def _run(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_prefix_index(apps, schema_editor):
+    _run(schema_editor, FORWARD)
+
+
+def drop_prefix_index(apps, schema_editor):
+    _run(schema_editor, BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0023_cage_number_prefix_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_index, drop_prefix_index),
+    ]
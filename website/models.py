@@ -1,8 +1,11 @@
 from django.contrib.auth.models import AbstractUser, Group, Permission
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from django.db.models.signals import post_save
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.signals import post_save, pre_save, pre_delete, post_delete
 from django.dispatch import receiver
 import datetime as dt
 import os
@@ -26,12 +29,60 @@ class Cage(models.Model):
     def __str__(self):
         return self.cage_number
     
+# ---------- Cage History QuerySet ----------
+class CageHistoryQuerySet(models.QuerySet):
+    """
+    Interval lookups over placements. A placement covers [start_date, end_date),
+    with an open end_date meaning the mouse is still in the cage.
+    """
+
+    def at(self, moment):
+        """Placements in effect at ``moment``."""
+        return self.filter(Q(end_date__isnull=True) | Q(end_date__gt=moment), start_date__lte=moment)
+
+    def overlapping(self, start=None, end=None):
+        """Placements in effect at any time in [start, end); either bound may be left open."""
+        placements = self
+        if start is not None:
+            placements = placements.filter(Q(end_date__isnull=True) | Q(end_date__gt=start))
+        if end is not None:
+            placements = placements.filter(start_date__lt=end)
+        return placements
+
+    def in_cage(self, cage):
+        return self.filter(cage_id=cage)
+
+    def at_location(self, location):
+        return self.filter(cage_id__location=location)
+
 # ---------- Cage History Model ----------
 class CageHistory(models.Model):
     cage_id = models.ForeignKey(Cage, on_delete=models.CASCADE)
     mouse_id = models.ForeignKey('Mouse', on_delete=models.CASCADE)
     start_date = models.DateTimeField()
     end_date = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # TRUE while the placement is open, NULL once it ends. NULLs never collide
+    # in a unique index, so (mouse_id, open_marker) allows one open row per
+    # mouse on every backend, including MySQL which ignores partial indexes.
+    open_marker = models.GeneratedField(
+        expression=models.Case(models.When(end_date__isnull=True, then=models.Value(True)), default=None),
+        output_field=models.BooleanField(null=True),
+        db_persist=True,
+    )
+
+    objects = CageHistoryQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Interval lookups: "who was in cage X at D" and "where has mouse M been"
+            models.Index(fields=['cage_id', 'start_date', 'end_date'], name='cagehistory_cage_interval_idx'),
+            models.Index(fields=['mouse_id', 'start_date', 'end_date'], name='cagehistory_mouse_interval_idx'),
+        ]
+        constraints = [
+            # A mouse is in at most one cage at a time
+            models.UniqueConstraint(fields=['mouse_id', 'open_marker'], name='cagehistory_one_open_per_mouse'),
+        ]
 
     def clean(self):
         # Ensure end_date is after start_date
@@ -41,7 +92,23 @@ class CageHistory(models.Model):
     def save(self, *args, **kwargs):
         # Call clean method before saving
         self.clean()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._sync_current_cage()
+
+    def _sync_current_cage(self):
+        """Mirror the open placement onto Mouse.current_cage."""
+        now = timezone.now()
+        if self.end_date is None:
+            Mouse.objects.filter(pk=self.mouse_id_id).update(current_cage=self.cage_id_id, updated_at=now)
+            current_cage_id = self.cage_id_id
+        else:
+            Mouse.objects.filter(pk=self.mouse_id_id, current_cage=self.cage_id_id).update(current_cage=None, updated_at=now)
+            current_cage_id = None
+        if CageHistory.mouse_id.is_cached(self):
+            self.mouse_id.current_cage_id = current_cage_id
+        from .search_index import refresh_documents
+        refresh_documents([self.mouse_id_id])
 
 # ---------- User Model ----------
 class User(AbstractUser):
@@ -101,6 +168,28 @@ class TeamMembership(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.team.name} ({self.user.role})"
 
+# ---------- Mouse QuerySet ----------
+class MouseQuerySet(models.QuerySet):
+    def ancestors_of(self, mouse, max_depth=None):
+        """
+        All ancestors of ``mouse`` in one query, annotated with ``generation``
+        (1 = parent, 2 = grandparent, ...). Optionally limited to ``max_depth``.
+        """
+        filters = {'descendant_links__descendant': mouse}
+        if max_depth is not None:
+            filters['descendant_links__depth__lte'] = max_depth
+        return self.filter(**filters).annotate(generation=models.F('descendant_links__depth'))
+
+    def descendants_of(self, mouse, max_depth=None):
+        """
+        All descendants of ``mouse`` in one query, annotated with ``generation``
+        (1 = child, 2 = grandchild, ...). Optionally limited to ``max_depth``.
+        """
+        filters = {'ancestor_links__ancestor': mouse}
+        if max_depth is not None:
+            filters['ancestor_links__depth__lte'] = max_depth
+        return self.filter(**filters).annotate(generation=models.F('ancestor_links__depth'))
+
 # ---------- Mouse Model ----------
 class Mouse(models.Model):
     SEX_CHOICES = [('M', 'Male'), ('F', 'Female')]
@@ -129,9 +218,31 @@ class Mouse(models.Model):
     weaned = models.BooleanField(default=False)
     weaned_date = models.DateField(null=True, blank=True)
     genotype = models.CharField(max_length=20, choices=GENOTYPE_CHOICES, default='na', blank=False)
+    # Cage of the open CageHistory row, maintained by CageHistory.save
+    current_cage = models.ForeignKey(Cage, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='current_mice')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     # change mouse to mousekeeper table
     #mouse_keeper = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='kept_mice')
 
+    objects = MouseQuerySet.as_manager()
+
+    # Fields whose past values are kept in MouseChange for point-in-time queries
+    HISTORY_FIELDS = ('state', 'genotype', 'weaned', 'weaned_date', 'cull_date')
+    # Columns shown for a mouse in the cached ancestor trees (see pedigree.py)
+    TREE_LABEL_FIELDS = ('tube_id', 'strain_id', 'sex')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored values so the next save can log what changed
+        instance._history_values = {
+            field: getattr(instance, field) for field in cls.HISTORY_FIELDS if field in field_names
+        }
+        instance._tree_labels = {
+            field: getattr(instance, field) for field in cls.TREE_LABEL_FIELDS if field in field_names
+        }
+        return instance
+
     def get_earmark_display(self):
         """Return a readable string of earmark choices."""
         # Map the list of choices to their corresponding labels in CLIPPED_CHOICES
@@ -157,19 +268,44 @@ class Mouse(models.Model):
 
     class Meta:
         unique_together = ('strain', 'tube_id')
+        indexes = [
+            models.Index(fields=['state', 'sex'], name='mouse_state_sex_idx'),
+        ]
 
     def __str__(self):
         return f"Mouse {self.mouse_id} - {self.strain} - Tube {self.tube_id}"
-    
-    def get_ancestors(self):
-        ancestors = []
-        if self.mother:
-            ancestors.append(self.mother)
-            ancestors.extend(self.mother.get_ancestors())
-        if self.father:
-            ancestors.append(self.father)
-            ancestors.extend(self.father.get_ancestors())
-        return ancestors
+
+    def save(self, **kwargs):
+        # current_cage is owned by CageHistory, so never write back a possibly stale copy of it
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'current_cage' and field.attname not in deferred
+            ]
+        super().save(**kwargs)
+
+    def move_to_cage(self, cage, when=None):
+        """Close the mouse's current placement, if any, and put it in ``cage``."""
+        when = when or timezone.now()
+        with transaction.atomic():
+            self.leave_cage(when)
+            return CageHistory.objects.create(cage_id=cage, mouse_id=self, start_date=when)
+
+    def leave_cage(self, when=None):
+        """Close the mouse's current placement, if any."""
+        when = when or timezone.now()
+        with transaction.atomic():
+            # Lock the mouse row so concurrent moves of the same mouse queue up
+            list(Mouse.objects.select_for_update().filter(pk=self.pk).values_list('pk'))
+            CageHistory.objects.filter(mouse_id=self, end_date__isnull=True).update(end_date=when, updated_at=timezone.now())
+            if Mouse.objects.filter(pk=self.pk, current_cage__isnull=False).update(current_cage=None, updated_at=timezone.now()):
+                from .search_index import refresh_documents
+                refresh_documents([self.pk])
+        self.current_cage = None
+
+    def get_ancestors(self, max_depth=None):
+        return list(Mouse.objects.ancestors_of(self, max_depth).order_by('generation', 'mouse_id'))
     
     def get_parents(self):
         parents = []
@@ -179,11 +315,8 @@ class Mouse(models.Model):
             parents.append(self.father)
         return parents
 
-    def get_descendants(self):
-        descendants = list(self.mother_of.all()) + list(self.father_of.all())
-        for child in descendants:
-            descendants.extend(child.get_descendants())
-        return descendants
+    def get_descendants(self, max_depth=None):
+        return list(Mouse.objects.descendants_of(self, max_depth).order_by('generation', 'mouse_id'))
     
     def is_kept_by_user(self, user):
         return MouseKeeper.objects.filter(mouse=self, user=user).exists()
@@ -193,28 +326,139 @@ class Mouse(models.Model):
 
     @classmethod
     def mice_managed_by_user(cls, user):
-        # Start with an empty queryset
-        mice = cls.objects.none()
+        # Mice kept by the user or one of their teams, read from the
+        # precomputed MouseAccess rows so no join or DISTINCT is needed
+        return cls.objects.filter(mouse_id__in=MouseAccess.objects.filter(user=user).values('mouse_id'))
 
-        # Retrieve all mice directly kept by the user if they are a MouseKeeper
-        if MouseKeeper.objects.filter(user=user).exists():
-            direct_mice = cls.objects.filter(mousekeeper__user=user)
-        else:
-            direct_mice = cls.objects.none()
+# ---------- Mouse Lineage (pedigree closure table) ----------
+class MouseLineage(models.Model):
+    """
+    One row per (ancestor, descendant) pair, kept in sync by the Mouse signals
+    below. ``depth`` is the shortest number of generations between the two.
+    """
+    ancestor = models.ForeignKey(Mouse, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Mouse, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
 
-        # Retrieve all team IDs the user is part of, if any
-        team_ids = TeamMembership.objects.filter(user=user).values_list('team', flat=True)
-        
-        # Retrieve mice associated with these teams, if any
-        if team_ids:
-            team_mice = cls.objects.filter(mousekeeper__team__in=team_ids)
-        else:
-            team_mice = cls.objects.none()
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        indexes = [
+            models.Index(fields=['descendant', 'depth'], name='lineage_descendant_depth_idx'),
+            models.Index(fields=['ancestor', 'depth'], name='lineage_ancestor_depth_idx'),
+        ]
+
+    def __str__(self):
+        return f"Mouse {self.ancestor_id} -> Mouse {self.descendant_id} ({self.depth})"
+
+@receiver(post_save, sender=Mouse)
+def update_mouse_lineage(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Refresh the closure rows when a mouse is added or its parents change."""
+    if raw:
+        return
+    if update_fields is not None and not {'father', 'mother'} & set(update_fields):
+        return
+    if not created:
+        stored_parents = set(
+            MouseLineage.objects.filter(descendant=instance, depth=1).values_list('ancestor_id', flat=True)
+        )
+        if stored_parents == {p for p in (instance.father_id, instance.mother_id) if p}:
+            return
+    from .pedigree import refresh_lineage
+    refresh_lineage([instance.pk])
+
+@receiver(post_save, sender=Mouse)
+def update_trees_for_labels(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Drop the cached trees showing a mouse whose tube, strain or sex changed."""
+    if raw or created:
+        return
+    if update_fields is not None and not {'tube_id', 'strain', 'sex'} & set(update_fields):
+        return
+    deferred = instance.get_deferred_fields()
+    current = {field: getattr(instance, field) for field in Mouse.TREE_LABEL_FIELDS if field not in deferred}
+    # Without the loaded values, assume the labels changed
+    before = getattr(instance, '_tree_labels', None) or {}
+    changed = {field for field, value in current.items() if field not in before or before[field] != value}
+    instance._tree_labels = current
+    if not changed:
+        return
+    from .pedigree import invalidate_descendant_trees, touch_strain_pedigrees
+    invalidate_descendant_trees([instance.pk])
+    if 'strain_id' in changed:
+        touch_strain_pedigrees({before.get('strain_id'), instance.strain_id} - {None})
+
+@receiver(pre_delete, sender=Mouse)
+def remember_children_before_delete(sender, instance, **kwargs):
+    # The children's father/mother are SET_NULL by a bulk update that sends no
+    # save signal, so note them now and recompute them once the delete is done.
+    instance._lineage_children = list(
+        Mouse.objects.filter(Q(father=instance) | Q(mother=instance)).values_list('mouse_id', flat=True)
+    )
+
+@receiver(post_delete, sender=Mouse)
+def update_lineage_after_delete(sender, instance, **kwargs):
+    children = getattr(instance, '_lineage_children', None)
+    if children:
+        from .pedigree import refresh_lineage
+        refresh_lineage(children)
+
+# ---------- Mouse Change Log ----------
+class MouseChange(models.Model):
+    """
+    One row per save that changed any of ``Mouse.HISTORY_FIELDS``, holding
+    ``{field: [old, new]}``. ``created`` rows hold the initial values.
+    """
+    mouse = models.ForeignKey(Mouse, on_delete=models.CASCADE, related_name='changes')
+    changed_at = models.DateTimeField(default=timezone.now, db_index=True)
+    created = models.BooleanField(default=False)
+    changes = models.JSONField(encoder=DjangoJSONEncoder)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['mouse', 'changed_at'], name='mousechange_mouse_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"Mouse {self.mouse_id} changed {', '.join(self.changes)} at {self.changed_at}"
+
+@receiver(post_save, sender=Mouse)
+def log_mouse_change(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Append the changed history fields of a saved mouse to MouseChange."""
+    if raw:
+        return
+    deferred = instance.get_deferred_fields()
+    current = {field: getattr(instance, field) for field in Mouse.HISTORY_FIELDS if field not in deferred}
+    if created:
+        changes = {field: [None, value] for field, value in current.items()}
+    else:
+        # Without the loaded values there is nothing to compare against
+        before = getattr(instance, '_history_values', None)
+        if before is None:
+            instance._history_values = current
+            return
+        changes = {
+            field: [before[field], value] for field, value in current.items()
+            if field in before and before[field] != value
+            and (update_fields is None or field in update_fields)
+        }
+    instance._history_values = current
+    if changes:
+        MouseChange.objects.create(mouse=instance, created=created, changes=changes)
+
+# ---------- Colony Snapshots ----------
+class ColonySnapshot(models.Model):
+    """Materialised ``Mouse.HISTORY_FIELDS`` of every mouse, the starting point for replaying MouseChange."""
+    taken_at = models.DateTimeField(db_index=True)
 
-        # Combine direct mice and team-associated mice, ensuring no duplicates
-        mice = (direct_mice | team_mice).distinct()
+    def __str__(self):
+        return f"Colony snapshot {self.taken_at:%Y-%m-%d %H:%M}"
 
-        return mice
+class MouseSnapshot(models.Model):
+    snapshot = models.ForeignKey(ColonySnapshot, on_delete=models.CASCADE, related_name='mice')
+    mouse = models.ForeignKey(Mouse, on_delete=models.CASCADE, related_name='snapshots')
+    values = models.JSONField(encoder=DjangoJSONEncoder)
+
+    class Meta:
+        unique_together = ('snapshot', 'mouse')
 
 # ---------- Mouse Keeper Model ----------
 class MouseKeeper(models.Model):
@@ -223,9 +467,15 @@ class MouseKeeper(models.Model):
     team = models.ForeignKey(Team, on_delete=models.CASCADE, null=True, blank=True)
     start_date = models.DateTimeField()
     end_date = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('mouse', 'user', 'team')
+        indexes = [
+            # "Mice kept by user/team X" is answered from the index alone
+            models.Index(fields=['user', 'mouse'], name='mousekeeper_user_mouse_idx'),
+            models.Index(fields=['team', 'mouse'], name='mousekeeper_team_mouse_idx'),
+        ]
 
     def clean(self):
         # Ensure only one of user or team is set
@@ -238,6 +488,65 @@ class MouseKeeper(models.Model):
     def __str__(self):
         return f"Mouse {self.mouse.mouse_id} - Keeper {self.user or self.team}"
 
+# ---------- Mouse Access (visibility table) ----------
+class MouseAccess(models.Model):
+    """
+    One row per (user, mouse) pair where the user keeps the mouse directly or
+    through one of their teams, kept in sync by the MouseKeeper and
+    TeamMembership signals below.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='mouse_access')
+    mouse = models.ForeignKey(Mouse, on_delete=models.CASCADE, related_name='access')
+
+    class Meta:
+        unique_together = ('user', 'mouse')
+
+    def __str__(self):
+        return f"{self.user_id} can see Mouse {self.mouse_id}"
+
+@receiver(pre_save, sender=MouseKeeper)
+def remember_keeper_mouse(sender, instance, raw=False, **kwargs):
+    # A keeper row moved to another mouse also withdraws the old mouse, so
+    # note which mouse the stored row points at before it is overwritten.
+    if raw or instance.pk is None:
+        return
+    instance._previous_mouse_id = MouseKeeper.objects.filter(pk=instance.pk).values_list('mouse_id', flat=True).first()
+
+@receiver(post_save, sender=MouseKeeper)
+@receiver(post_delete, sender=MouseKeeper)
+def update_access_for_keeper(sender, instance, raw=False, **kwargs):
+    """Recompute who can see the mouse whose keeper was added, changed or removed."""
+    if raw:
+        return
+    from .access import refresh_access
+    mouse_ids = {instance.mouse_id, getattr(instance, '_previous_mouse_id', None)} - {None}
+    refresh_access(mouse_ids=list(mouse_ids))
+
+@receiver(pre_save, sender=TeamMembership)
+def remember_membership(sender, instance, raw=False, **kwargs):
+    # Likewise a membership moved to another team or user withdraws the old
+    # team's mice from the old user.
+    if raw or instance.pk is None:
+        return
+    instance._previous_membership = TeamMembership.objects.filter(pk=instance.pk).values_list('user_id', 'team_id').first()
+
+@receiver(post_save, sender=TeamMembership)
+@receiver(post_delete, sender=TeamMembership)
+def update_access_for_membership(sender, instance, raw=False, **kwargs):
+    """Grant or withdraw the team's mice for a user joining or leaving it."""
+    if raw:
+        return
+    from .access import refresh_access
+    user_ids, team_ids = {instance.user_id}, {instance.team_id}
+    previous = getattr(instance, '_previous_membership', None)
+    if previous:
+        user_ids.add(previous[0])
+        team_ids.add(previous[1])
+    refresh_access(
+        user_ids=list(user_ids),
+        mouse_ids=MouseKeeper.objects.filter(team_id__in=team_ids).values('mouse_id'),
+    )
+
 # ---------- Base Request Model ----------
 class BaseRequest(models.Model):
     STATUS_CHOICES = [('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('completed', 'Completed')]
@@ -246,10 +555,14 @@ class BaseRequest(models.Model):
     request_date = models.DateTimeField(auto_now_add=True)
     approval_date = models.DateTimeField(null=True, blank=True)
     comments = models.TextField(blank=True, null=True)
-    
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         abstract = True
+        indexes = [
+            # The request inbox: one status section, for everyone or one requester
+            models.Index(fields=['status', 'requester'], name='%(class)s_status_req_idx'),
+        ]
     
     def is_completed(self):
         return self.status == 'completed'
@@ -269,28 +582,6 @@ class BaseRequest(models.Model):
     def get_absolute_url(self):
         return f"/requests/{self.get_request_type()}/{self.id}/"
     
-    def notify_status_change(self):
-        """Notify the requester about the status change."""
-        if self.status == 'approved':
-            msg = f"Your {self.get_request_type()} request has been approved."
-        elif self.status == 'rejected':
-            msg = f"Your {self.get_request_type()} request was rejected: {self.comments}"
-        else:
-            return
-        
-        if not self.requester:
-            logger.error(f"Requester for {self.get_request_type()} request ID {self.id} is None.")
-            return
-        
-        print(f"Sending notification to {self.requester.username}: {msg}")
-
-        Notification.objects.create(
-            recipient=self.requester,
-            message=msg,
-            request_type=self.get_request_type(),
-            request_id=self.id,
-        )
-
 # ---------- Breeding Request Model ----------
 class BreedingRequest(BaseRequest):
     male_mouse = models.ForeignKey(Mouse, on_delete=models.CASCADE, related_name='breeding_male_requests', limit_choices_to={'sex': 'M'})
@@ -307,47 +598,11 @@ class BreedingRequest(BaseRequest):
             raise ValidationError("A cage must be specified for breeding requests.")
         super().clean()
 
-    def approve(self, approver):
-        self.status = 'approved'
-        self.approval_date = dt.datetime.now()
-        self.save()
-        # Change mice states and create a Breed instance
-        self.male_mouse.state = 'breeding'
-        self.female_mouse.state = 'breeding'
-        self.male_mouse.save()
-        self.female_mouse.save()
-        Breed.objects.create(male=self.male_mouse, female=self.female_mouse, cage=self.cage)
-
-    def complete(self):
-        self.status = 'completed'
-        self.save()
-        # Additional logic on completion (optional)
-    
-    def reject(self):
-        self.status = 'rejected'
-        self.save()
-
 # ---------- Culling Request Model ----------
 class CullingRequest(BaseRequest):
     mouse = models.ForeignKey(Mouse, on_delete=models.CASCADE, related_name='culling_requests')
     requester = models.ForeignKey(User, on_delete=models.CASCADE, related_name='culling_requests', null=True, blank=True)
 
-    def complete(self):
-        self.status = 'completed'
-        self.mouse.state = 'deceased'
-        self.mouse.cull_date = dt.datetime.now()
-        self.mouse.save()
-        self.save()
-
-    def approve(self, approver):
-        self.status = 'approved'
-        self.approval_date = dt.datetime.now()
-        self.save()
-
-    def reject(self):
-        self.status = 'rejected'
-        self.save()
-
 # ---------- Transfer Request Model ----------
 class TransferRequest(BaseRequest):
     mouse = models.ForeignKey(Mouse, on_delete=models.CASCADE, related_name='transfer_requests')
@@ -364,18 +619,6 @@ class TransferRequest(BaseRequest):
         if self.source_cage_id == self.destination_cage_id:
             raise ValidationError({'destination_cage': 'Destination cage cannot be the same as the source cage.'})
 
-    def approve(self, approver):
-        self.status = 'approved'
-        self.approval_date = dt.datetime.now()
-        self.save()
-        # Update mouse's cage history
-        CageHistory.objects.filter(mouse_id=self.mouse, end_date__isnull=True).update(end_date=dt.datetime.now())
-        CageHistory.objects.create(cage_id=self.destination_cage, mouse_id=self.mouse, start_date=dt.datetime.now())
-    
-    def reject(self):
-        self.status = 'rejected'
-        self.save()
-
 # ---------- Breed Model ----------
 class Breed(models.Model):
     breed_id = models.AutoField(primary_key=True)
@@ -384,6 +627,7 @@ class Breed(models.Model):
     cage = models.ForeignKey(Cage, on_delete=models.CASCADE)
     start_date = models.DateTimeField(auto_now_add=True)
     end_date = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def end_breeding(self):
         """Set the breeding as finished and update mouse states."""
@@ -404,6 +648,121 @@ class Strain(models.Model):
     def __str__(self):
         return self.name
 
+# ---------- Deleted Record Model ----------
+class DeletedRecord(models.Model):
+    """
+    Tombstone left behind when a row of a change-tracked model is deleted, so
+    incremental exports can tell the archive which rows to drop.
+    """
+    table = models.CharField(max_length=50)
+    record_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['table', 'deleted_at'], name='deletedrecord_table_time_idx')]
+
+    def __str__(self):
+        return f"{self.table} {self.record_id} deleted {self.deleted_at}"
+
+# Models whose rows carry ``updated_at`` and leave a DeletedRecord when deleted
+CHANGE_TRACKED_MODELS = (Mouse, CageHistory, MouseKeeper, BreedingRequest, CullingRequest, TransferRequest, Breed)
+
+# Tombstones of the deletes in progress, keyed by the id of their origin (the
+# instance or queryset whose delete() was called, kept alive by the entry).
+# Django sends pre_delete for every collected row before deleting any, then
+# post_delete as it goes, all in one transaction, so the whole cascade is
+# written with one INSERT at the first post_delete.
+_pending_tombstones = {}
+
+def collect_tombstone(sender, instance, origin=None, **kwargs):
+    key = (sender._meta.model_name, instance.pk)
+    entry = _pending_tombstones.get(id(origin))
+    if entry is None or key in entry[1]:
+        # A row seen twice means a new delete() of an origin whose last one failed
+        entry = _pending_tombstones[id(origin)] = (origin, {})
+    entry[1][key] = None
+
+def record_deletions(sender, instance, origin=None, using=None, **kwargs):
+    pending = _pending_tombstones.pop(id(origin), None)
+    if pending:
+        DeletedRecord.objects.using(using).bulk_create(
+            [DeletedRecord(table=table, record_id=record_id) for table, record_id in pending[1]],
+            batch_size=1000,
+        )
+
+# Connected per model so deletes of untracked models keep Django's fast path
+for tracked_model in CHANGE_TRACKED_MODELS:
+    pre_delete.connect(collect_tombstone, sender=tracked_model, dispatch_uid=f'collect_tombstone_{tracked_model._meta.model_name}')
+    post_delete.connect(record_deletions, sender=tracked_model, dispatch_uid=f'record_deletion_{tracked_model._meta.model_name}')
+
+# ---------- Mouse Search Document ----------
+class MouseSearchDocument(models.Model):
+    """
+    Lower-cased words a mouse can be found by, indexed for full-text search
+    (see search_index.py) and rewritten by the signals below.
+    """
+    mouse = models.OneToOneField(Mouse, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    text = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Mouse {self.mouse_id}: {self.text}"
+
+def _deleting_mouse(origin):
+    # Keeper rows removed along with their mouse need no document
+    return isinstance(origin, Mouse) or getattr(origin, 'model', None) is Mouse
+
+@receiver(post_save, sender=Mouse)
+def index_mouse(sender, instance, raw=False, update_fields=None, **kwargs):
+    from .search_index import INDEXED_MOUSE_FIELDS, refresh_documents
+    if raw or (update_fields is not None and not INDEXED_MOUSE_FIELDS & set(update_fields)):
+        return
+    refresh_documents([instance.pk])
+
+@receiver(post_save, sender=MouseKeeper)
+@receiver(post_delete, sender=MouseKeeper)
+def index_keeper(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or _deleting_mouse(origin):
+        return
+    from .search_index import refresh_documents
+    refresh_documents([instance.mouse_id])
+
+@receiver(post_save, sender=Strain)
+def index_strain(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    from .search_index import refresh_documents
+    refresh_documents(Mouse.objects.filter(strain=instance).values('mouse_id'))
+
+@receiver(post_save, sender=Strain)
+def update_trees_for_strain(sender, instance, created, raw=False, **kwargs):
+    # Every tree showing a mouse of the strain carries the strain's name
+    if raw or created:
+        return
+    from .pedigree import invalidate_descendant_trees
+    invalidate_descendant_trees(Mouse.objects.filter(strain=instance).values_list('mouse_id', flat=True))
+
+@receiver(post_save, sender=Cage)
+def index_cage(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    from .search_index import refresh_documents
+    refresh_documents(Mouse.objects.filter(current_cage=instance).values('mouse_id'))
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Logins only touch last_login
+    if raw or created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    from .search_index import refresh_documents
+    refresh_documents(MouseKeeper.objects.filter(user=instance).values('mouse_id'))
+
+@receiver(post_save, sender=Team)
+def index_team(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    from .search_index import refresh_documents
+    refresh_documents(MouseKeeper.objects.filter(team=instance).values('mouse_id'))
+
 # ---------- Notification Model ----------
 class Notification(models.Model):
     recipient = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -413,5 +772,31 @@ class Notification(models.Model):
     request_type = models.CharField(max_length=20, null=True, blank=True, help_text="Type of request associated with the notification.")
     request_id = models.IntegerField(null=True, blank=True, help_text="ID of the associated request.")
 
+    class Meta:
+        indexes = [
+            # A user's notifications, newest first
+            models.Index(fields=['recipient', 'created_at'], name='notification_recip_time_idx'),
+        ]
+
     def __str__(self):
-        return f"Notification for {self.recipient.username} - {self.message[:20]}..."
\ No newline at end of file
+        return f"Notification for {self.recipient.username} - {self.message[:20]}..."
+
+# Models whose writes invalidate the cached listing counts and search
+# responses (see counts.py)
+COUNTED_MODELS = (
+    Mouse, CageHistory, MouseKeeper, TeamMembership, BreedingRequest, CullingRequest, TransferRequest, Breed,
+    Notification, Strain, Cage, User,
+)
+
+def touch_listing_counts(sender, raw=False, update_fields=None, **kwargs):
+    # Logins only touch last_login, which no listing counts
+    if raw or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    from .counts import touch_counts
+    # After commit, so concurrent writers do not queue on the shared version
+    # row of a DatabaseCache and a rollback leaves the cached counts alone
+    transaction.on_commit(lambda: touch_counts(sender), using=kwargs.get('using'))
+
+for counted_model in COUNTED_MODELS:
+    post_save.connect(touch_listing_counts, sender=counted_model, dispatch_uid=f'touch_counts_save_{counted_model._meta.model_name}')
+    post_delete.connect(touch_listing_counts, sender=counted_model, dispatch_uid=f'touch_counts_delete_{counted_model._meta.model_name}')
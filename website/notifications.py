@@ -0,0 +1,68 @@
+"""
+Notifications, collected and written together.
+
+Code with something to tell users adds it to a ``NotificationBatch``, for one
+user or for every member of a team, while it works. ``send`` writes the whole
+batch with one INSERT once the surrounding transaction commits (straight
+away outside a transaction); a rolled back transaction sends nothing. Team
+members are looked up in the same step, with one query for all the teams.
+
+A user is told about a request once per batch, however many ways they were
+reached (as requester, keeper, member of a keeper team); the first message
+added for them wins. Messages not about a request are only merged when they
+are identical.
+"""
+from django.db import transaction
+
+from .counts import touch_counts
+from .models import Notification, TeamMembership
+
+
+def _request_fields(request):
+    if request is None:
+        return {'request_type': None, 'request_id': None}
+    return {'request_type': request.get_request_type(), 'request_id': request.pk}
+
+
+class NotificationBatch:
+    def __init__(self):
+        # (recipient kind, recipient id, message, request fields) in the order added
+        self._events = []
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, user, message, request=None):
+        """Tell ``user`` (a User or its id) ``message``, optionally about ``request``."""
+        if user is not None:
+            self._events.append(('user', getattr(user, 'pk', user), message, _request_fields(request)))
+
+    def add_team(self, team, message, request=None):
+        """Tell every member of ``team`` (a Team or its id) ``message``."""
+        if team is not None:
+            self._events.append(('team', getattr(team, 'pk', team), message, _request_fields(request)))
+
+    def send(self):
+        """Write the batch when the current transaction commits."""
+        events, self._events = self._events, []
+        if events:
+            transaction.on_commit(lambda: _write(events))
+
+
+def _write(events):
+    team_ids = {recipient for kind, recipient, _, _ in events if kind == 'team'}
+    members = {}
+    if team_ids:
+        for team_id, user_id in TeamMembership.objects.filter(team_id__in=team_ids).values_list('team_id', 'user_id'):
+            members.setdefault(team_id, []).append(user_id)
+
+    notifications, seen = [], set()
+    for kind, recipient, message, fields in events:
+        for user_id in members.get(recipient, []) if kind == 'team' else [recipient]:
+            key = (user_id, fields['request_type'], fields['request_id']) if fields['request_id'] else (user_id, message)
+            if key not in seen:
+                seen.add(key)
+                notifications.append(Notification(recipient_id=user_id, message=message, **fields))
+    if notifications:
+        Notification.objects.bulk_create(notifications)
+        touch_counts(Notification)
@@ -0,0 +1,348 @@
+"""
+Pedigree helpers built on the ``MouseLineage`` closure table.
+
+Every (ancestor, descendant) pair in the colony is stored once together with
+the smallest number of generations separating them, so ancestor/descendant
+lookups are a single indexed query instead of one query per parent/child.
+The functions here recompute those rows whenever a mouse's parents change.
+
+``family_rows`` walks the pedigree in the other direction too (parents,
+children, siblings, mates...) with a single recursive CTE for the genetic tree.
+"""
+import logging
+import uuid
+from collections import deque
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Define logger
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+# Ancestor trees served to the mouse details page are cut off after this many
+# generations and cached per (mouse, depth) until the pedigree changes.
+PEDIGREE_MAX_DEPTH = 10
+PEDIGREE_CACHE_TIMEOUT = 60 * 10
+
+
+def _topological_order(parents):
+    """
+    Order the mice in ``parents`` so every mouse comes after any parent that is
+    also in ``parents``. Mice caught in a (corrupt) parent cycle are dropped.
+    """
+    children = {mouse_id: [] for mouse_id in parents}
+    pending = {}
+    for mouse_id, mouse_parents in parents.items():
+        internal = [p for p in mouse_parents if p in parents]
+        pending[mouse_id] = len(internal)
+        for parent_id in internal:
+            children[parent_id].append(mouse_id)
+
+    queue = deque(mouse_id for mouse_id, count in pending.items() if count == 0)
+    order = []
+    while queue:
+        mouse_id = queue.popleft()
+        order.append(mouse_id)
+        for child_id in children[mouse_id]:
+            pending[child_id] -= 1
+            if pending[child_id] == 0:
+                queue.append(child_id)
+
+    if len(order) != len(parents):
+        logger.warning("Pedigree cycle detected, skipping mice: %s",
+                       sorted(set(parents) - set(order)))
+    return order
+
+
+def _lineage_rows(parents, known_ancestry):
+    """
+    Yield ``(ancestor_id, descendant_id, depth)`` for every mouse in ``parents``.
+
+    ``parents`` maps mouse_id -> [father_id, mother_id] for the mice being
+    recomputed; ``known_ancestry`` maps mouse_id -> {ancestor_id: depth} for
+    parents outside that set whose rows are already correct.
+    """
+    ancestry = dict(known_ancestry)
+    for mouse_id in _topological_order(parents):
+        ancestors = {}
+        for parent_id in parents[mouse_id]:
+            if ancestors.get(parent_id, 2) > 1:
+                ancestors[parent_id] = 1
+            for ancestor_id, depth in ancestry.get(parent_id, {}).items():
+                if ancestors.get(ancestor_id, depth + 2) > depth + 1:
+                    ancestors[ancestor_id] = depth + 1
+        ancestry[mouse_id] = ancestors
+        for ancestor_id, depth in ancestors.items():
+            yield ancestor_id, mouse_id, depth
+
+
+def _write_rows(rows):
+    """Bulk insert lineage rows in fixed-size batches."""
+    from .models import MouseLineage
+
+    batch = []
+    for ancestor_id, descendant_id, depth in rows:
+        batch.append(MouseLineage(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth))
+        if len(batch) >= BATCH_SIZE:
+            MouseLineage.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        MouseLineage.objects.bulk_create(batch)
+
+
+def refresh_lineage(mouse_ids):
+    """
+    Recompute the closure rows for the given mice and everything descended
+    from them. Call this after a mouse is created or its parents change.
+    """
+    from .models import Mouse, MouseLineage
+
+    mouse_ids = set(mouse_ids)
+    if not mouse_ids:
+        return
+
+    with transaction.atomic():
+        # The descendants of a mouse do not depend on its own parents, so the
+        # existing closure rows tell us which subtree needs recomputing.
+        subtree = mouse_ids | set(
+            MouseLineage.objects.filter(ancestor_id__in=mouse_ids).values_list('descendant_id', flat=True)
+        )
+        parents = {}
+        strains = set()
+        for mouse_id, father_id, mother_id, strain_id in Mouse.objects.filter(mouse_id__in=subtree).values_list(
+            'mouse_id', 'father_id', 'mother_id', 'strain_id'
+        ):
+            parents[mouse_id] = [p for p in (father_id, mother_id) if p]
+            strains.add(strain_id)
+
+        MouseLineage.objects.filter(descendant_id__in=parents).delete()
+        _write_rows(_lineage_rows(parents, _known_ancestry(parents)))
+
+    invalidate_ancestor_trees(parents)
+    touch_strain_pedigrees(strains)
+
+
+def add_lineage(parents, strain_ids):
+    """
+    Write the closure rows of freshly inserted mice, given as a ``{mouse_id:
+    [father_id, mother_id]}`` mapping, for bulk inserts that send no signals.
+    New mice have no descendants and nothing cached yet, so unlike
+    ``refresh_lineage`` this only reads the ancestry of their parents.
+    """
+    if not parents:
+        return
+    with transaction.atomic():
+        _write_rows(_lineage_rows(parents, _known_ancestry(parents)))
+    touch_strain_pedigrees(strain_ids)
+
+
+def _known_ancestry(parents):
+    """Stored ancestry of every parent that is not itself being recomputed."""
+    from .models import MouseLineage
+
+    outside = {p for mouse_parents in parents.values() for p in mouse_parents if p not in parents}
+    known_ancestry = {parent_id: {} for parent_id in outside}
+    for descendant_id, ancestor_id, depth in MouseLineage.objects.filter(
+        descendant_id__in=outside
+    ).values_list('descendant_id', 'ancestor_id', 'depth'):
+        known_ancestry[descendant_id][ancestor_id] = depth
+    return known_ancestry
+
+
+def rebuild_lineage():
+    """Drop and recompute the entire closure table. Returns the row count."""
+    from .models import Mouse, MouseLineage, Strain
+
+    with transaction.atomic():
+        MouseLineage.objects.all().delete()
+        parents = {
+            mouse_id: [p for p in (father_id, mother_id) if p]
+            for mouse_id, father_id, mother_id in Mouse.objects.values_list('mouse_id', 'father_id', 'mother_id')
+            .iterator(chunk_size=BATCH_SIZE)
+        }
+        _write_rows(_lineage_rows(parents, {}))
+        rows = MouseLineage.objects.count()
+
+    invalidate_ancestor_trees(parents)
+    touch_strain_pedigrees(Strain.objects.values_list('id', flat=True))
+    return rows
+
+
+def strain_pedigree_version(strain_id):
+    """
+    Opaque token that changes whenever a mouse of the strain is added or has
+    its lineage recomputed, for use in cache keys of per-strain results.
+    """
+    key = f"pedigree-version:{strain_id}"
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(key, version, None)
+    return version
+
+
+def touch_strain_pedigrees(strain_ids):
+    """Invalidate every per-strain result cached under the old version tokens."""
+    cache.set_many({f"pedigree-version:{strain_id}": uuid.uuid4().hex for strain_id in strain_ids}, None)
+
+
+def _ancestor_tree_key(mouse_id, depth):
+    return f"pedigree:{mouse_id}:{depth}"
+
+
+def invalidate_descendant_trees(mouse_ids):
+    """
+    Drop the cached ancestor trees of the given mice and of every descendant,
+    whose trees show them, e.g. after a mouse's label changes.
+    """
+    from .models import MouseLineage
+
+    mouse_ids = set(mouse_ids)
+    descendants = MouseLineage.objects.filter(ancestor_id__in=mouse_ids).values_list('descendant_id', flat=True)
+    invalidate_ancestor_trees(mouse_ids.union(descendants.iterator(chunk_size=BATCH_SIZE)))
+
+
+def invalidate_ancestor_trees(mouse_ids):
+    """Drop every cached ancestor tree for the given mice."""
+    keys = []
+    for mouse_id in mouse_ids:
+        keys.extend(_ancestor_tree_key(mouse_id, depth) for depth in range(1, PEDIGREE_MAX_DEPTH + 1))
+        if len(keys) >= BATCH_SIZE:
+            cache.delete_many(keys)
+            keys = []
+    if keys:
+        cache.delete_many(keys)
+
+
+def ancestor_tree(mouse, depth):
+    """
+    Return the ancestors of ``mouse`` as nested ``{'id', 'name', 'sex',
+    'has_more', 'children'}`` dicts, ``depth`` generations deep. Nodes on the
+    last generation have ``has_more`` set when they have parents of their own,
+    so the page can fetch that branch later with another call.
+    """
+    from .models import Mouse
+
+    depth = max(1, min(depth, PEDIGREE_MAX_DEPTH))
+    key = _ancestor_tree_key(mouse.mouse_id, depth)
+    tree = cache.get(key)
+    if tree is not None:
+        return tree
+
+    ancestors = {
+        row['mouse_id']: row
+        for row in Mouse.objects.ancestors_of(mouse, max_depth=depth)
+        .values('mouse_id', 'tube_id', 'sex', 'father_id', 'mother_id', 'strain__name')
+    }
+
+    def build(node, level):
+        parents = [ancestors[p] for p in (node['father_id'], node['mother_id']) if p in ancestors]
+        return {
+            'id': node['mouse_id'],
+            'name': f"Strain {node['strain__name']} - TubeID {node['tube_id']}",
+            'sex': node['sex'],
+            'has_more': level == depth and bool(node['father_id'] or node['mother_id']),
+            'children': [build(parent, level + 1) for parent in parents] if level < depth else [],
+        }
+
+    tree = build({
+        'mouse_id': mouse.mouse_id,
+        'tube_id': mouse.tube_id,
+        'sex': mouse.sex,
+        'father_id': mouse.father_id,
+        'mother_id': mouse.mother_id,
+        'strain__name': mouse.strain.name,
+    }, 0)
+    cache.set(key, tree, PEDIGREE_CACHE_TIMEOUT)
+    return tree
+
+
+# Undirected walk over the parent/child graph. Each step joins the frontier to
+# every mouse row that mentions it (as itself, father or mother) and fans that
+# row out into up to three neighbours via ``slots``, so the CTE only references
+# itself once, which keeps it valid on SQLite, MySQL 8 and PostgreSQL.
+_FAMILY_SQL = """
+WITH RECURSIVE
+    slots(slot) AS (SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3),
+    family({family_columns}) AS (
+        SELECT m.{id}{seed} FROM {mouse} m WHERE m.{id} = %s
+        UNION
+        SELECT CASE s.slot WHEN 1 THEN m.{id} WHEN 2 THEN m.{father} ELSE m.{mother} END{step}
+        FROM family f
+        JOIN {mouse} m ON (m.{id} = f.mouse_id OR m.{father} = f.mouse_id OR m.{mother} = f.mouse_id)
+        CROSS JOIN slots s
+        WHERE ((s.slot = 1 AND m.{id} <> f.mouse_id)
+            OR (s.slot = 2 AND m.{id} = f.mouse_id AND m.{father} IS NOT NULL)
+            OR (s.slot = 3 AND m.{id} = f.mouse_id AND m.{mother} IS NOT NULL)){radius}
+    )
+SELECT m.{id}, m.{tube}, m.{father}, m.{mother}, st.{strain_name}
+FROM {mouse} m
+JOIN {strain_table} st ON st.{strain_pk} = m.{strain_fk}
+WHERE m.{id} IN (SELECT mouse_id FROM family)
+ORDER BY m.{id}
+"""
+
+
+def _family_sql(radius):
+    from django.db import connection
+    from .models import Mouse, Strain
+
+    qn = connection.ops.quote_name
+    fields = Mouse._meta
+    if radius is None:
+        # Without a distance column UNION discards revisited mice, which is
+        # what stops the recursion once the whole family has been found.
+        bounds = {'family_columns': 'mouse_id', 'seed': '', 'step': '', 'radius': ''}
+    else:
+        bounds = {'family_columns': 'mouse_id, distance', 'seed': ', 0',
+                  'step': ', f.distance + 1', 'radius': '\n            AND f.distance < %s'}
+    return _FAMILY_SQL.format(
+        mouse=qn(fields.db_table),
+        id=qn(fields.get_field('mouse_id').column),
+        tube=qn(fields.get_field('tube_id').column),
+        father=qn(fields.get_field('father').column),
+        mother=qn(fields.get_field('mother').column),
+        strain_fk=qn(fields.get_field('strain').column),
+        strain_table=qn(Strain._meta.db_table),
+        strain_pk=qn(Strain._meta.pk.column),
+        strain_name=qn(Strain._meta.get_field('name').column),
+        **bounds,
+    )
+
+
+def family_rows(mouse_id, radius=None):
+    """
+    Fetch every mouse connected to ``mouse_id`` through any chain of
+    parent/child links (or only those within ``radius`` links, at most
+    ``PEDIGREE_MAX_DEPTH``) in one query.
+    Returns ``(mouse_id, tube_id, father_id, mother_id, strain_name)`` tuples.
+    """
+    from django.db import connection
+
+    if radius is not None:
+        # The bounded query revisits mice and runs one step per link, so cap it
+        radius = max(1, min(radius, PEDIGREE_MAX_DEPTH))
+    params = [mouse_id] if radius is None else [mouse_id, radius]
+    with connection.cursor() as cursor:
+        cursor.execute(_family_sql(radius), params)
+        return cursor.fetchall()
+
+
+def family_cytoscape_data(mouse_id, radius=None):
+    """Build the Cytoscape ``{'nodes': [...], 'edges': [...]}`` payload for a family."""
+    rows = family_rows(mouse_id, radius)
+    members = {row[0] for row in rows}
+    nodes = []
+    edges = []
+    for member_id, tube_id, father_id, mother_id, strain_name in rows:
+        nodes.append({'data': {
+            'id': str(member_id),
+            'label': f"Strain {strain_name} - TubeID {tube_id}",
+            'highlight': member_id == mouse_id,
+        }})
+        for parent_id in (father_id, mother_id):
+            if parent_id in members:
+                edges.append({'data': {'source': str(parent_id), 'target': str(member_id)}})
+    return {'nodes': nodes, 'edges': edges}
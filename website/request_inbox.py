@@ -0,0 +1,130 @@
+"""
+Transfer, breeding and culling requests listed together.
+
+The three request tables are projected to one row shape and combined with
+``UNION ALL``, so a page of the inbox, whatever its mix of types, is a single
+query that already carries the requester, mice and cages it shows. Each
+section selects its requests with ``status IN (...)``, which an index on
+status can serve, and is paged on its own. A page fetches one row more than
+it shows to tell whether another follows, so the union is never counted.
+"""
+import datetime as dt
+from typing import NamedTuple, Optional
+
+from django.db.models import CharField, F, IntegerField, Value
+
+from .models import BaseRequest
+from .request_workflow import REQUEST_MODELS
+
+# section -> (statuses listed, ordering). The open queue is worked through
+# oldest first, the history is read newest first.
+SECTIONS = {
+    'current': (('pending', 'approved'), ('requested_at', 'request_id', 'request_type')),
+    'completed': (('completed', 'rejected'), ('-requested_at', '-request_id', 'request_type')),
+}
+
+# Per type: the mouse, second mouse, cage moved from and cage moved to
+_COLUMNS = {
+    'transfer': ('mouse_id', None, 'source_cage__cage_number', 'destination_cage__cage_number'),
+    'breeding': ('male_mouse_id', 'female_mouse_id', None, 'cage__cage_number'),
+    'culling': ('mouse_id', None, None, None),
+}
+
+_STATUS_LABELS = dict(BaseRequest.STATUS_CHOICES)
+
+
+class InboxRow(NamedTuple):
+    request_type: str
+    request_id: int
+    status: str
+    request_date: dt.datetime
+    requester: Optional[str]
+    mouse_id: int
+    second_mouse_id: Optional[int]
+    from_cage: Optional[str]
+    to_cage: Optional[str]
+
+    @property
+    def id(self):
+        return self.request_id
+
+    def is_pending(self):
+        return self.status == 'pending'
+
+    def get_status_display(self):
+        return _STATUS_LABELS.get(self.status, self.status)
+
+
+def section_requests(section, requester=None):
+    """``{request_type: queryset}`` of the requests in ``section``, all of them or only ``requester``'s."""
+    statuses = SECTIONS[section][0]
+    requests = {}
+    for request_type, model in REQUEST_MODELS.items():
+        queryset = model.objects.filter(status__in=statuses)
+        if requester is not None:
+            queryset = queryset.filter(requester=requester)
+        requests[request_type] = queryset
+    return requests
+
+
+def _projection(request_type, queryset):
+    mouse, second_mouse, from_cage, to_cage = _COLUMNS[request_type]
+    # Every column is an annotation, added in the same order for each type,
+    # so the SELECT lists of the union line up
+    return queryset.order_by().values(
+        request_type=Value(request_type, output_field=CharField()),
+        request_id=F('id'),
+        request_status=F('status'),
+        requested_at=F('request_date'),
+        requester_name=F('requester__username'),
+        first_mouse=F(mouse),
+        second_mouse=F(second_mouse) if second_mouse else Value(None, output_field=IntegerField()),
+        from_cage=F(from_cage) if from_cage else Value(None, output_field=CharField()),
+        to_cage=F(to_cage) if to_cage else Value(None, output_field=CharField()),
+    )
+
+
+def inbox_rows(section, requests):
+    """The union of ``requests`` (as from section_requests) as InboxRow-shaped dicts, in the section's order."""
+    parts = [_projection(request_type, queryset) for request_type, queryset in requests.items()]
+    return parts[0].union(*parts[1:], all=True).order_by(*SECTIONS[section][1])
+
+
+class InboxPage:
+    """One page of a section: its rows and whether pages precede or follow it."""
+
+    def __init__(self, object_list, number, has_next):
+        self.object_list = object_list
+        self.number = number
+        self.has_next = has_next
+
+    @property
+    def has_previous(self):
+        return self.number > 1
+
+    @property
+    def next_page_number(self):
+        return self.number + 1
+
+    @property
+    def previous_page_number(self):
+        return self.number - 1
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+def inbox_page(section, requests, number=1, per_page=25):
+    """
+    Page ``number`` of the section. One row past the page is fetched to tell
+    whether another page follows, so no count of the union is needed.
+    """
+    start = (number - 1) * per_page
+    rows = [InboxRow(*row.values()) for row in inbox_rows(section, requests)[start:start + per_page + 1]]
+    return InboxPage(rows[:per_page], number, len(rows) > per_page)
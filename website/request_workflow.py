@@ -0,0 +1,269 @@
+"""
+State machine for breeding, culling and transfer requests.
+
+A request starts ``pending``; a breeder either approves it, which applies it
+and leaves it ``completed``, or rejects it. Approving a
+
+* transfer moves the mouse to the destination cage,
+* breeding moves both mice to the breeding cage, marks them ``breeding`` and
+  starts a ``Breed``,
+* culling takes the mouse out of its cage and marks it ``deceased``.
+
+Each transition runs in one transaction that first locks the request row and
+then the rows of its mice (``select_for_update``, in primary key order), so
+two breeders acting on the same request, or on requests for the same mouse,
+are applied one after the other and the second sees the first's result
+instead of moving the mouse twice. ``bulk_transition`` handles a list of
+requests of mixed types the same way, in one transaction, reporting on each.
+Requesters, and on approval the keepers of the mice, are notified through a
+``NotificationBatch`` written when the transaction commits.
+
+The side effects are set-based: one UPDATE closes the open placements, one
+INSERT opens the new ones, one UPDATE changes the mice and one INSERT logs
+their ``MouseChange`` rows, however many mice are involved. None of these
+send model signals, so the search documents and count caches they would have
+refreshed are refreshed here.
+"""
+from typing import NamedTuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .counts import touch_counts
+from .models import (
+    Breed, BreedingRequest, CageHistory, CullingRequest, Mouse, MouseChange, MouseKeeper, TransferRequest,
+)
+from .notifications import NotificationBatch
+from .search_index import refresh_documents
+
+# (status, action) -> status after the action
+TRANSITIONS = {
+    ('pending', 'approve'): 'completed',
+    ('pending', 'reject'): 'rejected',
+}
+
+REQUEST_MODELS = {
+    'transfer': TransferRequest,
+    'breeding': BreedingRequest,
+    'culling': CullingRequest,
+}
+
+
+class InvalidTransition(ValueError):
+    """The request (or one of its mice) is not in a state the action applies to."""
+
+
+class BulkResult(NamedTuple):
+    request_type: str
+    request_id: int
+    ok: bool
+    message: str
+
+
+def request_mouse_ids(request):
+    if isinstance(request, BreedingRequest):
+        return [request.male_mouse_id, request.female_mouse_id]
+    return [request.mouse_id]
+
+
+def _describe(request, mice):
+    labels = ' and '.join(str(mice[mouse_id]) for mouse_id in request_mouse_ids(request))
+    return f"{request.get_request_type()} request for {labels}"
+
+
+def _lock_mice(mouse_ids):
+    """The mice, locked for the rest of the transaction, by primary key."""
+    features = connection.features
+    if features.has_select_for_update and not features.has_select_for_update_of:
+        # Without FOR UPDATE OF (MariaDB, MySQL before 8) the strain join
+        # would lock the strain rows too, so strains are read separately
+        locked = Mouse.objects.select_for_update().prefetch_related('strain').filter(pk__in=mouse_ids)
+    else:
+        locked = Mouse.objects.select_for_update(of=('self',)).select_related('strain').filter(pk__in=mouse_ids)
+    return {mouse.pk: mouse for mouse in locked.order_by('pk')}
+
+
+def _check(request, action, mice, busy=()):
+    """
+    Status ``request`` moves to under ``action``. Raises InvalidTransition
+    when it was already handled, or when approving it would change a mouse
+    that is deceased or in ``busy`` (changed by another request of the batch).
+    """
+    status = TRANSITIONS.get((request.status, action))
+    if status is None:
+        raise InvalidTransition(f"This {request.get_request_type()} request is already {request.status}.")
+    if action == 'approve':
+        for mouse_id in request_mouse_ids(request):
+            if mouse_id in busy:
+                raise InvalidTransition(f"Mouse {mouse_id} is already changed by another request of this batch.")
+            if mice[mouse_id].state == 'deceased':
+                raise InvalidTransition(f"Mouse {mouse_id} is no longer alive, so the {_describe(request, mice)} cannot be approved.")
+    return status
+
+
+def _effects(request, when):
+    """``({mouse_id: new cage id or None}, {mouse_id: {field: value}}, [Breed])`` of approving ``request``."""
+    if isinstance(request, TransferRequest):
+        return {request.mouse_id: request.destination_cage_id}, {}, []
+    if isinstance(request, BreedingRequest):
+        pair = (request.male_mouse_id, request.female_mouse_id)
+        breed = Breed(male_id=pair[0], female_id=pair[1], cage_id=request.cage_id)
+        return (
+            {mouse_id: request.cage_id for mouse_id in pair},
+            {mouse_id: {'state': 'breeding'} for mouse_id in pair},
+            [breed],
+        )
+    return {request.mouse_id: None}, {request.mouse_id: {'state': 'deceased', 'cull_date': when}}, []
+
+
+def _apply(requests, mice, when):
+    """Apply the approval side effects of ``requests`` to the locked ``mice``."""
+    placements, values, breeds = {}, {}, []
+    for request in requests:
+        request_placements, request_values, request_breeds = _effects(request, when)
+        placements.update(request_placements)
+        for mouse_id, mouse_values in request_values.items():
+            values.setdefault(mouse_id, {}).update(mouse_values)
+        breeds.extend(request_breeds)
+
+    CageHistory.objects.filter(mouse_id__in=placements, end_date__isnull=True).update(end_date=when, updated_at=when)
+    CageHistory.objects.bulk_create([
+        CageHistory(cage_id_id=cage_id, mouse_id_id=mouse_id, start_date=when)
+        for mouse_id, cage_id in placements.items() if cage_id is not None
+    ])
+
+    changed_mice = sorted(placements.keys() | values.keys())
+    fields = {'current_cage', 'updated_at'}
+    changes = []
+    for mouse_id in changed_mice:
+        mouse = mice[mouse_id]
+        if mouse_id in placements:
+            mouse.current_cage_id = placements[mouse_id]
+        changed = {}
+        for field, value in values.get(mouse_id, {}).items():
+            fields.add(field)
+            if field in Mouse.HISTORY_FIELDS and getattr(mouse, field) != value:
+                changed[field] = [getattr(mouse, field), value]
+            setattr(mouse, field, value)
+        if changed:
+            changes.append(MouseChange(mouse_id=mouse_id, changed_at=when, changes=changed))
+        mouse.updated_at = when
+    Mouse.objects.bulk_update([mice[mouse_id] for mouse_id in changed_mice], sorted(fields))
+    MouseChange.objects.bulk_create(changes)
+    Breed.objects.bulk_create(breeds)
+
+    refresh_documents(changed_mice)
+    transaction.on_commit(lambda: touch_counts(Mouse, CageHistory, Breed))
+
+
+def _set_status(requests, status, when):
+    fields = ['status', 'updated_at']
+    if status == 'completed':
+        fields.append('approval_date')
+    for model in {type(request) for request in requests}:
+        batch = [request for request in requests if type(request) is model]
+        for request in batch:
+            request.status = status
+            request.updated_at = when
+            if status == 'completed':
+                request.approval_date = when
+        model.objects.bulk_update(batch, fields)
+    transaction.on_commit(lambda: touch_counts(*{type(request) for request in requests}))
+
+
+def _notify(requests, action, mice):
+    """
+    Tell each requester the outcome and, for approvals, the keepers of the
+    mice (every member of a keeper team) that their mice were changed.
+    """
+    outcome = 'approved' if action == 'approve' else 'rejected'
+    batch = NotificationBatch()
+    for request in requests:
+        batch.add(request.requester_id, f"Your {_describe(request, mice)} has been {outcome}.", request)
+
+    if action == 'approve':
+        keepers = {}
+        mouse_ids = {mouse_id for request in requests for mouse_id in request_mouse_ids(request)}
+        for mouse_id, user_id, team_id in MouseKeeper.objects.filter(mouse_id__in=mouse_ids).values_list('mouse_id', 'user_id', 'team_id'):
+            keepers.setdefault(mouse_id, []).append((user_id, team_id))
+        for request in requests:
+            message = f"A {_describe(request, mice)}, which you keep, has been approved."
+            for mouse_id in request_mouse_ids(request):
+                for user_id, team_id in keepers.get(mouse_id, []):
+                    batch.add(user_id, message, request)
+                    batch.add_team(team_id, message, request)
+    batch.send()
+
+
+def transition(model, request_id, action):
+    """
+    Apply ``action`` ('approve' or 'reject') to the request of ``model`` with
+    ``request_id`` and notify its requester. Raises ``model.DoesNotExist``, or
+    InvalidTransition when the request was already handled or its mice can
+    no longer take part; nothing is changed in either case.
+    """
+    when = timezone.now()
+    with transaction.atomic():
+        request = model.objects.select_for_update().get(pk=request_id)
+        mice = _lock_mice(request_mouse_ids(request))
+        status = _check(request, action, mice)
+        if action == 'approve':
+            _apply([request], mice, when)
+        _set_status([request], status, when)
+        _notify([request], action, mice)
+    return request
+
+
+def bulk_transition(items, action):
+    """
+    Apply ``action`` to every ``(request_type, request_id)`` of ``items``
+    (types as in REQUEST_MODELS) in one transaction. Items that cannot take
+    the action are skipped; the rest are applied together, with the same
+    statements a single request takes. Returns a BulkResult per item, in
+    order.
+    """
+    when = timezone.now()
+    with transaction.atomic():
+        # Lock the requests, then all their mice, each in primary key order
+        requests = {}
+        for request_type, model in REQUEST_MODELS.items():
+            ids = {request_id for item_type, request_id in items if item_type == request_type}
+            if ids:
+                locked = model.objects.select_for_update().filter(pk__in=ids).order_by('pk')
+                requests.update({(request_type, request.pk): request for request in locked})
+        mice = _lock_mice({mouse_id for request in requests.values() for mouse_id in request_mouse_ids(request)})
+
+        results, accepted, busy = [], {}, set()
+        for request_type, request_id in items:
+            request = requests.get((request_type, request_id))
+            if request is None:
+                results.append(BulkResult(request_type, request_id, False, "No such request."))
+                continue
+            if (request_type, request_id) in accepted:
+                results.append(BulkResult(request_type, request_id, False, "Listed more than once."))
+                continue
+            try:
+                status = _check(request, action, mice, busy)
+            except InvalidTransition as error:
+                results.append(BulkResult(request_type, request_id, False, str(error)))
+                continue
+            if action == 'approve':
+                busy.update(request_mouse_ids(request))
+            accepted[request_type, request_id] = request
+            results.append(BulkResult(request_type, request_id, True, f"{status.capitalize()}."))
+
+        accepted = list(accepted.values())
+        if accepted:
+            if action == 'approve':
+                _apply(accepted, mice, when)
+            _set_status(accepted, TRANSITIONS['pending', action], when)
+            _notify(accepted, action, mice)
+    return results
+
+
+def approve(model, request_id):
+    return transition(model, request_id, 'approve')
+
+
+def reject(model, request_id):
+    return transition(model, request_id, 'reject')
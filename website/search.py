@@ -0,0 +1,280 @@
+"""
+Mouse search queries for the home page.
+
+A query is a list of terms combined with ``AND``, ``OR`` and ``NOT``
+(case-insensitive; ``NOT`` binds tightest, then ``AND``, then ``OR``, and
+terms written side by side without an operator are ANDed). A term is either
+shorthand such as ``m12``/``t3``/``male``/``BR``/a date, a ``field:value``
+pair, or free text matched against the full-text index (search_index.py); double quotes keep a phrase together even if it holds
+an operator word.
+
+The query is tokenized and parsed into a small AST once, compiled to a ``Q``
+and the result kept in a bounded LRU keyed by the normalized query, so
+re-running a search (paging, sorting) costs a dictionary lookup. Dates are
+recognised with a single precompiled pattern instead of trying every
+``strptime`` format in turn.
+"""
+import datetime as dt
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+from django.db.models import Q
+
+from .search_index import text_filter
+
+SEARCH_CACHE_SIZE = 512
+
+OPERATORS = ('AND', 'OR', 'NOT')
+
+# Quoted phrase, or a run of anything but whitespace and quotes
+_TOKEN_RE = re.compile(r'"([^"]*)"?|([^\s"]+)')
+
+# d/m/y, m/d/y or y/m/d with '.', '/' or '-' used consistently
+_DATE_RE = re.compile(r'(\d{1,4})([-./])(\d{1,2})\2(\d{1,4})')
+_ID_RE = re.compile(r'([mt])(\d+)', re.IGNORECASE)
+
+EARMARKS = {'TR', 'TL', 'BR', 'BL'}
+SEXES = {'male': 'M', 'female': 'F'}
+STATES = {'alive': 'alive', 'breeding': 'breeding', 'to be culled': 'to_be_culled', 'deceased': 'deceased'}
+WEANED = {'yes': True, 'no': False}
+DATE_FIELDS = ('dob', 'clipped_date', 'weaned_date', 'cull_date')
+
+# Matches nothing; negated it matches everything, as unusable values always have
+NOTHING = Q(pk__in=[])
+
+
+class Term(NamedTuple):
+    text: str
+
+
+class Not(NamedTuple):
+    operand: tuple
+
+
+class And(NamedTuple):
+    operands: tuple
+
+
+class Or(NamedTuple):
+    operands: tuple
+
+
+def tokenize(query):
+    """
+    Split a query into operator names and terms. Unquoted words between
+    operators are joined into one term, so ``to be culled`` stays a phrase.
+    """
+    tokens = []
+    words = []
+    for match in _TOKEN_RE.finditer(query):
+        quoted, word = match.groups()
+        if word is not None and word.upper() in OPERATORS:
+            if words:
+                tokens.append(Term(' '.join(words)))
+                words = []
+            tokens.append(word.upper())
+        elif quoted is not None:
+            if words:
+                tokens.append(Term(' '.join(words)))
+                words = []
+            if quoted.strip():
+                tokens.append(Term(' '.join(quoted.split())))
+        else:
+            words.append(word)
+    if words:
+        tokens.append(Term(' '.join(words)))
+    return tokens
+
+
+class _Parser:
+    """Recursive descent over the token list; stray operators are skipped rather than rejected."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def parse(self):
+        node = self.parse_or()
+        # Anything left over starts with a stray OR/AND; keep what follows it
+        while self.peek() is not None:
+            self.position += 1
+            rest = self.parse_or()
+            node = _combine(Or, [node, rest])
+        return node
+
+    def parse_or(self):
+        operands = [self.parse_and()]
+        while self.peek() == 'OR':
+            self.position += 1
+            operands.append(self.parse_and())
+        return _combine(Or, operands)
+
+    def parse_and(self):
+        operands = [self.parse_not()]
+        while self.peek() is not None and self.peek() != 'OR':
+            if self.peek() == 'AND':
+                self.position += 1
+            operands.append(self.parse_not())
+        return _combine(And, operands)
+
+    def parse_not(self):
+        token = self.peek()
+        if token == 'NOT':
+            self.position += 1
+            operand = self.parse_not()
+            return Not(operand) if operand is not None else None
+        if isinstance(token, Term):
+            self.position += 1
+            return token
+        return None
+
+
+def _combine(node_type, operands):
+    operands = tuple(operand for operand in operands if operand is not None)
+    if not operands:
+        return None
+    return operands[0] if len(operands) == 1 else node_type(operands)
+
+
+def parse(query):
+    """Parse a query into its AST, or None when it holds no terms."""
+    return _Parser(tokenize(query)).parse()
+
+
+def normalize(query):
+    """Canonical spelling of a query: same tokens, same cache entry."""
+    return ' '.join(
+        token if isinstance(token, str) else f'"{token.text}"' for token in tokenize(query)
+    )
+
+
+def parse_date(text):
+    """
+    Parse dates such as 24.1.25, 24/01/2025, 2025-01-24 or (when the day-first
+    reading is impossible) 1/24/2025. Returns None for anything else.
+    """
+    match = _DATE_RE.fullmatch(text.strip())
+    if match is None:
+        return None
+    first, _, middle, last = match.groups()
+    if len(first) == 4:
+        candidates = [(first, middle, last)] if len(last) <= 2 else []
+    elif len(first) <= 2 and len(last) in (2, 4):
+        # Day first, then month first, as the formats were tried before
+        candidates = [(last, middle, first), (last, first, middle)]
+    else:
+        candidates = []
+    for year, month, day in candidates:
+        full_year = int(year)
+        if len(year) == 2:
+            # strptime's %y pivot
+            full_year += 2000 if full_year < 69 else 1900
+        try:
+            return dt.date(full_year, int(month), int(day))
+        except ValueError:
+            continue
+    return None
+
+
+def _day_filter(field, day):
+    if field == 'cull_date':
+        # Has a time component
+        return Q(cull_date__date=day)
+    return Q(**{f'{field}__gte': day, f'{field}__lt': day + dt.timedelta(days=1)})
+
+
+def _int_filter(field, value):
+    return Q(**{field: int(value)}) if value.isdigit() else NOTHING
+
+
+def _choice_filter(field, choices, value):
+    return Q(**{field: choices[value]}) if value in choices else NOTHING
+
+
+def _date_filter(field, value):
+    day = parse_date(value)
+    return _day_filter(field, day) if day else NOTHING
+
+
+FIELD_FILTERS = {
+    'mouse_id': lambda value: _int_filter('mouse_id', value),
+    'tube_id': lambda value: _int_filter('tube_id', value),
+    'earmark': lambda value: Q(earmark__icontains=value.upper()) if value.upper() in EARMARKS else NOTHING,
+    'sex': lambda value: _choice_filter('sex', SEXES, value.lower()),
+    'state': lambda value: _choice_filter('state', STATES, value.lower()),
+    'weaned': lambda value: Q(weaned=value.lower() == 'yes'),
+    'strain': lambda value: Q(strain__name__icontains=value),
+    **{field: (lambda value, field=field: _date_filter(field, value)) for field in DATE_FIELDS},
+}
+
+
+def term_filter(text):
+    """The ``Q`` for a single search term."""
+    if ':' in text:
+        field, value = text.split(':', 1)
+        field_filter = FIELD_FILTERS.get(field.strip().lower())
+        if field_filter is None:
+            # Unknown field: search the whole term as a strain name
+            return Q(strain__name__icontains=text)
+        return field_filter(value.strip())
+
+    lowered = text.lower()
+    if text.isdigit():
+        return Q(mouse_id=int(text))
+    match = _ID_RE.fullmatch(text)
+    if match:
+        field = 'mouse_id' if match.group(1).lower() == 'm' else 'tube_id'
+        return Q(**{field: int(match.group(2))})
+    if text.upper() in EARMARKS:
+        return Q(earmark__icontains=text.upper())
+    if lowered in STATES:
+        return Q(state=STATES[lowered])
+    if lowered in SEXES:
+        return Q(sex=SEXES[lowered])
+    if lowered in WEANED:
+        return Q(weaned=WEANED[lowered])
+    day = parse_date(text)
+    if day:
+        return _day_filter('dob', day)
+    # Anything else is looked up in the full-text index (strain, genotype,
+    # state, earmarks, cage, keepers)
+    return text_filter(text)
+
+
+def compile_node(node):
+    """Turn a parsed query into a ``Q``."""
+    if isinstance(node, Term):
+        return term_filter(node.text)
+    if isinstance(node, Not):
+        return ~compile_node(node.operand)
+    combined = None
+    for operand in node.operands:
+        q = compile_node(operand)
+        if combined is None:
+            combined = q
+        elif isinstance(node, And):
+            combined &= q
+        else:
+            combined |= q
+    return combined
+
+
+@lru_cache(maxsize=SEARCH_CACHE_SIZE)
+def _compiled(normalized):
+    node = parse(normalized)
+    return compile_node(node) if node is not None else None
+
+
+@lru_cache(maxsize=SEARCH_CACHE_SIZE)
+def search_filter(query):
+    """
+    The ``Q`` for a search box query, or None when there is nothing to
+    filter on. Compiled queries are cached by their normalized form (and the
+    exact text, to skip re-tokenizing repeats); ``Q`` objects are never
+    modified in place, so cached ones can be shared.
+    """
+    return _compiled(normalize(query))
@@ -0,0 +1,160 @@
+"""
+Full-text index over mice.
+
+Every mouse has a ``MouseSearchDocument`` holding the lower-cased words it can
+be found by: strain name, tube ID, genotype, state, earmarks, current cage
+number and the names of its keepers. The document is rewritten whenever one
+of those changes (see the signals in models.py), so the search never joins
+across the tables it was built from.
+
+How the document column is indexed depends on the database:
+
+* SQLite: an external-content FTS5 table (``website_mousesearch_fts``) kept in
+  step with the documents by triggers; terms are prefix queries ranked by
+  bm25, with prefix indexes for the short prefixes typed into search boxes.
+* PostgreSQL: a ``pg_trgm`` GIN index, which serves the substring ``LIKE``
+  the ORM generates; results are ranked by ``word_similarity``.
+* Anything else: the same ``LIKE`` without an index.
+
+The FTS table, triggers and trigram index are created by the migration that
+adds the document table. ``rebuild_search_index`` refills everything.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Mouse, MouseKeeper, MouseSearchDocument
+
+BATCH_SIZE = 2000
+
+FTS_TABLE = 'website_mousesearch_fts'
+
+# Matches scored by bm25 when ranking on SQLite
+RANK_CANDIDATES = 2000
+
+# Mouse fields that end up in the document
+INDEXED_MOUSE_FIELDS = {'strain', 'tube_id', 'genotype', 'state', 'earmark', 'current_cage'}
+
+MOUSE_COLUMNS = ('mouse_id', 'strain__name', 'tube_id', 'genotype', 'state', 'earmark', 'current_cage__cage_number')
+KEEPER_COLUMNS = ('mouse_id', 'user__username', 'user__first_name', 'user__last_name', 'team__name')
+
+_LABELS = {**dict(Mouse.GENOTYPE_CHOICES), **dict(Mouse.STATE_CHOICES)}
+_WORD_RE = re.compile(r'\S+')
+
+
+def document_text(mouse, keepers, labels=_LABELS):
+    """
+    Words for one mouse, from a ``MOUSE_COLUMNS`` dict and a list of
+    ``KEEPER_COLUMNS`` dicts.
+    """
+    earmark = mouse['earmark'] or []
+    if isinstance(earmark, str):
+        earmark = earmark.split(',')
+    parts = [
+        mouse['strain__name'], str(mouse['tube_id']),
+        mouse['genotype'], labels.get(mouse['genotype']),
+        labels.get(mouse['state']), *earmark, mouse['current_cage__cage_number'],
+    ]
+    for keeper in keepers:
+        parts.extend(keeper[column] for column in KEEPER_COLUMNS[1:])
+    return ' '.join(part.strip() for part in parts if part and part.strip()).lower()
+
+
+def refresh_documents(mouse_ids):
+    """Rewrite the documents of the given mice (ids or a subquery)."""
+    keepers = {}
+    for keeper in MouseKeeper.objects.filter(mouse_id__in=mouse_ids).values(*KEEPER_COLUMNS):
+        keepers.setdefault(keeper['mouse_id'], []).append(keeper)
+    documents = [
+        MouseSearchDocument(mouse_id=mouse['mouse_id'], text=document_text(mouse, keepers.get(mouse['mouse_id'], [])))
+        for mouse in Mouse.objects.filter(mouse_id__in=mouse_ids).values(*MOUSE_COLUMNS)
+    ]
+    upsert = {'update_conflicts': True, 'update_fields': ['text']}
+    # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target, and Django
+    # refuses unique_fields there
+    if connection.features.supports_update_conflicts_with_target:
+        upsert['unique_fields'] = ['mouse']
+    MouseSearchDocument.objects.bulk_create(documents, batch_size=BATCH_SIZE, **upsert)
+
+
+def rebuild_search_index():
+    """Recompute every document (and the FTS table on SQLite); returns the number of documents."""
+    with transaction.atomic():
+        MouseSearchDocument.objects.all().delete()
+        ids = list(Mouse.objects.order_by('mouse_id').values_list('mouse_id', flat=True))
+        for start in range(0, len(ids), BATCH_SIZE):
+            refresh_documents(ids[start:start + BATCH_SIZE])
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return len(ids)
+
+
+def _fts_query(text):
+    # Each word becomes a quoted prefix phrase, so punctuation in the search
+    # box (C57BL/6, quotes, operators) is never read as FTS5 syntax
+    return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in _WORD_RE.findall(text.lower()))
+
+
+def text_filter(text):
+    """Filter for mice whose document matches every word of ``text`` as a prefix (or substring)."""
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return None
+    if connection.vendor == 'sqlite':
+        return Q(mouse_id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [_fts_query(text)]))
+    documents = MouseSearchDocument.objects.all()
+    for word in words:
+        documents = documents.filter(text__contains=word)
+    return Q(mouse_id__in=documents.values('mouse_id'))
+
+
+def ranked_mouse_ids(text, limit=20, mice=None):
+    """
+    Ids of the best ``limit`` mice matching ``text``, best first, optionally
+    restricted to the ``mice`` queryset.
+    """
+    if not _WORD_RE.search(text):
+        return []
+    if connection.vendor == 'sqlite':
+        sql = f"SELECT rowid, rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+        params = [_fts_query(text)]
+        if mice is not None:
+            mice_sql, mice_params = mice.order_by().values('mouse_id').query.sql_with_params()
+            # The unary + keeps SQLite from handing the IN list to FTS5 as
+            # rowid lookups, which would run one full-text query per mouse
+            sql += f" AND +rowid IN ({mice_sql})"
+            params.extend(mice_params)
+        # Scoring every match of a common prefix costs more than the lookup
+        # itself, so only the newest RANK_CANDIDATES matches are ranked
+        sql = f"SELECT rowid FROM ({sql} ORDER BY rowid DESC LIMIT %s) ORDER BY rank, rowid LIMIT %s"
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*params, RANK_CANDIDATES, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    documents = MouseSearchDocument.objects.filter(text_filter(text))
+    if mice is not None:
+        documents = documents.filter(mouse_id__in=mice.order_by().values('mouse_id'))
+    if connection.vendor == 'postgresql':
+        rank = RawSQL('word_similarity(%s, "website_mousesearchdocument"."text")', [text.lower()])
+        documents = documents.annotate(rank=rank).order_by('-rank', 'mouse_id')
+    else:
+        documents = documents.order_by('mouse_id')
+    return list(documents.values_list('mouse_id', flat=True)[:limit])
+
+
+def suggested_mouse_ids(text, limit=20, mice=None):
+    """
+    Ids for a typeahead: the mouse whose id is ``text`` (if it is a number)
+    first, then the best prefix matches of ``ranked_mouse_ids``.
+    """
+    text = text.strip()
+    ids = ranked_mouse_ids(text, limit, mice)
+    if text.isdigit():
+        mouse_id = int(text)
+        exact = (Mouse.objects.all() if mice is None else mice).filter(mouse_id=mouse_id)
+        if mouse_id in ids or exact.exists():
+            ids = [mouse_id, *(i for i in ids if i != mouse_id)][:limit]
+    return ids
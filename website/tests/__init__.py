@@ -0,0 +1,3 @@
+# Tests that count queries use a per-process cache, so the reads and writes
+# of the shared database cache stay out of the counts
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
@@ -0,0 +1,113 @@
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.urls import reverse
+from website.models import *
+from website.tests import LOCMEM_CACHES
+from website.breeding import recommend_pairs, genotype_yield, age_scores
+from datetime import date, timedelta
+import numpy as np
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BreedingRecommendationTest(TestCase):
+    def setUp(self):
+        """Sets up a strain with related and unrelated candidates of breeding age."""
+        cache.clear()
+        self.today = date(2025, 6, 1)
+        prime = self.today - timedelta(days=90)
+        self.strain = Strain.objects.create(name="KO-line")
+        self.sire = Mouse.objects.create(strain=self.strain, tube_id=1, dob=prime - timedelta(days=200), sex='M',
+                                         genotype='ht', state='breeding')
+        self.dam = Mouse.objects.create(strain=self.strain, tube_id=2, dob=prime - timedelta(days=200), sex='F',
+                                        genotype='ht', state='breeding')
+        self.son = Mouse.objects.create(strain=self.strain, tube_id=3, dob=prime, sex='M', genotype='ht',
+                                        father=self.sire, mother=self.dam)
+        self.daughter = Mouse.objects.create(strain=self.strain, tube_id=4, dob=prime, sex='F', genotype='ht',
+                                             father=self.sire, mother=self.dam)
+        self.outsider = Mouse.objects.create(strain=self.strain, tube_id=5, dob=prime, sex='F', genotype='ht')
+        self.wild = Mouse.objects.create(strain=self.strain, tube_id=6, dob=prime, sex='F', genotype='wt')
+        self.old = Mouse.objects.create(strain=self.strain, tube_id=7, dob=self.today - timedelta(days=700),
+                                        sex='F', genotype='ht')
+
+    def test_genotype_yield(self):
+        """Tests Mendelian expectations for ht x ht and ko x wt crosses."""
+        males = np.array([0.5, 1.0], dtype=np.float32)
+        females = np.array([0.5, 0.0], dtype=np.float32)
+        self.assertAlmostEqual(genotype_yield(males, females, 'ko')[0, 0], 0.25)
+        self.assertAlmostEqual(genotype_yield(males, females, 'ht')[1, 1], 1.0)
+        self.assertAlmostEqual(genotype_yield(males, np.array([np.nan]), 'ko')[0, 0], 0.0)
+
+    def test_age_scores(self):
+        """Tests ages inside the prime window score 1 and very old or young mice score 0."""
+        scores = age_scores(np.array([10, 90, 1000], dtype=np.float32))
+        self.assertEqual(list(scores), [0.0, 1.0, 0.0])
+
+    def test_unrelated_pair_ranked_first(self):
+        """Tests the unrelated prime-age ht female is preferred for a knockout target."""
+        pairs = recommend_pairs(self.strain.id, target_genotype='ko', today=self.today)
+        self.assertEqual((pairs[0]['male_id'], pairs[0]['female_id']), (self.son.mouse_id, self.outsider.mouse_id))
+        self.assertEqual(pairs[0]['kinship'], 0.0)
+        self.assertEqual(pairs[0]['expected_yield'], 0.25)
+
+    def test_sibling_pair_ranked_below_outsider(self):
+        """Tests full siblings score lower than the same male with an unrelated female."""
+        pairs = {(p['male_id'], p['female_id']): p for p in recommend_pairs(self.strain.id, 'ko', today=self.today)}
+        siblings = pairs[(self.son.mouse_id, self.daughter.mouse_id)]
+        self.assertEqual(siblings['kinship'], 0.25)
+        self.assertLess(siblings['score'], pairs[(self.son.mouse_id, self.outsider.mouse_id)]['score'])
+
+    def test_unavailable_mice_excluded(self):
+        """Tests mice that are already breeding are not recommended."""
+        pairs = recommend_pairs(self.strain.id, today=self.today, limit=100)
+        self.assertNotIn(self.sire.mouse_id, {p['male_id'] for p in pairs})
+        self.assertEqual(len(pairs), 4)   # one available male x four available females
+
+    def test_limit(self):
+        """Tests only the requested number of pairs is returned."""
+        self.assertEqual(len(recommend_pairs(self.strain.id, today=self.today, limit=2)), 2)
+
+    def test_kinship_index_cached_until_pedigree_changes(self):
+        """Tests the strain's kinship index is reused across requests, and rebuilt once the pedigree changes."""
+        first = recommend_pairs(self.strain.id, 'ko', today=self.today)
+        with self.assertNumQueries(2):   # only the candidate list, once per call
+            self.assertEqual(recommend_pairs(self.strain.id, 'ko', today=self.today), first)
+            recommend_pairs(self.strain.id, 'ht', limit=3, today=self.today + timedelta(days=1))
+
+        Mouse.objects.filter(pk=self.outsider.pk).update(state='breeding')
+        with self.assertNumQueries(1):
+            pairs = recommend_pairs(self.strain.id, 'ko', today=self.today)
+        self.assertNotIn(self.outsider.mouse_id, {p['female_id'] for p in pairs})
+
+        newcomer = Mouse.objects.create(strain=self.strain, tube_id=8, dob=self.today - timedelta(days=90), sex='F',
+                                        genotype='ko', father=self.son, mother=self.daughter)
+        pairs = recommend_pairs(self.strain.id, 'ko', today=self.today, limit=100)
+        inbred = [p for p in pairs if p['female_id'] == newcomer.mouse_id]
+        self.assertEqual(inbred[0]['kinship'], 0.375)   # son with his daughter by his full sister
+
+    def test_kinship_index_rebuilt_for_missing_candidate(self):
+        """Tests a mouse moved in from another strain without a pedigree change is still scored."""
+        recommend_pairs(self.strain.id, today=self.today)
+        other = Strain.objects.create(name="Other line")
+        incomer = Mouse.objects.create(strain=other, tube_id=99, dob=self.today - timedelta(days=90), sex='F')
+        Mouse.objects.filter(pk=incomer.pk).update(strain=self.strain)
+        pairs = recommend_pairs(self.strain.id, today=self.today, limit=100)
+        self.assertIn(incomer.mouse_id, {p['female_id'] for p in pairs})
+
+    def test_recommend_endpoint(self):
+        """Tests the JSON endpoint validates its parameters and returns ranked pairs."""
+        user = User.objects.create_user(username="leader", email="leader@abdn.ac.uk", password="pass123", role='leader')
+        self.client.force_login(user)
+        response = self.client.get(reverse('recommend_breeding_pairs'), {'strain': self.strain.id, 'genotype': 'ko', 'limit': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['pairs']), 3)
+
+        response = self.client.get(reverse('recommend_breeding_pairs'), {'strain': self.strain.id, 'genotype': 'xx'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_recommend_endpoint_validates_strain(self):
+        """Tests a missing or non-numeric strain is a 400 and an unknown one a 404."""
+        user = User.objects.create_user(username="leader", email="leader@abdn.ac.uk", password="pass123", role='leader')
+        self.client.force_login(user)
+        url = reverse('recommend_breeding_pairs')
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'strain': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'strain': 999999}).status_code, 404)
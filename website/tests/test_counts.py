@@ -0,0 +1,110 @@
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from website.models import *
+from website.tests import LOCMEM_CACHES
+from website import counts
+from website.counts import ResultCount, cached_count, touch_counts
+from datetime import date
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CachedCountTest(TestCase):
+    def setUp(self):
+        """Sets up a user keeping three mice, with an empty cache."""
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", email="test@abdn.ac.uk", password="pass123")
+        self.strain = Strain.objects.create(name="C57BL/6")
+        for tube_id in range(3):
+            mouse = Mouse.objects.create(strain=self.strain, tube_id=tube_id, dob=date(2025, 1, 1), sex='M')
+            MouseKeeper.objects.create(mouse=mouse, user=self.user, start_date=timezone.now())
+
+    def test_repeat_counts_hit_cache(self):
+        """Tests a second count of the same listing runs no query."""
+        self.assertEqual(cached_count(Mouse.objects.filter(sex='M'), 'test', self.user), ResultCount(3))
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_count(Mouse.objects.filter(sex='M'), 'test', self.user), ResultCount(3))
+
+    def test_keys_per_user_and_filter(self):
+        """Tests counts are kept apart by view, user and filter."""
+        other = User.objects.create_user(username="other", email="other@abdn.ac.uk", password="pass123")
+        cached_count(Mouse.objects.filter(sex='M'), 'test', self.user, filters='male')
+        self.assertEqual(cached_count(Mouse.objects.filter(sex='F'), 'test', self.user, filters='female').value, 0)
+        self.assertEqual(cached_count(Mouse.objects.filter(sex='F'), 'test', other, filters='male').value, 0)
+        self.assertEqual(cached_count(Mouse.objects.filter(sex='F'), 'other', self.user, filters='male').value, 0)
+
+    def test_writes_invalidate(self):
+        """Tests saving or deleting a counted row, or touching its model, drops the cached count."""
+        mice = Mouse.objects.filter(sex='M')
+        cached_count(mice, 'test')
+        with self.captureOnCommitCallbacks(execute=True):
+            Mouse.objects.create(strain=self.strain, tube_id=9, dob=date(2025, 1, 1), sex='M')
+        self.assertEqual(cached_count(mice, 'test').value, 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            Mouse.objects.filter(tube_id=9).delete()
+        self.assertEqual(cached_count(mice, 'test').value, 3)
+        Mouse.objects.filter(tube_id=0).update(sex='F')
+        self.assertEqual(cached_count(mice, 'test').value, 3)
+        touch_counts(Mouse)
+        self.assertEqual(cached_count(mice, 'test').value, 2)
+
+    def test_depends_on(self):
+        """Tests writes to a dependency invalidate counts of another model."""
+        mice = Mouse.mice_managed_by_user(self.user)
+        cached_count(mice, 'test', self.user, depends_on=(MouseKeeper,))
+        with self.captureOnCommitCallbacks(execute=True):
+            MouseKeeper.objects.filter(user=self.user).first().delete()
+        self.assertEqual(cached_count(mice, 'test', self.user, depends_on=(MouseKeeper,)).value, 2)
+
+    def test_versions_bumped_on_commit(self):
+        """Tests a write bumps the version only once it commits, and a login not at all."""
+        version = counts.count_version([Mouse])
+        with self.captureOnCommitCallbacks() as callbacks:
+            Mouse.objects.create(strain=self.strain, tube_id=9, dob=date(2025, 1, 1), sex='M')
+        self.assertEqual(counts.count_version([Mouse]), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(counts.count_version([Mouse]), version)
+
+        version = counts.count_version([User])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.last_login = timezone.now()
+            self.user.save(update_fields=['last_login'])
+        self.assertEqual(counts.count_version([User]), version)
+
+    def test_large_unfiltered_listing_estimated(self):
+        """Tests an unfiltered listing of a large table uses the planner estimate."""
+        with mock.patch.object(counts, 'estimated_rows', return_value=250_000):
+            estimate = cached_count(Mouse.objects.all(), 'test')
+            filtered = cached_count(Mouse.objects.filter(sex='M'), 'test-filtered')
+        self.assertEqual(estimate, ResultCount(250_000, approximate=True))
+        self.assertEqual(str(estimate), "about 250,000")
+        self.assertEqual(filtered, ResultCount(3))
+
+        with mock.patch.object(counts, 'estimated_rows', return_value=10):
+            touch_counts(Mouse)
+            self.assertEqual(cached_count(Mouse.objects.all(), 'test'), ResultCount(3))
+
+    def test_estimated_rows(self):
+        """Tests the estimate is read from the statistics once the table is analyzed."""
+        if connection.vendor != 'sqlite':
+            self.skipTest("sqlite_stat1 only")
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.assertEqual(counts.estimated_rows(Mouse), 3)
+
+    def test_views_show_counts(self):
+        """Tests the listings show their counts."""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('index'), {'search': 't1 OR t2'})
+        self.assertEqual(response.context['mouse_count'], ResultCount(2))
+        self.assertContains(response, "2 mice")
+
+        Notification.objects.create(recipient=self.user, message="Hello")
+        response = self.client.get(reverse('notifications', args=[self.user.username]))
+        self.assertEqual(response.context['notification_count'].value, 1)
+
+        response = self.client.get(reverse('all_requests'))
+        self.assertEqual(response.context['counts']['current_transfers'].value, 0)
@@ -0,0 +1,242 @@
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, transaction
+from django.urls import reverse
+from django.http import StreamingHttpResponse
+from website.models import *
+from website.exports import stream_database_zip, CHUNK_SIZE, WATERMARK_OVERLAP
+from datetime import date
+from django.utils import timezone
+from io import BytesIO
+import csv
+import io
+import zipfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+def read_zip(data):
+    """Returns {file name: list of CSV rows} for a zip held in bytes."""
+    with zipfile.ZipFile(BytesIO(data)) as zip_file:
+        return {
+            name: list(csv.reader(io.TextIOWrapper(zip_file.open(name), encoding='utf-8')))
+            for name in zip_file.namelist()
+        }
+
+def read_parquet_files(data):
+    """Returns {file name: ParquetFile} for the Parquet entries of a zip held in bytes."""
+    with zipfile.ZipFile(BytesIO(data)) as zip_file:
+        return {
+            name: pq.ParquetFile(BytesIO(zip_file.read(name)))
+            for name in zip_file.namelist() if name.endswith('.parquet')
+        }
+
+class DatabaseExportTest(TestCase):
+    def setUp(self):
+        """Sets up a user, a strain and two mice, one the child of the other."""
+        self.user = User.objects.create_user(username="testuser", email="test@abdn.ac.uk", password="pass123")
+        self.strain = Strain.objects.create(name="C57BL/6")
+        self.mother = Mouse.objects.create(strain=self.strain, tube_id=1, dob=date(2024, 1, 1), sex='F')
+        self.child = Mouse.objects.create(strain=self.strain, tube_id=2, dob=date(2024, 6, 1), sex='M',
+                                          mother=self.mother)
+
+    def test_zip_contains_csv_per_model(self):
+        """Tests every model gets a CSV with a header row and one row per record."""
+        files = read_zip(b''.join(stream_database_zip()))
+        self.assertIn("mouse.csv", files)
+        self.assertIn("strain.csv", files)
+        self.assertEqual(len(files["mouse.csv"]), 3)
+        self.assertEqual(files["strain.csv"], [["id", "name"], [str(self.strain.id), "C57BL/6"]])
+
+    def test_foreign_keys_exported_as_ids(self):
+        """Tests foreign keys are written as integer ids rather than object descriptions."""
+        rows = read_zip(b''.join(stream_database_zip([Mouse])))["mouse.csv"]
+        header, child = rows[0], next(r for r in rows[1:] if r[0] == str(self.child.mouse_id))
+        self.assertEqual(child[header.index('mother')], str(self.mother.mouse_id))
+        self.assertEqual(child[header.index('strain')], str(self.strain.id))
+        self.assertEqual(child[header.index('father')], "")
+
+    def test_large_table_is_streamed_in_chunks(self):
+        """Tests a table larger than one chunk is yielded in several pieces."""
+        Strain.objects.bulk_create([Strain(name=f"S{i}") for i in range(CHUNK_SIZE * 2)])
+        pieces = [piece for piece in stream_database_zip([Strain]) if piece]
+        self.assertGreater(len(pieces), 2)
+        self.assertEqual(len(read_zip(b''.join(pieces))["strain.csv"]), CHUNK_SIZE * 2 + 2)
+
+    def test_download_view_streams(self):
+        """Tests the download view returns a streaming zip attachment."""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('download_database_csv'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        files = read_zip(b''.join(response.streaming_content))
+        self.assertIn("mouse.csv", files)
+
+class IncrementalExportTest(TestCase):
+    def setUp(self):
+        """Sets up two mice last changed a day ago and a watermark an hour after that."""
+        self.user = User.objects.create_user(username="testuser", email="test@abdn.ac.uk", password="pass123")
+        self.strain = Strain.objects.create(name="C57BL/6")
+        self.old_mouse = Mouse.objects.create(strain=self.strain, tube_id=1, dob=date(2024, 1, 1), sex='F')
+        self.changed_mouse = Mouse.objects.create(strain=self.strain, tube_id=2, dob=date(2024, 1, 1), sex='M')
+        yesterday = timezone.now() - timezone.timedelta(days=1)
+        Mouse.objects.update(updated_at=yesterday)
+        self.watermark = yesterday + timezone.timedelta(hours=1)
+
+    def test_updated_at_set_on_save(self):
+        """Tests saving a mouse moves its updated_at past the watermark."""
+        self.changed_mouse.state = 'breeding'
+        self.changed_mouse.save()
+        self.changed_mouse.refresh_from_db()
+        self.assertGreater(self.changed_mouse.updated_at, self.watermark)
+
+    def test_only_changed_rows_exported(self):
+        """Tests rows not changed since the watermark are left out."""
+        self.changed_mouse.state = 'breeding'
+        self.changed_mouse.save()
+        files = read_zip(b''.join(stream_database_zip([Mouse, Strain], watermarks={None: self.watermark})))
+        self.assertEqual([row[0] for row in files["mouse.csv"][1:]], [str(self.changed_mouse.mouse_id)])
+        # Tables without change tracking are exported in full
+        self.assertEqual(len(files["strain.csv"]), 2)
+
+    def test_late_commit_inside_overlap_exported(self):
+        """Tests a row stamped just before the watermark, but committed after it was taken, is still exported."""
+        Mouse.objects.filter(pk=self.changed_mouse.pk).update(updated_at=self.watermark - WATERMARK_OVERLAP / 2)
+        Mouse.objects.filter(pk=self.old_mouse.pk).update(updated_at=self.watermark - WATERMARK_OVERLAP * 2)
+        files = read_zip(b''.join(stream_database_zip([Mouse], watermarks={None: self.watermark})))
+        self.assertEqual([row[0] for row in files["mouse.csv"][1:]], [str(self.changed_mouse.mouse_id)])
+
+    def test_deletions_exported_as_tombstones(self):
+        """Tests deleted rows show up in deletedrecord.csv."""
+        mouse_id = self.old_mouse.mouse_id
+        self.old_mouse.delete()
+        files = read_zip(b''.join(stream_database_zip([Mouse, DeletedRecord], watermarks={None: self.watermark})))
+        tombstones = [row[1:3] for row in files["deletedrecord.csv"][1:]]
+        self.assertEqual(tombstones, [["mouse", str(mouse_id)]])
+        self.assertEqual(len(files["mouse.csv"]), 1)
+
+    def test_cascade_tombstones_written_in_one_insert(self):
+        """Tests deleting a mouse writes the tombstones of every cascaded row with a single INSERT."""
+        cage = Cage.objects.create(cage_number="T-1", cage_type="standard", location="Lab")
+        now = timezone.now()
+        for days in (3, 2):
+            CageHistory.objects.create(cage_id=cage, mouse_id=self.old_mouse, start_date=now - timezone.timedelta(days=days),
+                                       end_date=now - timezone.timedelta(days=days - 1))
+        MouseKeeper.objects.create(mouse=self.old_mouse, user=self.user, start_date=now)
+        mouse_id = self.old_mouse.mouse_id
+        with CaptureQueriesContext(connection) as queries:
+            self.old_mouse.delete()
+        inserts = [q['sql'] for q in queries if q['sql'].startswith('INSERT INTO "website_deletedrecord"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            sorted(DeletedRecord.objects.values_list('table', flat=True)),
+            ['cagehistory', 'cagehistory', 'mouse', 'mousekeeper'],
+        )
+        self.assertTrue(DeletedRecord.objects.filter(table='mouse', record_id=mouse_id).exists())
+
+    def test_rolled_back_delete_leaves_no_tombstones(self):
+        """Tests a delete that is rolled back records nothing, and a retry records its rows once."""
+        try:
+            with transaction.atomic():
+                self.old_mouse.delete()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(DeletedRecord.objects.exists())
+        Mouse.objects.get(pk=self.changed_mouse.pk).delete()
+        self.assertEqual(list(DeletedRecord.objects.values_list('record_id', flat=True)), [self.changed_mouse.mouse_id])
+
+    def test_watermarks_file(self):
+        """Tests the new high-water mark of each tracked table is reported."""
+        self.changed_mouse.save()
+        self.changed_mouse.refresh_from_db()
+        files = read_zip(b''.join(stream_database_zip([Mouse, CageHistory], watermarks={None: self.watermark})))
+        marks = dict(files["watermarks.csv"][1:])
+        self.assertEqual(marks["mouse"], self.changed_mouse.updated_at.isoformat())
+        self.assertEqual(marks["cagehistory"], self.watermark.isoformat())
+
+    def test_per_table_watermark(self):
+        """Tests a table-specific watermark overrides the general one."""
+        files = read_zip(b''.join(stream_database_zip([Mouse], watermarks={'mouse': self.watermark - timezone.timedelta(days=2)})))
+        self.assertEqual(len(files["mouse.csv"]), 3)
+
+    def test_download_view_since(self):
+        """Tests the view accepts 'since' and rejects timestamps it cannot parse."""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('download_database_csv'), {'since': self.watermark.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("database_changes.zip", response['Content-Disposition'])
+        files = read_zip(b''.join(response.streaming_content))
+        self.assertEqual(len(files["mouse.csv"]), 1)
+
+        response = self.client.get(reverse('download_database_csv'), {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+class ParquetExportTest(TestCase):
+    def setUp(self):
+        """Sets up a user, a strain and three mice."""
+        self.user = User.objects.create_user(username="testuser", email="test@abdn.ac.uk", password="pass123")
+        self.strain = Strain.objects.create(name="C57BL/6")
+        self.mother = Mouse.objects.create(strain=self.strain, tube_id=1, dob=date(2024, 1, 1), sex='F',
+                                           earmark=['TL'])
+        self.child = Mouse.objects.create(strain=self.strain, tube_id=2, dob=date(2024, 6, 1), sex='M',
+                                          mother=self.mother, genotype='ht')
+        Mouse.objects.create(strain=self.strain, tube_id=3, dob=date(2024, 6, 1), sex='M', mother=self.mother)
+
+    def test_zip_contains_parquet_per_model(self):
+        """Tests every model gets a Parquet file with one row per record."""
+        files = read_parquet_files(b''.join(stream_database_zip(format='parquet')))
+        self.assertEqual(files["mouse.parquet"].metadata.num_rows, 3)
+        self.assertEqual(files["strain.parquet"].metadata.num_rows, 1)
+        self.assertEqual(files["cage.parquet"].metadata.num_rows, 0)
+
+    def test_column_types_follow_fields(self):
+        """Tests columns are typed from the model fields instead of exported as text."""
+        schema = read_parquet_files(b''.join(stream_database_zip([Mouse], format='parquet')))["mouse.parquet"].schema_arrow
+        self.assertEqual(schema.field('mouse_id').type, pa.int64())
+        self.assertEqual(schema.field('mother').type, pa.int64())
+        self.assertTrue(schema.field('mother').nullable)
+        self.assertFalse(schema.field('tube_id').nullable)
+        self.assertEqual(schema.field('dob').type, pa.date32())
+        self.assertEqual(schema.field('updated_at').type, pa.timestamp('us', tz='UTC'))
+        self.assertEqual(schema.field('weaned').type, pa.bool_())
+        self.assertEqual(schema.field('earmark').type, pa.string())
+        self.assertTrue(pa.types.is_dictionary(schema.field('sex').type))
+        self.assertTrue(pa.types.is_dictionary(schema.field('genotype').type))
+
+    def test_column_statistics(self):
+        """Tests values land in the right columns, checked through the row group statistics."""
+        metadata = read_parquet_files(b''.join(stream_database_zip([Mouse], format='parquet')))["mouse.parquet"].metadata
+        columns = {metadata.schema.column(i).name: i for i in range(metadata.num_columns)}
+        tube_id = metadata.row_group(0).column(columns['tube_id']).statistics
+        self.assertEqual((tube_id.min, tube_id.max), (1, 3))
+        mother = metadata.row_group(0).column(columns['mother']).statistics
+        self.assertEqual(mother.null_count, 1)
+        self.assertEqual(mother.min, self.mother.mouse_id)
+
+    def test_large_table_is_split_into_row_groups(self):
+        """Tests a table larger than one chunk is written as several row groups."""
+        Strain.objects.bulk_create([Strain(name=f"S{i}") for i in range(CHUNK_SIZE * 2)])
+        pieces = [piece for piece in stream_database_zip([Strain], format='parquet') if piece]
+        self.assertGreater(len(pieces), 2)
+        metadata = read_parquet_files(b''.join(pieces))["strain.parquet"].metadata
+        self.assertEqual(metadata.num_rows, CHUNK_SIZE * 2 + 1)
+        self.assertEqual(metadata.num_row_groups, 3)
+
+    def test_incremental_parquet_keeps_csv_watermarks(self):
+        """Tests a delta export in Parquet still records its watermarks as CSV."""
+        data = b''.join(stream_database_zip([Mouse], watermarks={}, format='parquet'))
+        self.assertEqual(read_parquet_files(data)["mouse.parquet"].metadata.num_rows, 3)
+        with zipfile.ZipFile(BytesIO(data)) as zip_file:
+            self.assertIn("watermarks.csv", zip_file.namelist())
+
+    def test_download_view_format(self):
+        """Tests the view serves Parquet on request and rejects unknown formats."""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('download_database_csv'), {'format': 'parquet'})
+        self.assertEqual(response.status_code, 200)
+        files = read_parquet_files(b''.join(response.streaming_content))
+        self.assertIn("mouse.parquet", files)
+
+        response = self.client.get(reverse('download_database_csv'), {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
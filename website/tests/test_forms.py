@@ -1,4 +1,5 @@
 from django.test import TestCase
+from django.urls import reverse
 from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
 import os
@@ -722,6 +723,20 @@ class AddMouseFormTest(TestCase):
         form = AddMouseForm(data=data, user=self.user)
         self.assertTrue(form.is_valid())
 
+    def test_parent_selects_render_only_chosen_mouse(self):
+        """Test that the parent selects list only the chosen mouse and point at the typeahead."""
+        for tube_id in range(3, 8):
+            Mouse.objects.create(tube_id=tube_id, sex='M', strain=self.strain1, dob=date.today())
+        html = str(AddMouseForm(initial={'father': self.male_mouse.mouse_id}, user=self.user)['father'])
+        self.assertEqual(html.count('<option'), 2)
+        self.assertIn(f'value="{self.male_mouse.mouse_id}" selected', html)
+        self.assertIn(f'{reverse("mouse_typeahead")}?sex=M', html)
+
+        # Unchosen mice are still valid parents
+        data = self.valid_data.copy()
+        data['father'] = Mouse.objects.get(tube_id=5).mouse_id
+        self.assertTrue(AddMouseForm(data=data, user=self.user).is_valid())
+
 class TeamFormTest(TestCase):
     def test_form_meta_model(self):
         """Test that the form uses the correct model."""
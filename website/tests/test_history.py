@@ -0,0 +1,159 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.core.management import call_command
+from django.utils import timezone
+from website.models import *
+from website.history import colony_at, mouse_values_at, take_snapshot
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+class MouseChangeLogTest(TestCase):
+    def setUp(self):
+        """Sets up a strain and a mouse."""
+        self.strain = Strain.objects.create(name="C57BL/6")
+        self.mouse = Mouse.objects.create(strain=self.strain, tube_id=1, dob=date(2024, 1, 1), sex='F')
+
+    def test_creation_logged(self):
+        """Tests a new mouse logs its initial history fields."""
+        change = MouseChange.objects.get(mouse=self.mouse)
+        self.assertTrue(change.created)
+        self.assertEqual(change.changes['state'], [None, self.mouse.state])
+
+    def test_only_changed_fields_logged(self):
+        """Tests a save logs the fields that changed and nothing when none did."""
+        mouse = Mouse.objects.get(pk=self.mouse.pk)
+        mouse.state = 'breeding'
+        mouse.tube_id = 5
+        mouse.save()
+        mouse.save()
+        changes = list(MouseChange.objects.filter(mouse=self.mouse, created=False).values_list('changes', flat=True))
+        self.assertEqual(changes, [{'state': [self.mouse.state, 'breeding']}])
+
+    def test_dates_logged_as_iso(self):
+        """Tests date values are stored as ISO strings."""
+        mouse = Mouse.objects.get(pk=self.mouse.pk)
+        mouse.cull_date = date(2024, 5, 1)
+        mouse.save(update_fields=['cull_date'])
+        change = MouseChange.objects.filter(mouse=self.mouse, created=False).get()
+        self.assertEqual(change.changes, {'cull_date': [None, '2024-05-01']})
+
+class ColonyAtTest(TestCase):
+    def setUp(self):
+        """Sets up a mouse whose state changed a day ago, after a snapshot two days ago."""
+        self.user = User.objects.create_user(username="testuser", email="test@abdn.ac.uk", password="pass123")
+        self.strain = Strain.objects.create(name="C57BL/6")
+        self.now = timezone.now()
+        self.mouse = Mouse.objects.create(strain=self.strain, tube_id=1, dob=date(2024, 1, 1), sex='F')
+        MouseChange.objects.update(changed_at=self.now - timedelta(days=3))
+        self.snapshot = take_snapshot()
+        ColonySnapshot.objects.update(taken_at=self.now - timedelta(days=2))
+
+        mouse = Mouse.objects.get(pk=self.mouse.pk)
+        mouse.state = 'breeding'
+        mouse.save()
+        MouseChange.objects.filter(created=False).update(changed_at=self.now - timedelta(days=1))
+
+    def test_before_and_after_change(self):
+        """Tests the state is replayed from the snapshot up to the moment asked for."""
+        self.assertEqual(mouse_values_at(self.now - timedelta(hours=36))[self.mouse.pk]['state'], self.mouse.state)
+        self.assertEqual(mouse_values_at(self.now)[self.mouse.pk]['state'], 'breeding')
+
+    def test_before_any_snapshot(self):
+        """Tests moments older than every snapshot are rebuilt from the log alone."""
+        self.assertEqual(mouse_values_at(self.now - timedelta(days=2, hours=12))[self.mouse.pk]['state'], self.mouse.state)
+        self.assertNotIn(self.mouse.pk, mouse_values_at(self.now - timedelta(days=4)))
+
+    def test_mouse_created_after_moment_left_out(self):
+        """Tests a mouse logged as created later is not part of the earlier colony."""
+        later = Mouse.objects.create(strain=self.strain, tube_id=2, dob=date(2024, 1, 1), sex='M')
+        self.assertNotIn(later.pk, mouse_values_at(self.now - timedelta(hours=1)))
+        self.assertIn(later.pk, mouse_values_at(timezone.now()))
+
+    def test_mouse_from_before_the_log(self):
+        """Tests a mouse with no creation row uses its current values with later changes undone."""
+        legacy = Mouse.objects.create(strain=self.strain, tube_id=3, dob=date(2023, 1, 1), sex='M')
+        MouseChange.objects.filter(mouse=legacy).delete()
+        original = legacy.genotype
+        legacy = Mouse.objects.get(pk=legacy.pk)
+        legacy.genotype = 'ht'
+        legacy.save()
+        self.assertEqual(mouse_values_at(self.now - timedelta(hours=1))[legacy.pk]['genotype'], original)
+        self.assertEqual(mouse_values_at(timezone.now())[legacy.pk]['genotype'], 'ht')
+
+    def test_cages_keepers_and_breeding(self):
+        """Tests cage placements, keepers and breeding pairs come from their intervals."""
+        cage = Cage.objects.create(cage_number="C-1", cage_type="Standard", location="Room 1")
+        other = Cage.objects.create(cage_number="C-2", cage_type="Standard", location="Room 1")
+        male = Mouse.objects.create(strain=self.strain, tube_id=2, dob=date(2024, 1, 1), sex='M')
+        MouseChange.objects.filter(mouse=male).update(changed_at=self.now - timedelta(days=3))
+        self.mouse.move_to_cage(cage, when=self.now - timedelta(days=3))
+        self.mouse.move_to_cage(other, when=self.now - timedelta(days=1))
+        MouseKeeper.objects.create(mouse=self.mouse, user=self.user, start_date=self.now - timedelta(days=3),
+                                   end_date=self.now - timedelta(days=1))
+        breed = Breed.objects.create(male=male, female=self.mouse, cage=cage)
+        Breed.objects.filter(pk=breed.pk).update(start_date=self.now - timedelta(days=2))
+
+        colony = colony_at(self.now - timedelta(days=1, hours=12))
+        self.assertEqual(colony['mice'][self.mouse.pk]['cage_id'], cage.pk)
+        self.assertEqual(colony['mice'][self.mouse.pk]['keepers'], [{'user_id': self.user.pk, 'team_id': None}])
+        self.assertEqual(colony['breeding_pairs'], [{'male_id': male.pk, 'female_id': self.mouse.pk, 'cage_id': cage.pk}])
+
+        colony = colony_at(self.now)
+        self.assertEqual(colony['mice'][self.mouse.pk]['cage_id'], other.pk)
+        self.assertEqual(colony['mice'][self.mouse.pk]['keepers'], [])
+        self.assertEqual(colony_at(self.now - timedelta(days=2, hours=12))['breeding_pairs'], [])
+
+    def test_snapshot_command(self):
+        """Tests the command snapshots every mouse."""
+        out = StringIO()
+        call_command('snapshot_colony', stdout=out)
+        self.assertEqual(ColonySnapshot.objects.latest('taken_at').mice.get().values['state'], 'breeding')
+        self.assertIn("1 mice", out.getvalue())
+
+    def test_view(self):
+        """Tests the endpoint returns the colony and rejects a missing or unreadable 'at'."""
+        self.user.role = 'staff'
+        self.user.save()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('colony_snapshot'), {'at': (self.now - timedelta(hours=36)).isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['mice'][0]['mouse_id'], self.mouse.pk)
+        self.assertEqual(response.json()['mice'][0]['state'], self.mouse.state)
+
+        self.assertEqual(self.client.get(reverse('colony_snapshot')).status_code, 400)
+        self.assertEqual(self.client.get(reverse('colony_snapshot'), {'at': 'yesterday'}).status_code, 400)
+
+    def test_view_restricted_to_staff_and_breeders(self):
+        """Tests new staff cannot rebuild the colony."""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('colony_snapshot'), {'at': self.now.isoformat()})
+        self.assertEqual(response.status_code, 403)
+
+    def test_view_rejects_moments_outside_history(self):
+        """Tests moments before the first logged change or in the future are refused."""
+        self.user.role = 'breeder'
+        self.user.save()
+        self.client.force_login(self.user)
+        for moment in (self.now - timedelta(days=4), self.now + timedelta(days=1)):
+            response = self.client.get(reverse('colony_snapshot'), {'at': moment.isoformat()})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('colony_snapshot'), {'at': self.now.isoformat(), 'after': 'x'}).status_code, 400)
+
+    def test_view_paged(self):
+        """Tests the colony is returned a page of mice at a time, each pair with its male."""
+        self.user.role = 'breeder'
+        self.user.save()
+        self.client.force_login(self.user)
+        male = Mouse.objects.create(strain=self.strain, tube_id=2, dob=date(2024, 1, 1), sex='M')
+        cage = Cage.objects.create(cage_number='P1', cage_type='Breeding', location='North')
+        Breed.objects.create(male=male, female=self.mouse, cage=cage)
+        params = {'at': timezone.now().isoformat()}
+        with patch('website.views.SNAPSHOT_PAGE_SIZE', 1):
+            first = self.client.get(reverse('colony_snapshot'), params).json()
+            second = self.client.get(reverse('colony_snapshot'), {**params, 'after': first['next_after']}).json()
+        self.assertEqual([m['mouse_id'] for m in first['mice']], [self.mouse.pk])
+        self.assertEqual(first['breeding_pairs'], [])
+        self.assertEqual([m['mouse_id'] for m in second['mice']], [male.pk])
+        self.assertEqual(second['breeding_pairs'], [{'male_id': male.pk, 'female_id': self.mouse.pk, 'cage_id': cage.pk}])
+        self.assertIsNone(second['next_after'])
@@ -0,0 +1,152 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from website.models import *
+from website.tests import LOCMEM_CACHES
+from website.imports import import_mice, MouseImporter
+from datetime import date
+from io import StringIO
+import tempfile
+import os
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MouseImportTest(TestCase):
+    def setUp(self):
+        """Sets up a user, a team, a strain with two existing parents and a cage."""
+        self.user = User.objects.create_user(username="testuser", email="test@abdn.ac.uk", password="pass123", role='leader')
+        self.team = Team.objects.create(name="Team A")
+        self.strain = Strain.objects.create(name="C57BL/6")
+        self.father = Mouse.objects.create(strain=self.strain, tube_id=1, dob=date(2024, 1, 1), sex='M')
+        self.mother = Mouse.objects.create(strain=self.strain, tube_id=2, dob=date(2024, 1, 1), sex='F')
+        self.cage = Cage.objects.create(cage_number="C-1", cage_type="Standard", location="Room 1")
+
+    def test_import_creates_mice_keepers_and_cages(self):
+        """Tests valid rows create the mouse, its keeper and its cage history."""
+        data = StringIO(
+            "strain,tube_id,dob,sex,father,mother,earmark,genotype,cage\n"
+            "C57BL/6,10,2024-06-01,M,1,2,TL BR,ht,C-1\n"
+            "C57BL/6,11,2024-06-01,f,1,2,,,\n"
+        )
+        report = import_mice(data, user=self.user)
+        self.assertTrue(report.ok)
+        self.assertEqual(report.created, 2)
+
+        pup = Mouse.objects.get(strain=self.strain, tube_id=10)
+        self.assertEqual((pup.father, pup.mother), (self.father, self.mother))
+        self.assertEqual(pup.earmark, "TL,BR")
+        self.assertEqual(pup.genotype, 'ht')
+        self.assertEqual(Mouse.objects.get(strain=self.strain, tube_id=11).sex, 'F')
+        self.assertTrue(MouseKeeper.objects.filter(mouse=pup, user=self.user).exists())
+        self.assertEqual(CageHistory.objects.get(mouse_id=pup).cage_id, self.cage)
+
+    def test_parents_earlier_in_file(self):
+        """Tests parents imported earlier in the file, in the same or an earlier chunk, are linked."""
+        data = StringIO(
+            "strain\ttube_id\tdob\tsex\tfather\tmother\n"
+            "BALB/c\t1\t2024-01-01\tM\t\t\n"
+            "BALB/c\t2\t2024-01-01\tF\t\t\n"
+            "BALB/c\t3\t2024-06-01\tF\t1\t2\n"
+            "BALB/c\t4\t2024-09-01\tM\t1\t3\n"
+        )
+        report = MouseImporter(user=self.user, chunk_size=3).run(data)
+        self.assertTrue(report.ok, report.errors)
+        strain = Strain.objects.get(name="BALB/c")
+        grandchild = Mouse.objects.get(strain=strain, tube_id=4)
+        self.assertEqual(grandchild.mother.tube_id, 3)
+        self.assertEqual(grandchild.father.tube_id, 1)
+        # Lineage rows are written even though bulk_create sends no signals
+        self.assertEqual({m.tube_id for m in grandchild.get_ancestors()}, {1, 2, 3})
+
+    def test_cross_strain_parents(self):
+        """Tests father_strain/mother_strain point at parents in another strain."""
+        data = StringIO(
+            "strain,tube_id,dob,sex,father,father_strain\n"
+            "F1 Hybrid,1,2024-06-01,M,1,C57BL/6\n"
+        )
+        report = import_mice(data, user=self.user)
+        self.assertTrue(report.ok, report.errors)
+        self.assertEqual(Mouse.objects.get(strain__name="F1 Hybrid").father, self.father)
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        """Tests each bad row is reported with its line number while good rows are imported."""
+        data = StringIO(
+            "strain,tube_id,dob,sex,father,mother,cage,weaned\n"
+            "C57BL/6,20,2024-06-01,M,,,,\n"
+            "C57BL/6,1,2024-06-01,M,,,,\n"
+            "C57BL/6,21,01/06/2024,M,,,,\n"
+            "C57BL/6,22,2024-06-01,X,,,,\n"
+            "C57BL/6,23,2024-06-01,M,2,,,\n"
+            "C57BL/6,24,2024-06-01,M,,99,,\n"
+            "C57BL/6,25,2024-06-01,M,,,Nowhere,\n"
+            "C57BL/6,26,2024-06-01,M,,,,yes\n"
+            "C57BL/6,20,2024-06-01,M,,,,\n"
+        )
+        report = import_mice(data, user=self.user)
+        self.assertEqual(report.created, 1)
+        self.assertEqual([line for line, _ in report.errors], [3, 4, 5, 6, 7, 8, 9, 10])
+        messages = dict(report.errors)
+        self.assertIn("already exists", messages[3])
+        self.assertIn("not a date", messages[4])
+        self.assertIn("is not male", messages[6])
+        self.assertIn("no mouse with tube ID 99", messages[7])
+        self.assertIn("does not exist", messages[8])
+        self.assertIn("weaned_date is required", messages[9])
+        self.assertIn("already exists", messages[10])
+
+    def test_missing_columns(self):
+        """Tests a file without the required columns is rejected as a whole."""
+        report = import_mice(StringIO("strain,tube_id\nC57BL/6,5\n"), user=self.user)
+        self.assertEqual(report.errors, [(1, "Missing columns: dob, sex.")])
+
+    def test_unknown_strain_without_create(self):
+        """Tests rows with a new strain are rejected when strain creation is off."""
+        report = import_mice(StringIO("strain,tube_id,dob,sex\nNew,1,2024-06-01,M\n"), user=self.user, create_strains=False)
+        self.assertEqual(report.created, 0)
+        self.assertFalse(Strain.objects.filter(name="New").exists())
+
+    def test_team_keeper(self):
+        """Tests mice are kept by the team when one is given."""
+        import_mice(StringIO("strain,tube_id,dob,sex\nC57BL/6,30,2024-06-01,M\n"), user=self.user, team=self.team)
+        keeper = MouseKeeper.objects.get(mouse__tube_id=30)
+        self.assertEqual((keeper.team, keeper.user), (self.team, None))
+
+    def test_dry_run_keeps_nothing(self):
+        """Tests a dry run reports what would be imported without writing it."""
+        report = import_mice(StringIO("strain,tube_id,dob,sex\nNew,1,2024-06-01,M\n"), user=self.user, dry_run=True)
+        self.assertEqual(report.created, 1)
+        self.assertFalse(Mouse.objects.filter(tube_id=1, strain__name="New").exists())
+        self.assertFalse(Strain.objects.filter(name="New").exists())
+
+    def test_query_count_does_not_grow_with_rows(self):
+        """Tests a chunk is written with a fixed number of queries however many rows it holds."""
+        def rows(count, start):
+            return "".join(f"C57BL/6,{start + i},2024-06-01,{'MF'[i % 2]},1,2\n" for i in range(count))
+
+        header = "strain,tube_id,dob,sex,father,mother\n"
+        with self.assertNumQueries(21):
+            import_mice(StringIO(header + rows(5, 100)), user=self.user)
+        with self.assertNumQueries(21):
+            import_mice(StringIO(header + rows(50, 200)), user=self.user)
+
+    def test_command(self):
+        """Tests the management command imports a file and prints rejected lines."""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write("strain,tube_id,dob,sex\nC57BL/6,40,2024-06-01,M\nC57BL/6,41,bad,M\n")
+        try:
+            out, err = StringIO(), StringIO()
+            call_command('import_mice', file.name, user='testuser', stdout=out, stderr=err)
+        finally:
+            os.unlink(file.name)
+        self.assertIn("Imported 1 mice", out.getvalue())
+        self.assertIn("line 3:", err.getvalue())
+
+    def test_upload_view(self):
+        """Tests the upload page imports the file and lists rejected lines."""
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile("mice.csv", b"\xef\xbb\xbfstrain,tube_id,dob,sex\nC57BL/6,50,2024-06-01,M\nC57BL/6,51,2024-06-01,Q\n")
+        response = self.client.post(reverse('import_mice'), {'file': upload, 'create_strains': 'on'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Mouse.objects.filter(strain=self.strain, tube_id=50).exists())
+        self.assertEqual(response.context['report'].errors[0][0], 3)
+        self.assertContains(response, "must be M or F")
@@ -0,0 +1,132 @@
+import re
+from datetime import date, timedelta
+from django.test import TestCase
+from django.db import connection
+from django.utils import timezone
+from website.models import *
+from website.request_inbox import inbox_rows, section_requests
+
+MICE = 10_000
+REQUESTS = 3_000
+USERS = 50
+TEAMS = 10
+CAGES = 200
+
+
+def sequential_scans(queryset):
+    """
+    Tables the plan of ``queryset`` reads in full rather than seeking into an
+    index. Walking a whole index (SQLite's "SCAN t USING INDEX") counts as a
+    full read too.
+    """
+    plan = queryset.explain()
+    if connection.vendor == 'postgresql':
+        return re.findall(r'Seq Scan on (\w+)', plan)
+    return re.findall(r'\bSCAN (\w+)', plan)
+
+
+class HotFilterIndexTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        """Seeds a colony large enough for a sequential scan to cost more than an index."""
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            return
+        now = timezone.now()
+        cls.users = User.objects.bulk_create([
+            User(username=f"user{n}", email=f"user{n}@abdn.ac.uk", role='leader') for n in range(USERS)
+        ])
+        cls.teams = Team.objects.bulk_create([Team(name=f"team{n}") for n in range(TEAMS)])
+        cls.cages = Cage.objects.bulk_create([Cage(cage_number=f"C{n}", cage_type='standard') for n in range(CAGES)])
+        strain = Strain.objects.create(name="C57BL/6")
+        # Mostly alive, a few breeding or deceased
+        states = ['alive'] * 18 + ['breeding', 'deceased']
+        cls.mice = Mouse.objects.bulk_create([
+            Mouse(strain=strain, tube_id=n, dob=date(2025, 1, 1), sex='MF'[n % 2], state=states[n % len(states)])
+            for n in range(MICE)
+        ])
+        CageHistory.objects.bulk_create([
+            CageHistory(cage_id=cls.cages[n % CAGES], mouse_id=mouse, start_date=now - timedelta(days=n % 300),
+                        end_date=None if n % 4 else now - timedelta(days=1))
+            for n, mouse in enumerate(cls.mice)
+        ])
+        MouseKeeper.objects.bulk_create([
+            MouseKeeper(mouse=mouse, start_date=now, **(
+                {'team': cls.teams[n % TEAMS]} if n % 5 == 0 else {'user': cls.users[n % USERS]}
+            ))
+            for n, mouse in enumerate(cls.mice)
+        ])
+        Notification.objects.bulk_create([
+            Notification(recipient=cls.users[n % USERS], message="Hello") for n in range(MICE)
+        ])
+        # Handled requests pile up; only a few are still open
+        for model in (TransferRequest, BreedingRequest, CullingRequest):
+            requests = []
+            for n in range(REQUESTS):
+                status = 'pending' if n % 50 == 0 else ('completed', 'rejected')[n % 2]
+                fields = {'requester': cls.users[n % USERS], 'status': status}
+                if model is BreedingRequest:
+                    fields.update(male_mouse=cls.mice[2 * n], female_mouse=cls.mice[2 * n + 1], cage=cls.cages[n % CAGES])
+                else:
+                    fields['mouse'] = cls.mice[n]
+                if model is TransferRequest:
+                    fields['destination_cage'] = cls.cages[n % CAGES]
+                requests.append(model(**fields))
+            model.objects.bulk_create(requests)
+        # sqlite_stat1 keeps only the average rows per key, which makes a
+        # filter on the few open requests look like one on most of the table,
+        # so SQLite plans are read without statistics: they show whether a
+        # usable index exists. PostgreSQL plans use the real distribution.
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+    def setUp(self):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest("Plans are only read on SQLite and PostgreSQL")
+
+    def assertUsesIndexes(self, queryset, tables):
+        scanned = set(sequential_scans(queryset)) & {model._meta.db_table for model in tables}
+        self.assertFalse(scanned, f"{queryset.query} scans {scanned}:\n{queryset.explain()}")
+
+    def test_request_inbox(self):
+        """Tests every section of the request inbox, everyone's or one requester's, is read through an index."""
+        request_tables = [TransferRequest, BreedingRequest, CullingRequest]
+        for section in ('current', 'completed'):
+            for requester in (None, self.users[0]):
+                if section == 'completed' and requester is None:
+                    # Every handled request is listed, so reading it all is right
+                    continue
+                requests = section_requests(section, requester)
+                for queryset in requests.values():
+                    self.assertUsesIndexes(queryset, request_tables)
+                self.assertUsesIndexes(inbox_rows(section, requests)[:26], request_tables)
+
+    def test_notifications(self):
+        """Tests a user's notifications are listed through an index."""
+        notifications = Notification.objects.filter(recipient=self.users[0]).order_by('-created_at')
+        self.assertUsesIndexes(notifications, [Notification])
+
+    def test_keepers(self):
+        """Tests the mice of a keeping user or team are found through an index."""
+        self.assertUsesIndexes(MouseKeeper.objects.filter(user=self.users[0]).values('mouse_id'), [MouseKeeper])
+        self.assertUsesIndexes(MouseKeeper.objects.filter(team=self.teams[0]).values('mouse_id'), [MouseKeeper])
+
+    def test_mouse_state_and_sex(self):
+        """Tests filtering mice on a rare state and a sex uses an index."""
+        self.assertUsesIndexes(Mouse.objects.filter(state__in=['breeding'], sex='F'), [Mouse])
+
+    def test_cage_history(self):
+        """Tests open placements, cage census and a mouse's timeline are read through indexes."""
+        now = timezone.now()
+        self.assertUsesIndexes(CageHistory.objects.filter(mouse_id=self.mice[0], end_date__isnull=True), [CageHistory])
+        self.assertUsesIndexes(CageHistory.objects.in_cage(self.cages[0]).at(now), [CageHistory])
+        self.assertUsesIndexes(CageHistory.objects.filter(mouse_id=self.mice[0]).overlapping(now - timedelta(days=30), now), [CageHistory])
+
+    def test_cage_number_prefix(self):
+        """Tests the cage typeahead's case-insensitive prefix match is read through an index."""
+        self.assertUsesIndexes(Cage.objects.filter(cage_number__istartswith='c1').order_by('cage_number'), [Cage])
+
+    def test_username_prefix(self):
+        """Tests the user search's case-insensitive prefix match is read through an index."""
+        users = User.objects.filter(username__istartswith='USER1').order_by('username').values('id', 'username')
+        self.assertUsesIndexes(users[:10], [User])
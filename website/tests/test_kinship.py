@@ -0,0 +1,119 @@
+from django.test import TestCase
+from django.core.management import call_command
+from django.urls import reverse
+from website.models import *
+from website.forms import BreedingRequestForm
+from website.kinship import KinshipIndex, pair_kinship
+from datetime import date
+from io import StringIO
+import numpy as np
+
+class KinshipColumnsTest(TestCase):
+    def test_known_coefficients(self):
+        """Tests textbook kinship values for a small pedigree built from index arrays."""
+        # 0, 1 founders; 2, 3 full siblings; 4 founder; 5 half sibling of 2 and 3 via 0
+        index = KinshipIndex(range(6), np.array([-1, -1, 0, 0, -1, 0]), np.array([-1, -1, 1, 1, -1, 4]))
+        matrix = index.pairs(range(6), range(6))
+        self.assertAlmostEqual(matrix[2, 3], 0.25)    # full siblings
+        self.assertAlmostEqual(matrix[2, 5], 0.125)   # half siblings
+        self.assertAlmostEqual(matrix[0, 2], 0.25)    # parent and offspring
+        self.assertAlmostEqual(matrix[0, 1], 0.0)     # unrelated founders
+        self.assertAlmostEqual(matrix[2, 2], 0.5)     # outbred individual
+        self.assertTrue(np.allclose(matrix, matrix.T))
+
+    def test_matches_tabular_method(self):
+        """Tests the column solves agree with the full tabular matrix on a random, inbred pedigree."""
+        rng = np.random.default_rng(0)
+        n = 300
+        sires, dams = np.full(n, -1), np.full(n, -1)
+        for i in range(10, n):
+            sires[i], dams[i] = rng.integers(0, i, size=2)
+        matrix = np.zeros((n, n))
+        for i in range(n):
+            row = 0.5 * (matrix[sires[i], :i] + matrix[dams[i], :i])
+            matrix[i, :i] = matrix[:i, i] = row
+            matrix[i, i] = 0.5 * (1.0 + matrix[sires[i], dams[i]]) if sires[i] >= 0 else 0.5
+        index = KinshipIndex(range(n), sires, dams)
+        self.assertTrue(np.allclose(index.pairs(range(0, n, 2), range(1, n, 2)), matrix[0::2, 1::2], atol=1e-6))
+        self.assertAlmostEqual(index.inbreeding(n - 1), 2 * matrix[n - 1, n - 1] - 1, places=6)
+
+class KinshipIndexTest(TestCase):
+    def setUp(self):
+        """Sets up two founders, two full siblings and an inbred offspring of the siblings."""
+        self.strain = Strain.objects.create(name="C57BL/6")
+        self.founder_m = Mouse.objects.create(strain=self.strain, tube_id=1, dob=date(2021, 1, 1), sex='M')
+        self.founder_f = Mouse.objects.create(strain=self.strain, tube_id=2, dob=date(2021, 1, 1), sex='F')
+        self.brother = Mouse.objects.create(strain=self.strain, tube_id=3, dob=date(2022, 1, 1), sex='M',
+                                            father=self.founder_m, mother=self.founder_f)
+        self.sister = Mouse.objects.create(strain=self.strain, tube_id=4, dob=date(2022, 1, 1), sex='F',
+                                           father=self.founder_m, mother=self.founder_f)
+        self.inbred = Mouse.objects.create(strain=self.strain, tube_id=5, dob=date(2023, 1, 1), sex='F',
+                                           father=self.brother, mother=self.sister)
+        self.outsider = Mouse.objects.create(strain=self.strain, tube_id=6, dob=date(2022, 1, 1), sex='F')
+
+    def test_pair_kinship(self):
+        """Tests kinship of full siblings and of unrelated mice."""
+        self.assertAlmostEqual(pair_kinship(self.brother, self.sister), 0.25)
+        self.assertAlmostEqual(pair_kinship(self.brother, self.outsider), 0.0)
+
+    def test_inbreeding(self):
+        """Tests the offspring of full siblings has an inbreeding coefficient of 0.25."""
+        index = KinshipIndex.for_strain(self.strain)
+        self.assertAlmostEqual(index.inbreeding(self.inbred.mouse_id), 0.25)
+        self.assertAlmostEqual(index.inbreeding(self.brother.mouse_id), 0.0)
+
+    def test_pairs_batch(self):
+        """Tests all male x female pairs are scored in one array."""
+        index = KinshipIndex.for_strain(self.strain)
+        males = [self.founder_m.mouse_id, self.brother.mouse_id]
+        females = [self.sister.mouse_id, self.inbred.mouse_id, self.outsider.mouse_id]
+        coefficients = index.pairs(males, females)
+        self.assertEqual(coefficients.shape, (2, 3))
+        self.assertAlmostEqual(coefficients[1, 0], 0.25)
+        self.assertAlmostEqual(coefficients[1, 1], 0.375)   # brother with his inbred daughter
+        self.assertAlmostEqual(coefficients[0, 2], 0.0)
+
+    def test_index_includes_ancestors_from_other_strains(self):
+        """Tests ancestors outside the strain are still used for the coefficients."""
+        other = Strain.objects.create(name="BALB/c")
+        sire = Mouse.objects.create(strain=other, tube_id=1, dob=date(2020, 1, 1), sex='M')
+        half_a = Mouse.objects.create(strain=self.strain, tube_id=7, dob=date(2021, 1, 1), sex='M', father=sire)
+        half_b = Mouse.objects.create(strain=self.strain, tube_id=8, dob=date(2021, 1, 1), sex='F', father=sire)
+        index = KinshipIndex.for_strain(self.strain)
+        self.assertAlmostEqual(index.kinship(half_a.mouse_id, half_b.mouse_id), 0.125)
+
+    def test_breeding_form_records_kinship(self):
+        """Tests the breeding request form exposes the kinship of the chosen pair."""
+        cage = Cage.objects.create(cage_number="B-1", cage_type="Breeding", location="Lab")
+        form = BreedingRequestForm(data={'male_mouse': self.brother.mouse_id,
+                                         'female_mouse': self.sister.mouse_id, 'cage': cage.cage_id})
+        self.assertTrue(form.is_valid())
+        self.assertAlmostEqual(form.kinship, 0.25)
+
+    def test_pair_kinship_endpoint(self):
+        """Tests the JSON endpoint returns the coefficient and flags close relatives."""
+        user = User.objects.create_user(username="leader", email="leader@abdn.ac.uk", password="pass123", role='leader')
+        self.client.force_login(user)
+        response = self.client.get(reverse('breeding_pair_kinship'),
+                                   {'male_mouse': self.brother.mouse_id, 'female_mouse': self.sister.mouse_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertAlmostEqual(response.json()['kinship'], 0.25)
+        self.assertTrue(response.json()['warning'])
+
+    def test_pair_kinship_endpoint_rejects_bad_ids(self):
+        """Tests missing or non-numeric mouse IDs are a 400 and unknown ones a 404."""
+        user = User.objects.create_user(username="leader", email="leader@abdn.ac.uk", password="pass123", role='leader')
+        self.client.force_login(user)
+        url = reverse('breeding_pair_kinship')
+        self.assertEqual(self.client.get(url, {'male_mouse': 'abc', 'female_mouse': self.sister.mouse_id}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'male_mouse': self.brother.mouse_id}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'male_mouse': 999999, 'female_mouse': self.sister.mouse_id}).status_code, 404)
+
+    def test_kinship_command(self):
+        """Tests the kinship command writes one CSV row per living male x female pair."""
+        out = StringIO()
+        call_command('kinship', 'C57BL/6', stdout=out)
+        lines = out.getvalue().strip().splitlines()
+        self.assertEqual(lines[0], "male_id,female_id,kinship")
+        self.assertEqual(len(lines), 1 + 2 * 4)
+        self.assertIn(f"{self.brother.mouse_id},{self.sister.mouse_id},0.250000", lines)
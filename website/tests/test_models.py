@@ -1,7 +1,12 @@
 from django.test import TestCase
 from website.models import *
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
 from django.utils import timezone
+from django.core.management import call_command, CommandError
+from website.access import check_access
+from website import request_workflow
+from io import StringIO
 import datetime as dt
 from datetime import date
 from unittest.mock import patch
@@ -96,6 +101,111 @@ class CageHistoryModelTest(TestCase):
         with self.assertRaises(ValidationError):
             history.save()
 
+class CurrentCageTest(TestCase):
+    def setUp(self):
+        """Sets up two cages and a mouse placed in the first one."""
+        self.cage = Cage.objects.create(cage_number="C-010", cage_type="Standard", location="West Wing")
+        self.other_cage = Cage.objects.create(cage_number="C-011", cage_type="Standard", location="West Wing")
+        self.strain = Strain.objects.create(name='Strain B')
+        self.mouse = Mouse.objects.create(strain=self.strain, tube_id=1, dob=date(2024, 1, 1), sex='M')
+        self.history = CageHistory.objects.create(cage_id=self.cage, mouse_id=self.mouse, start_date=timezone.now())
+
+    def test_open_history_sets_current_cage(self):
+        """Tests creating an open CageHistory row records the cage on the mouse."""
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.mouse.current_cage, self.cage)
+
+    def test_closing_history_clears_current_cage(self):
+        """Tests closing the open row through save empties the mouse's current cage."""
+        self.history.end_date = timezone.now()
+        self.history.save()
+        self.mouse.refresh_from_db()
+        self.assertIsNone(self.mouse.current_cage)
+
+    def test_second_open_placement_rejected(self):
+        """Tests the database refuses a second open placement for the same mouse."""
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CageHistory.objects.create(cage_id=self.other_cage, mouse_id=self.mouse, start_date=timezone.now())
+
+    def test_closed_placements_do_not_collide(self):
+        """Tests any number of closed placements may sit beside the open one."""
+        self.mouse.move_to_cage(self.other_cage)
+        self.mouse.move_to_cage(self.cage)
+        self.assertEqual(CageHistory.objects.filter(mouse_id=self.mouse, open_marker__isnull=True).count(), 2)
+        self.assertEqual(CageHistory.objects.get(mouse_id=self.mouse, open_marker=True).cage_id, self.cage)
+
+    def test_move_to_cage(self):
+        """Tests moving closes the old placement and opens a new one."""
+        self.mouse.move_to_cage(self.other_cage)
+        self.assertEqual(self.mouse.current_cage_id, self.other_cage.cage_id)
+        self.assertEqual(Mouse.objects.get(pk=self.mouse.pk).current_cage, self.other_cage)
+        self.history.refresh_from_db()
+        self.assertIsNotNone(self.history.end_date)
+        self.assertEqual(CageHistory.objects.filter(mouse_id=self.mouse, end_date__isnull=True).count(), 1)
+
+    def test_leave_cage(self):
+        """Tests leaving closes the placement without opening another."""
+        self.mouse.leave_cage()
+        self.assertIsNone(Mouse.objects.get(pk=self.mouse.pk).current_cage)
+        self.assertFalse(CageHistory.objects.filter(mouse_id=self.mouse, end_date__isnull=True).exists())
+
+    def test_stale_save_keeps_current_cage(self):
+        """Tests saving an instance loaded before a move does not undo the move."""
+        stale = Mouse.objects.get(pk=self.mouse.pk)
+        Mouse.objects.get(pk=self.mouse.pk).move_to_cage(self.other_cage)
+        stale.state = 'breeding'
+        stale.save()
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.mouse.current_cage, self.other_cage)
+        self.assertEqual(self.mouse.state, 'breeding')
+        self.assertEqual(CageHistory.objects.get(mouse_id=self.mouse, end_date__isnull=True).cage_id, self.other_cage)
+
+    def test_deferred_save_keeps_current_cage(self):
+        """Tests saving a partly loaded instance writes only the loaded fields."""
+        stale = Mouse.objects.only('mouse_id', 'state').get(pk=self.mouse.pk)
+        self.mouse.move_to_cage(self.other_cage)
+        stale.state = 'breeding'
+        stale.save()
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.mouse.current_cage, self.other_cage)
+        self.assertEqual(self.mouse.state, 'breeding')
+
+    def test_occupancy_is_single_query(self):
+        """Tests the mice in a cage come from one indexed read."""
+        with self.assertNumQueries(1):
+            self.assertEqual(list(self.cage.current_mice.all()), [self.mouse])
+
+class CageHistoryIntervalTest(TestCase):
+    def setUp(self):
+        """Sets up a mouse that spent January in one cage and has been in another since."""
+        self.cage = Cage.objects.create(cage_number="C-020", cage_type="Standard", location="West Wing")
+        self.other_cage = Cage.objects.create(cage_number="C-021", cage_type="Standard", location="East Wing")
+        self.strain = Strain.objects.create(name='Strain C')
+        self.mouse = Mouse.objects.create(strain=self.strain, tube_id=1, dob=date(2024, 1, 1), sex='F')
+        self.jan = timezone.make_aware(dt.datetime(2025, 1, 1))
+        self.feb = timezone.make_aware(dt.datetime(2025, 2, 1))
+        self.january = CageHistory.objects.create(cage_id=self.cage, mouse_id=self.mouse, start_date=self.jan, end_date=self.feb)
+        self.since = CageHistory.objects.create(cage_id=self.other_cage, mouse_id=self.mouse, start_date=self.feb)
+
+    def test_at(self):
+        """Tests placements are half-open: the move instant belongs to the new cage."""
+        self.assertEqual(list(CageHistory.objects.at(self.jan + dt.timedelta(days=3))), [self.january])
+        self.assertEqual(list(CageHistory.objects.at(self.feb)), [self.since])
+        self.assertEqual(list(CageHistory.objects.at(self.jan - dt.timedelta(seconds=1))), [])
+        self.assertEqual(list(CageHistory.objects.at(timezone.now())), [self.since])
+
+    def test_overlapping(self):
+        """Tests overlapping finds every placement touching the window, with open bounds."""
+        window = CageHistory.objects.overlapping(self.feb - dt.timedelta(days=1), self.feb + dt.timedelta(days=1))
+        self.assertEqual(set(window), {self.january, self.since})
+        self.assertEqual(list(CageHistory.objects.overlapping(end=self.jan + dt.timedelta(days=1))), [self.january])
+        self.assertEqual(list(CageHistory.objects.overlapping(start=self.feb)), [self.since])
+
+    def test_cage_and_location_filters(self):
+        """Tests in_cage and at_location narrow the placements."""
+        self.assertEqual(list(CageHistory.objects.in_cage(self.cage)), [self.january])
+        self.assertEqual(list(CageHistory.objects.at_location("East Wing")), [self.since])
+
 class UserModelTest(TestCase):
     def setUp(self):
         """Sets up baseline user data."""
@@ -251,6 +361,90 @@ class MouseModelTest(TestCase):
         self.assertIn(self.mouse, mice)
         self.assertEqual(mice.count(), 1)
 
+class MouseAccessTest(TestCase):
+    def setUp(self):
+        """Sets up a team with two members, an outsider and two mice."""
+        self.strain = Strain.objects.create(name="Access Strain")
+        self.team = Team.objects.create(name="Access Team")
+        self.member = User.objects.create_user(username="member", email="member@abdn.ac.uk", password="pass123")
+        self.other_member = User.objects.create_user(username="other", email="other@abdn.ac.uk", password="pass123")
+        self.outsider = User.objects.create_user(username="outsider", email="outsider@abdn.ac.uk", password="pass123")
+        TeamMembership.objects.create(user=self.member, team=self.team)
+        TeamMembership.objects.create(user=self.other_member, team=self.team)
+        self.team_mouse = Mouse.objects.create(strain=self.strain, tube_id=1, dob=date(2024, 1, 1), sex='M')
+        self.own_mouse = Mouse.objects.create(strain=self.strain, tube_id=2, dob=date(2024, 1, 1), sex='F')
+        MouseKeeper.objects.create(mouse=self.team_mouse, team=self.team, start_date=timezone.now())
+        MouseKeeper.objects.create(mouse=self.own_mouse, user=self.outsider, start_date=timezone.now())
+
+    def visible(self, user):
+        return set(Mouse.mice_managed_by_user(user).values_list('tube_id', flat=True))
+
+    def test_keepers_grant_access(self):
+        """Tests team and direct keepers both make the mouse visible, to nobody else."""
+        self.assertEqual(self.visible(self.member), {1})
+        self.assertEqual(self.visible(self.other_member), {1})
+        self.assertEqual(self.visible(self.outsider), {2})
+
+    def test_membership_changes(self):
+        """Tests joining a team grants its mice and leaving withdraws them."""
+        TeamMembership.objects.create(user=self.outsider, team=self.team)
+        self.assertEqual(self.visible(self.outsider), {1, 2})
+        TeamMembership.objects.filter(user=self.member).delete()
+        self.assertEqual(self.visible(self.member), set())
+        self.assertEqual(self.visible(self.other_member), {1})
+
+    def test_keeper_removed(self):
+        """Tests removing a keeper hides the mouse unless another path still grants it."""
+        MouseKeeper.objects.create(mouse=self.team_mouse, user=self.member, start_date=timezone.now())
+        MouseKeeper.objects.filter(mouse=self.team_mouse, team=self.team).delete()
+        self.assertEqual(self.visible(self.member), {1})
+        self.assertEqual(self.visible(self.other_member), set())
+
+    def test_keeper_moved_to_other_mouse(self):
+        """Tests re-pointing a keeper row at another mouse withdraws the old mouse."""
+        keeper = MouseKeeper.objects.get(mouse=self.own_mouse)
+        keeper.mouse = self.team_mouse
+        keeper.save()
+        self.assertEqual(self.visible(self.outsider), {1})
+        self.assertEqual(check_access(), ([], []))
+
+    def test_membership_moved_to_other_team(self):
+        """Tests moving a membership to another team withdraws the old team's mice."""
+        other_team = Team.objects.create(name="Other Team")
+        MouseKeeper.objects.create(mouse=self.own_mouse, team=other_team, start_date=timezone.now())
+        membership = TeamMembership.objects.get(user=self.member)
+        membership.team = other_team
+        membership.save()
+        self.assertEqual(self.visible(self.member), {2})
+        membership.user = self.outsider
+        membership.save()
+        self.assertEqual(self.visible(self.member), set())
+        self.assertEqual(check_access(), ([], []))
+
+    def test_team_deleted(self):
+        """Tests deleting a team withdraws its mice from every member."""
+        self.team.delete()
+        self.assertEqual(self.visible(self.member), set())
+        self.assertEqual(check_access(), ([], []))
+
+    def test_check_and_rebuild_commands(self):
+        """Tests the checker reports drift, fixes it on request, and the rebuild restores the table."""
+        call_command('check_mouse_access', stdout=StringIO())
+        MouseAccess.objects.filter(user=self.member).delete()
+        MouseAccess.objects.create(user=self.member, mouse=self.own_mouse)
+        self.assertEqual(check_access(), ([(self.member.id, self.team_mouse.mouse_id)],
+                                          [(self.member.id, self.own_mouse.mouse_id)]))
+        with self.assertRaises(CommandError):
+            call_command('check_mouse_access', stdout=StringIO())
+        call_command('check_mouse_access', '--fix', stdout=StringIO())
+        self.assertEqual(check_access(), ([], []))
+
+        MouseAccess.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_mouse_access', stdout=out)
+        self.assertIn("3 rows", out.getvalue())
+        self.assertEqual(self.visible(self.member), {1})
+
 class MouseKeeperModelTest(TestCase):
     def setUp(self):
         """Sets up base data for MouseKeeper model tests."""
@@ -364,28 +558,32 @@ class BreedingRequestModelTest(TestCase):
         with self.assertRaises(ValidationError):
             request.clean()
 
-    def test_approve_method(self):
-        """Tests approve method changes status and creates a Breed."""
+    def test_approve(self):
+        """Tests approving completes the request, moves both mice to the cage and starts a Breed."""
         request = self.create_request()
-        request.approve(approver=self.user)
+        request_workflow.approve(BreedingRequest, request.pk)
 
         request.refresh_from_db()
-        self.assertEqual(request.status, 'approved')
-        self.assertEqual(request.male_mouse.state, 'breeding')
-        self.assertEqual(request.female_mouse.state, 'breeding')
-        self.assertTrue(Breed.objects.filter(male=self.male_mouse, female=self.female_mouse).exists())
-
-    def test_complete_method(self):
-        """Tests complete method sets status to 'completed'."""
-        request = self.create_request()
-        request.complete()
+        self.male_mouse.refresh_from_db()
+        self.female_mouse.refresh_from_db()
         self.assertEqual(request.status, 'completed')
-
-    def test_reject_method(self):
-        """Tests reject method sets status to 'rejected'."""
+        self.assertIsNotNone(request.approval_date)
+        self.assertEqual(self.male_mouse.state, 'breeding')
+        self.assertEqual(self.female_mouse.state, 'breeding')
+        self.assertEqual(self.male_mouse.current_cage, self.cage)
+        self.assertEqual(self.female_mouse.current_cage, self.cage)
+        self.assertTrue(Breed.objects.filter(male=self.male_mouse, female=self.female_mouse, cage=self.cage).exists())
+        self.assertEqual(MouseChange.objects.filter(mouse=self.male_mouse, created=False, changes__has_key='state').count(), 1)
+
+    def test_reject(self):
+        """Tests rejecting sets status to 'rejected' and leaves the mice alone."""
         request = self.create_request()
-        request.reject()
+        request_workflow.reject(BreedingRequest, request.pk)
+        request.refresh_from_db()
+        self.male_mouse.refresh_from_db()
         self.assertEqual(request.status, 'rejected')
+        self.assertEqual(self.male_mouse.state, 'alive')
+        self.assertFalse(Breed.objects.exists())
 
 class CullingRequestModelTest(TestCase):
     def setUp(self):
@@ -407,31 +605,56 @@ class CullingRequestModelTest(TestCase):
         self.assertEqual(request.mouse, self.mouse)
         self.assertEqual(request.requester, self.user)
 
-    def test_approve_method(self):
-        """Tests approve method updates status and sets approval date."""
+    def test_approve(self):
+        """Tests approving completes the request and marks the mouse deceased, out of its cage."""
+        cage = Cage.objects.create(cage_number="CULL01", cage_type="TypeA", location="Room 101")
+        self.mouse.move_to_cage(cage)
         request = self.create_request()
-        request.approve(approver=self.user)
-        request.refresh_from_db()
-        self.assertEqual(request.status, "approved")
-        self.assertIsNotNone(request.approval_date)
-
-    def test_complete_method(self):
-        """Tests complete method marks request and mouse as completed/deceased."""
-        request = self.create_request()
-        request.complete()
+        with self.captureOnCommitCallbacks(execute=True):
+            request_workflow.approve(CullingRequest, request.pk)
         request.refresh_from_db()
         self.mouse.refresh_from_db()
 
         self.assertEqual(request.status, "completed")
+        self.assertIsNotNone(request.approval_date)
         self.assertEqual(self.mouse.state, "deceased")
         self.assertIsNotNone(self.mouse.cull_date)
-
-    def test_reject_method(self):
-        """Tests reject method updates status to 'rejected'."""
+        self.assertIsNone(self.mouse.current_cage)
+        self.assertFalse(CageHistory.objects.filter(mouse_id=self.mouse, end_date__isnull=True).exists())
+        self.assertTrue(Notification.objects.filter(recipient=self.user, request_id=request.pk).exists())
+
+    def test_second_culling_of_same_mouse_refused(self):
+        """Tests a second request for an already culled mouse cannot be approved."""
+        first, second = self.create_request(), self.create_request()
+        request_workflow.approve(CullingRequest, first.pk)
+        with self.assertRaises(request_workflow.InvalidTransition):
+            request_workflow.approve(CullingRequest, second.pk)
+        second.refresh_from_db()
+        self.assertEqual(second.status, "pending")
+
+    def test_reject(self):
+        """Tests rejecting updates status to 'rejected'."""
         request = self.create_request()
-        request.reject()
+        request_workflow.reject(CullingRequest, request.pk)
+        request.refresh_from_db()
         self.assertEqual(request.status, "rejected")
 
+    def test_mice_locked_without_for_update_of(self):
+        """Tests backends without FOR UPDATE OF (MariaDB) lock the mice without naming tables or joining strains."""
+        calls = []
+
+        def select_for_update(queryset, **kwargs):
+            calls.append(kwargs)
+            return queryset   # SQLite cannot run FOR UPDATE, so leave the query as is
+
+        with patch.object(connection.features, 'has_select_for_update', True), \
+                patch.object(connection.features, 'has_select_for_update_of', False), \
+                patch('django.db.models.query.QuerySet.select_for_update', autospec=True, side_effect=select_for_update):
+            mice = request_workflow._lock_mice([self.mouse.pk])
+        self.assertEqual(calls, [{}])
+        with self.assertNumQueries(0):
+            self.assertEqual(mice[self.mouse.pk].strain, self.strain)
+
 class TransferRequestModelTest(TestCase):
     def setUp(self):
         """Sets up test data for TransferRequest."""
@@ -488,25 +711,42 @@ class TransferRequestModelTest(TestCase):
         with self.assertRaises(ValidationError):
             request.full_clean()
 
-    def test_approve_method(self):
-        """Tests approve method updates status and creates CageHistory entries."""
+    def test_approve(self):
+        """Tests approving completes the request and moves the mouse in one set of statements."""
         request = self.create_request()
-        request.approve(approver=self.user)
+        with self.assertNumQueries(12):
+            request_workflow.approve(TransferRequest, request.pk)
         request.refresh_from_db()
+        self.mouse.refresh_from_db()
         
         # Check that request status is updated and approval date is set
-        self.assertEqual(request.status, "approved")
+        self.assertEqual(request.status, "completed")
         self.assertIsNotNone(request.approval_date)
         
         # Check CageHistory entries
         self.assertTrue(CageHistory.objects.filter(mouse_id=self.mouse, end_date__isnull=False).exists())
-        self.assertTrue(CageHistory.objects.filter(mouse_id=self.mouse, cage_id=self.destination_cage).exists())
+        self.assertTrue(CageHistory.objects.filter(mouse_id=self.mouse, cage_id=self.destination_cage, end_date__isnull=True).exists())
+        self.assertEqual(self.mouse.current_cage, self.destination_cage)
 
-    def test_reject_method(self):
-        """Tests reject method updates status to 'rejected'."""
+    def test_approve_twice_refused(self):
+        """Tests a request that was already handled cannot be approved again."""
         request = self.create_request()
-        request.reject()
+        with self.captureOnCommitCallbacks(execute=True):
+            request_workflow.approve(TransferRequest, request.pk)
+        with self.assertRaises(request_workflow.InvalidTransition):
+            request_workflow.approve(TransferRequest, request.pk)
+        with self.assertRaises(request_workflow.InvalidTransition):
+            request_workflow.reject(TransferRequest, request.pk)
+        self.assertEqual(CageHistory.objects.filter(mouse_id=self.mouse).count(), 2)
+        self.assertEqual(Notification.objects.filter(recipient=self.user).count(), 1)
+
+    def test_reject(self):
+        """Tests rejecting updates status to 'rejected'."""
+        request = self.create_request()
+        request_workflow.reject(TransferRequest, request.pk)
+        request.refresh_from_db()
         self.assertEqual(request.status, "rejected")
+        self.assertIsNone(request.approval_date)
 
 class BreedModelTest(TestCase):
     def setUp(self):
@@ -0,0 +1,79 @@
+from django.test import TestCase, override_settings
+from django.db import transaction
+from django.utils import timezone
+from website.models import *
+from website.tests import LOCMEM_CACHES
+from website.notifications import NotificationBatch
+from website import request_workflow
+from datetime import date
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class NotificationBatchTest(TestCase):
+    def setUp(self):
+        """Sets up two users and a team with both as members."""
+        self.user = User.objects.create_user(username="testuser", email="test@abdn.ac.uk", password="pass123")
+        self.other = User.objects.create_user(username="other", email="other@abdn.ac.uk", password="pass123")
+        self.team = Team.objects.create(name="Team A")
+        TeamMembership.objects.create(user=self.user, team=self.team)
+        TeamMembership.objects.create(user=self.other, team=self.team)
+
+    def test_written_on_commit(self):
+        """Tests nothing is written before the transaction commits, then everything in one insert."""
+        batch = NotificationBatch()
+        batch.add(self.user, "Hello")
+        batch.add(self.other.pk, "Hello")
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertNumQueries(0):
+                batch.send()
+        self.assertFalse(Notification.objects.exists())
+        with self.assertNumQueries(1):
+            callbacks[0]()
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_rolled_back_batch_not_sent(self):
+        """Tests a batch sent inside a transaction that rolls back writes nothing."""
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    batch = NotificationBatch()
+                    batch.add(self.user, "Hello")
+                    batch.send()
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertFalse(Notification.objects.exists())
+
+    def test_team_fan_out_and_dedupe(self):
+        """Tests a team message reaches every member once, and repeats are dropped."""
+        request = CullingRequest(pk=7)
+        batch = NotificationBatch()
+        batch.add(self.user, "Your culling request has been approved.", request)
+        batch.add_team(self.team, "A culling request has been approved.", request)
+        batch.add_team(self.team, "A culling request has been approved.", request)
+        batch.add(self.other, "Hello")
+        batch.add(self.other, "Hello")
+        with self.assertNumQueries(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                batch.send()
+        messages = sorted(Notification.objects.values_list('recipient__username', 'message', 'request_id'))
+        self.assertEqual(messages, [
+            ('other', 'A culling request has been approved.', 7),
+            ('other', 'Hello', None),
+            ('testuser', 'Your culling request has been approved.', 7),
+        ])
+
+    def test_approval_notifies_keepers(self):
+        """Tests approving a request tells its requester and the members of the mouse's keeper team."""
+        keeper = User.objects.create_user(username="keeper", email="keeper@abdn.ac.uk", password="pass123")
+        strain = Strain.objects.create(name="C57BL/6")
+        mouse = Mouse.objects.create(strain=strain, tube_id=1, dob=date(2025, 1, 1), sex='M')
+        MouseKeeper.objects.create(mouse=mouse, team=self.team, start_date=timezone.now())
+        MouseKeeper.objects.create(mouse=mouse, user=keeper, start_date=timezone.now())
+        request = CullingRequest.objects.create(mouse=mouse, requester=self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            request_workflow.approve(CullingRequest, request.pk)
+        notified = dict(Notification.objects.filter(request_id=request.pk).values_list('recipient__username', 'message'))
+        self.assertEqual(set(notified), {'testuser', 'other', 'keeper'})
+        self.assertTrue(notified['testuser'].startswith("Your culling request"))
+        self.assertIn("which you keep", notified['other'])
@@ -0,0 +1,208 @@
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from website.models import *
+from website.tests import LOCMEM_CACHES
+from website.pedigree import family_rows, family_cytoscape_data, ancestor_tree
+from django.core.cache import cache
+from datetime import date
+from io import StringIO
+
+class MouseLineageTest(TestCase):
+    def setUp(self):
+        """Sets up a three generation family: grandparents -> parents -> child."""
+        self.strain = Strain.objects.create(name="C57BL/6")
+        self.grandfather = Mouse.objects.create(strain=self.strain, tube_id=1, dob=date(2021, 1, 1), sex='M')
+        self.grandmother = Mouse.objects.create(strain=self.strain, tube_id=2, dob=date(2021, 1, 1), sex='F')
+        self.father = Mouse.objects.create(strain=self.strain, tube_id=3, dob=date(2022, 1, 1), sex='M',
+                                           father=self.grandfather, mother=self.grandmother)
+        self.mother = Mouse.objects.create(strain=self.strain, tube_id=4, dob=date(2022, 1, 1), sex='F')
+        self.child = Mouse.objects.create(strain=self.strain, tube_id=5, dob=date(2023, 1, 1), sex='M',
+                                          father=self.father, mother=self.mother)
+
+    def test_rows_created_on_save(self):
+        """Tests closure rows are written with the correct depth when mice are added."""
+        self.assertEqual(MouseLineage.objects.get(ancestor=self.father, descendant=self.child).depth, 1)
+        self.assertEqual(MouseLineage.objects.get(ancestor=self.grandfather, descendant=self.child).depth, 2)
+        self.assertEqual(MouseLineage.objects.filter(descendant=self.child).count(), 4)
+
+    def test_ancestors_of(self):
+        """Tests ancestors_of returns all ancestors annotated with their generation."""
+        ancestors = {m.mouse_id: m.generation for m in Mouse.objects.ancestors_of(self.child)}
+        self.assertEqual(ancestors, {
+            self.father.mouse_id: 1,
+            self.mother.mouse_id: 1,
+            self.grandfather.mouse_id: 2,
+            self.grandmother.mouse_id: 2,
+        })
+
+    def test_ancestors_of_depth_limit(self):
+        """Tests max_depth restricts ancestors to the requested number of generations."""
+        ancestors = set(Mouse.objects.ancestors_of(self.child, max_depth=1))
+        self.assertEqual(ancestors, {self.father, self.mother})
+
+    def test_descendants_of(self):
+        """Tests descendants_of returns children and grandchildren."""
+        descendants = {m.mouse_id: m.generation for m in Mouse.objects.descendants_of(self.grandmother)}
+        self.assertEqual(descendants, {self.father.mouse_id: 1, self.child.mouse_id: 2})
+
+    def test_ancestor_lookup_is_single_query(self):
+        """Tests a full ancestor lookup costs one query regardless of depth."""
+        with self.assertNumQueries(1):
+            self.child.get_ancestors()
+
+    def test_inbred_line_keeps_shortest_depth(self):
+        """Tests an ancestor reachable along two paths is stored once at the shortest depth."""
+        inbred = Mouse.objects.create(strain=self.strain, tube_id=6, dob=date(2024, 1, 1), sex='F',
+                                      father=self.child, mother=self.grandmother)
+        link = MouseLineage.objects.get(ancestor=self.grandmother, descendant=inbred)
+        self.assertEqual(link.depth, 1)
+        self.assertEqual(len(inbred.get_ancestors()), 5)
+
+    def test_parent_change_updates_descendants(self):
+        """Tests changing a parent rewrites the rows of the whole subtree below it."""
+        new_grandfather = Mouse.objects.create(strain=self.strain, tube_id=7, dob=date(2021, 1, 1), sex='M')
+        self.father.father = new_grandfather
+        self.father.save()
+
+        child_ancestors = set(Mouse.objects.ancestors_of(self.child))
+        self.assertIn(new_grandfather, child_ancestors)
+        self.assertNotIn(self.grandfather, child_ancestors)
+
+    def test_unrelated_save_leaves_rows_alone(self):
+        """Tests saving a mouse without changing its parents does not rewrite its rows."""
+        before = list(MouseLineage.objects.filter(descendant=self.child).values_list('id', flat=True))
+        self.child.state = 'breeding'
+        self.child.save()
+        after = list(MouseLineage.objects.filter(descendant=self.child).values_list('id', flat=True))
+        self.assertEqual(before, after)
+
+    def test_delete_updates_descendants(self):
+        """Tests deleting a mouse removes it from the lineage of its descendants."""
+        self.father.delete()
+        ancestors = set(Mouse.objects.ancestors_of(self.child))
+        self.assertEqual(ancestors, {self.mother})
+
+    def test_rebuild_lineage_command(self):
+        """Tests the rebuild command restores rows that were lost."""
+        MouseLineage.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_lineage', stdout=out)
+        self.assertIn("6 rows", out.getvalue())
+        self.assertEqual(MouseLineage.objects.filter(descendant=self.child).count(), 4)
+        self.assertEqual(MouseLineage.objects.count(), 6)
+
+class FamilyNetworkTest(TestCase):
+    def setUp(self):
+        """Sets up two parents with two children, a grandchild and an unrelated mouse."""
+        self.strain = Strain.objects.create(name="BALB/c")
+        self.father = Mouse.objects.create(strain=self.strain, tube_id=1, dob=date(2022, 1, 1), sex='M')
+        self.mother = Mouse.objects.create(strain=self.strain, tube_id=2, dob=date(2022, 1, 1), sex='F')
+        self.son = Mouse.objects.create(strain=self.strain, tube_id=3, dob=date(2023, 1, 1), sex='M',
+                                        father=self.father, mother=self.mother)
+        self.daughter = Mouse.objects.create(strain=self.strain, tube_id=4, dob=date(2023, 1, 1), sex='F',
+                                             father=self.father, mother=self.mother)
+        self.mate = Mouse.objects.create(strain=self.strain, tube_id=5, dob=date(2023, 1, 1), sex='F')
+        self.grandchild = Mouse.objects.create(strain=self.strain, tube_id=6, dob=date(2024, 1, 1), sex='M',
+                                               father=self.son, mother=self.mate)
+        self.stranger = Mouse.objects.create(strain=self.strain, tube_id=7, dob=date(2022, 1, 1), sex='M')
+
+    def test_family_rows_returns_connected_mice(self):
+        """Tests the whole connected family is returned, and unrelated mice are not."""
+        ids = {row[0] for row in family_rows(self.daughter.mouse_id)}
+        self.assertEqual(ids, {self.father.mouse_id, self.mother.mouse_id, self.son.mouse_id,
+                               self.daughter.mouse_id, self.mate.mouse_id, self.grandchild.mouse_id})
+
+    def test_family_rows_radius(self):
+        """Tests radius limits the walk to that many parent/child links."""
+        ids = {row[0] for row in family_rows(self.daughter.mouse_id, radius=1)}
+        self.assertEqual(ids, {self.daughter.mouse_id, self.father.mouse_id, self.mother.mouse_id})
+
+    def test_family_rows_single_mouse(self):
+        """Tests a mouse with no relatives returns just itself."""
+        rows = family_rows(self.stranger.mouse_id)
+        self.assertEqual(rows, [(self.stranger.mouse_id, 7, None, None, "BALB/c")])
+
+    def test_cytoscape_payload(self):
+        """Tests nodes are labelled and highlighted and edges run parent -> child."""
+        data = family_cytoscape_data(self.son.mouse_id)
+        node = next(n['data'] for n in data['nodes'] if n['data']['id'] == str(self.son.mouse_id))
+        self.assertEqual(node['label'], "Strain BALB/c - TubeID 3")
+        self.assertTrue(node['highlight'])
+        edges = {(e['data']['source'], e['data']['target']) for e in data['edges']}
+        self.assertEqual(len(edges), 6)
+        self.assertIn((str(self.son.mouse_id), str(self.grandchild.mouse_id)), edges)
+
+    def test_cytoscape_payload_is_single_query(self):
+        """Tests the payload is built with one query however large the family is."""
+        with self.assertNumQueries(1):
+            family_cytoscape_data(self.grandchild.mouse_id)
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AncestorTreeTest(TestCase):
+    def setUp(self):
+        """Sets up a four generation straight line of mice."""
+        cache.clear()
+        self.strain = Strain.objects.create(name="CBA")
+        self.line = []
+        parent = None
+        for generation in range(4):
+            parent = Mouse.objects.create(strain=self.strain, tube_id=generation + 1, dob=date(2020 + generation, 1, 1),
+                                          sex='F', mother=parent)
+            self.line.append(parent)
+        self.youngest = Mouse.objects.select_related('strain').get(pk=self.line[-1].pk)
+
+    def test_tree_is_cut_at_depth(self):
+        """Tests the tree stops after the requested generations and flags the cut."""
+        tree = ancestor_tree(self.youngest, 2)
+        self.assertEqual(tree['name'], "Strain CBA - TubeID 4")
+        grandmother = tree['children'][0]['children'][0]
+        self.assertEqual(grandmother['id'], self.line[1].mouse_id)
+        self.assertEqual(grandmother['children'], [])
+        self.assertTrue(grandmother['has_more'])
+
+    def test_founder_has_no_more(self):
+        """Tests a node with no parents is not marked as expandable."""
+        tree = ancestor_tree(self.youngest, 3)
+        founder = tree['children'][0]['children'][0]['children'][0]
+        self.assertEqual(founder['id'], self.line[0].mouse_id)
+        self.assertFalse(founder['has_more'])
+
+    def test_repeat_calls_hit_cache(self):
+        """Tests a second request for the same tree runs no queries."""
+        ancestor_tree(self.youngest, 2)
+        with self.assertNumQueries(0):
+            ancestor_tree(self.youngest, 2)
+
+    def test_parent_change_invalidates_cache(self):
+        """Tests cached trees of descendants are dropped when an ancestor's parents change."""
+        ancestor_tree(self.youngest, 3)
+        newcomer = Mouse.objects.create(strain=self.strain, tube_id=9, dob=date(2019, 1, 1), sex='M')
+        self.line[1].father = newcomer
+        self.line[1].save()
+
+        tree = ancestor_tree(self.youngest, 3)
+        great_grandparents = {node['id'] for node in tree['children'][0]['children'][0]['children']}
+        self.assertIn(newcomer.mouse_id, great_grandparents)
+
+    def test_label_change_invalidates_cache(self):
+        """Tests cached trees showing a mouse are dropped when its tube, sex or strain name changes."""
+        ancestor_tree(self.youngest, 3)
+        grandmother = Mouse.objects.get(pk=self.line[1].pk)
+        grandmother.tube_id = 42
+        grandmother.save()
+        tree = ancestor_tree(self.youngest, 3)
+        self.assertEqual(tree['children'][0]['children'][0]['name'], "Strain CBA - TubeID 42")
+
+        self.strain.name = "CBA/J"
+        self.strain.save()
+        tree = ancestor_tree(Mouse.objects.select_related('strain').get(pk=self.youngest.pk), 3)
+        self.assertEqual(tree['children'][0]['children'][0]['name'], "Strain CBA/J - TubeID 42")
+
+    def test_unrelated_save_keeps_cache(self):
+        """Tests saving a mouse without changing its label leaves the cached trees alone."""
+        ancestor_tree(self.youngest, 2)
+        mother = Mouse.objects.get(pk=self.line[2].pk)
+        mother.state = 'breeding'
+        mother.save()
+        with self.assertNumQueries(0):
+            ancestor_tree(self.youngest, 2)
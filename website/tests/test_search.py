@@ -0,0 +1,95 @@
+from django.test import TestCase, SimpleTestCase
+from django.urls import reverse
+from django.core.management import call_command
+from django.db.models import Q
+from django.utils import timezone
+from website.models import *
+from website.search import And, Not, Or, Term, normalize, parse, parse_date, search_filter, tokenize
+from datetime import date
+from io import StringIO
+
+class SearchParserTest(SimpleTestCase):
+    def test_tokenize_keeps_phrases(self):
+        """Tests words between operators form one term and operators are case-insensitive."""
+        self.assertEqual(tokenize('to be culled and not BR'), [Term('to be culled'), 'AND', 'NOT', Term('BR')])
+        self.assertEqual(tokenize('"black and white" or t5'), [Term('black and white'), 'OR', Term('t5')])
+
+    def test_precedence(self):
+        """Tests NOT binds tighter than AND, which binds tighter than OR."""
+        self.assertEqual(
+            parse('a AND NOT b OR c'),
+            Or((And((Term('a'), Not(Term('b')))), Term('c'))),
+        )
+        self.assertEqual(parse('a NOT b'), And((Term('a'), Not(Term('b')))))
+
+    def test_stray_operators_ignored(self):
+        """Tests dangling operators do not break the query."""
+        self.assertEqual(parse('AND a OR'), Term('a'))
+        self.assertIsNone(parse('OR NOT'))
+
+    def test_normalize(self):
+        """Tests spelling variants of a query share one normalized form."""
+        self.assertEqual(normalize('male  and   not  t5'), normalize('male AND NOT t5'))
+        self.assertNotEqual(normalize('"a and b"'), normalize('a and b'))
+
+    def test_parse_date(self):
+        """Tests the date formats the search box used to accept."""
+        self.assertEqual(parse_date('24.1.25'), date(2025, 1, 24))
+        self.assertEqual(parse_date('24/01/2025'), date(2025, 1, 24))
+        self.assertEqual(parse_date('2025-01-24'), date(2025, 1, 24))
+        self.assertEqual(parse_date('1/24/2025'), date(2025, 1, 24))
+        self.assertEqual(parse_date('3-4-99'), date(1999, 4, 3))
+        self.assertIsNone(parse_date('24/01-2025'))
+        self.assertIsNone(parse_date('31/31/2025'))
+        self.assertIsNone(parse_date('C57BL/6'))
+
+    def test_compiled_queries_cached(self):
+        """Tests the same query is compiled once and equivalent spellings share the result."""
+        search_filter.cache_clear()
+        first = search_filter('male AND t5')
+        self.assertIs(search_filter('male AND t5'), first)
+        self.assertIs(search_filter('male and  t5'), first)
+        self.assertEqual(first, Q(sex='M') & Q(tube_id=5))
+
+    def test_benchmark_command(self):
+        """Tests the benchmark runs and reports throughput."""
+        out = StringIO()
+        call_command('benchmark_search', '--queries', '200', '--distinct', '20', stdout=out)
+        self.assertIn("200 queries", out.getvalue())
+
+class HomeSearchTest(TestCase):
+    def setUp(self):
+        """Sets up a user keeping three mice of two strains."""
+        self.user = User.objects.create_user(username="testuser", email="test@abdn.ac.uk", password="pass123")
+        self.client.force_login(self.user)
+        black = Strain.objects.create(name="C57BL/6")
+        albino = Strain.objects.create(name="BALB/c")
+        self.male = Mouse.objects.create(strain=black, tube_id=1, dob=date(2025, 1, 24), sex='M', earmark=['BR'])
+        self.female = Mouse.objects.create(strain=black, tube_id=2, dob=date(2025, 2, 1), sex='F', state='to_be_culled')
+        self.albino = Mouse.objects.create(strain=albino, tube_id=3, dob=date(2025, 2, 1), sex='F')
+        for mouse in (self.male, self.female, self.albino):
+            MouseKeeper.objects.create(mouse=mouse, user=self.user, start_date=timezone.now())
+
+    def search(self, query):
+        response = self.client.get(reverse('index'), {'search': query})
+        return sorted(mouse.tube_id for mouse in response.context['page_obj'])
+
+    def test_terms(self):
+        """Tests shorthand, fielded and free-text terms."""
+        self.assertEqual(self.search('female'), [2, 3])
+        self.assertEqual(self.search('t3'), [3])
+        self.assertEqual(self.search('BR'), [1])
+        self.assertEqual(self.search('to be culled'), [2])
+        self.assertEqual(self.search('balb'), [3])
+        self.assertEqual(self.search('tube_id:x'), [])
+
+    def test_dates(self):
+        """Tests date terms search the date of birth, in any accepted format."""
+        self.assertEqual(self.search('24/1/2025'), [1])
+        self.assertEqual(self.search('dob:2025-02-01'), [2, 3])
+
+    def test_operators(self):
+        """Tests AND, OR and NOT combine terms."""
+        self.assertEqual(self.search('female AND NOT balb'), [2])
+        self.assertEqual(self.search('male OR strain:balb'), [1, 3])
+        self.assertEqual(self.search('NOT tube_id:x'), [1, 2, 3])
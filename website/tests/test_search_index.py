@@ -0,0 +1,87 @@
+from unittest import mock
+from django.test import TestCase
+from django.db import connection
+from django.core.management import call_command
+from django.utils import timezone
+from website.models import *
+from website.search_index import ranked_mouse_ids, refresh_documents, text_filter
+from datetime import date
+from io import StringIO
+
+class SearchIndexTest(TestCase):
+    def setUp(self):
+        """Sets up a keeper, a cage and three mice of two strains."""
+        self.user = User.objects.create_user(username="jsmith", email="jsmith@abdn.ac.uk", password="pass123",
+                                             first_name="Jane", last_name="Smith")
+        self.cage = Cage.objects.create(cage_number="C-42", cage_type="Standard", location="Room 1")
+        self.black = Strain.objects.create(name="C57BL/6")
+        self.albino = Strain.objects.create(name="BALB/c")
+        self.kept = Mouse.objects.create(strain=self.black, tube_id=11, dob=date(2025, 1, 1), sex='M', genotype='ht')
+        self.caged = Mouse.objects.create(strain=self.black, tube_id=12, dob=date(2025, 1, 1), sex='F')
+        self.albino_mouse = Mouse.objects.create(strain=self.albino, tube_id=13, dob=date(2025, 1, 1), sex='F')
+        MouseKeeper.objects.create(mouse=self.kept, user=self.user, start_date=timezone.now())
+        self.caged.move_to_cage(self.cage)
+
+    def matching(self, text):
+        return set(Mouse.objects.filter(text_filter(text)).values_list('tube_id', flat=True))
+
+    def test_document_fields(self):
+        """Tests strain, genotype, state, cage and keeper names are all searchable by prefix."""
+        self.assertEqual(self.matching('c57'), {11, 12})
+        self.assertEqual(self.matching('hetero'), {11})
+        self.assertEqual(self.matching('C-42'), {12})
+        self.assertEqual(self.matching('jane smi'), {11})
+        self.assertEqual(self.matching('c57 jane'), {11})
+        self.assertEqual(self.matching('nobody'), set())
+
+    def test_updated_incrementally(self):
+        """Tests changes to the mouse and to the rows it borrows words from reach the index."""
+        self.albino_mouse.state = 'breeding'
+        self.albino_mouse.save()
+        self.assertEqual(self.matching('breeding'), {13})
+
+        self.albino.name = 'Ai14'
+        self.albino.save()
+        self.assertEqual(self.matching('ai14'), {13})
+        self.assertEqual(self.matching('balb'), set())
+
+        self.user.last_name = 'Jones'
+        self.user.save()
+        self.assertEqual(self.matching('jones'), {11})
+
+        self.caged.leave_cage()
+        self.assertEqual(self.matching('C-42'), set())
+
+    def test_upsert_without_conflict_target(self):
+        """Tests documents are upserted without unique_fields where the database takes no conflict target (MySQL)."""
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False), \
+                mock.patch.object(MouseSearchDocument.objects, 'bulk_create') as bulk_create:
+            refresh_documents([self.kept.pk])
+        kwargs = bulk_create.call_args.kwargs
+        self.assertTrue(kwargs['update_conflicts'])
+        self.assertNotIn('unique_fields', kwargs)
+
+        with mock.patch.object(MouseSearchDocument.objects, 'bulk_create') as bulk_create:
+            refresh_documents([self.kept.pk])
+        self.assertEqual(bulk_create.call_args.kwargs.get('unique_fields'), ['mouse'] if connection.features.supports_update_conflicts_with_target else None)
+
+    def test_deleted_mouse_leaves_index(self):
+        """Tests deleting a mouse (and with it its keepers) removes it from the index."""
+        self.kept.delete()
+        self.assertEqual(self.matching('c57'), {12})
+        self.assertFalse(MouseSearchDocument.objects.filter(mouse_id=self.kept.pk).exists())
+
+    def test_ranked(self):
+        """Tests ranked results are limited and can be restricted to a set of mice."""
+        self.assertEqual(len(ranked_mouse_ids('c57', limit=1)), 1)
+        self.assertEqual(ranked_mouse_ids('c57', mice=Mouse.objects.filter(tube_id=12)), [self.caged.pk])
+        self.assertEqual(ranked_mouse_ids(' '), [])
+
+    def test_rebuild_command(self):
+        """Tests the rebuild command restores lost documents."""
+        MouseSearchDocument.objects.all().delete()
+        self.assertEqual(self.matching('c57'), set())
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn("3 mice", out.getvalue())
+        self.assertEqual(self.matching('c57'), {11, 12})
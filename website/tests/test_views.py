@@ -8,7 +8,10 @@ from django.contrib.auth.middleware import AuthenticationMiddleware
 from django.utils import timezone
 from django.http import JsonResponse
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.db.models import Q
+from django.db.models import F, Q
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from website.models import *
 from website.forms import *
@@ -17,6 +20,8 @@ from website.views import *
 import json
 import logging
 from datetime import date, datetime
+from unittest.mock import patch
+from website.keyset import encode_cursor
 
 User = get_user_model()
 
@@ -303,6 +308,35 @@ class MouseViewsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context['mouse'], self.mouse)
 
+    def test_view_mouse_escapes_tree_data(self):
+        """
+        Test a strain name that closes the script tag is not written into the
+        page as markup.
+        """
+        self.strain.name = '</script><script>alert(1)</script>'
+        self.strain.save()
+        response = self.client.get(reverse('view_mouse', args=[self.mouse.mouse_id]))
+        self.assertNotContains(response, '</script><script>alert(1)')
+        self.assertContains(response, '<script id="tree-data" type="application/json">')
+
+    def test_mouse_pedigree_endpoint(self):
+        """
+        Test the 'mouse_pedigree' view returns the ancestor tree as JSON and
+        rejects a depth that is not a number.
+        """
+
+        cache.clear()
+        child = Mouse.objects.create(tube_id=2, sex='F', state='alive', strain=self.strain,
+                                     dob=date.today(), father=self.mouse)
+        response = self.client.get(reverse('mouse_pedigree', args=[child.mouse_id]), {'depth': 1})
+        self.assertEqual(response.status_code, 200)
+        tree = response.json()['tree']
+        self.assertEqual(tree['id'], child.mouse_id)
+        self.assertEqual([node['id'] for node in tree['children']], [self.mouse.mouse_id])
+
+        response = self.client.get(reverse('mouse_pedigree', args=[child.mouse_id]), {'depth': 'all'})
+        self.assertEqual(response.status_code, 400)
+
     def test_add_mouse_get(self):
         """
         Test the GET request for the 'add_mouse' view.
@@ -356,6 +390,110 @@ class MouseViewsTest(TestCase):
         self.assertIn('tree_data', response.context)
         self.assertIn('mouse', response.context)
 
+    def test_genetic_tree_view_radius(self):
+        """
+        Test the genetic_tree view honours the 'radius' parameter and builds the
+        Cytoscape data for the whole family in a fixed number of queries.
+        """
+
+        child = Mouse.objects.create(tube_id=2, sex='F', state='alive', strain=self.strain,
+                                     dob=date.today(), father=self.mouse)
+        Mouse.objects.create(tube_id=3, sex='M', state='alive', strain=self.strain,
+                             dob=date.today(), mother=child)
+
+        response = self.client.get(reverse('genetic_tree', args=[self.mouse.mouse_id]), {'radius': 1})
+        self.assertEqual(response.status_code, 200)
+        cy_data = json.loads(response.context['cy_data'])
+        self.assertEqual({n['data']['id'] for n in cy_data['nodes']}, {str(self.mouse.mouse_id), str(child.mouse_id)})
+
+    def test_genetic_tree_view_radius_bounds(self):
+        """
+        Test the genetic_tree view rejects a non-positive or non-numeric 'radius'
+        and caps a large one at PEDIGREE_MAX_DEPTH.
+        """
+
+        url = reverse('genetic_tree', args=[self.mouse.mouse_id])
+        for radius in ('0', '-3', 'x', '1.5'):
+            self.assertEqual(self.client.get(url, {'radius': radius}).status_code, 400)
+        with patch('website.views.family_cytoscape_data', return_value={'nodes': [], 'edges': []}) as build:
+            self.assertEqual(self.client.get(url, {'radius': 100000}).status_code, 200)
+        build.assert_called_once_with(self.mouse.mouse_id, PEDIGREE_MAX_DEPTH)
+
+class HomePaginationTest(TestCase):
+    def setUp(self):
+        """Sets up 23 kept mice with repeated and missing values in the sortable columns."""
+        self.user = User.objects.create_user(username="keeper", email="keeper@abdn.ac.uk", password="pass123")
+        self.client.force_login(self.user)
+        strains = [Strain.objects.create(name=name) for name in ("C57BL/6", "BALB/c", "Ai14")]
+        self.mice = []
+        for i in range(23):
+            mouse = Mouse.objects.create(
+                strain=strains[i % 3], tube_id=i // 2, dob=date(2024, 1, 1 + i % 4), sex='MF'[i % 2],
+                clipped_date=date(2024, 2, 1) if i % 3 else None, earmark=['TL'] if i % 2 else [],
+                cull_date=timezone.now() + timezone.timedelta(microseconds=i) if i % 4 == 0 else None,
+            )
+            MouseKeeper.objects.create(mouse=mouse, user=self.user, start_date=timezone.now())
+            self.mice.append(mouse.mouse_id)
+
+    def walk(self, sort_by, sort_order):
+        """Follows the next links to the end, then the previous links back, returning both id sequences."""
+        params = {'sort_by': sort_by, 'sort_order': sort_order}
+        forward, pages = [], []
+        response = self.client.get(reverse('index'), params)
+        while True:
+            page = response.context['page_obj']
+            pages.append([mouse.mouse_id for mouse in page])
+            forward.extend(pages[-1])
+            if not page.has_next:
+                break
+            response = self.client.get(reverse('index'), {**params, 'after': page.next_cursor})
+        backward = []
+        while page.has_previous:
+            page = self.client.get(reverse('index'), {**params, 'before': page.previous_cursor}).context['page_obj']
+            backward.insert(0, [mouse.mouse_id for mouse in page])
+        return forward, pages, backward
+
+    def test_every_sort_visits_each_mouse_once(self):
+        """Tests walking the pages of every sort, both ways, sees every mouse once in the same order."""
+        for sort_by in ('mouse_id', 'strain', 'tube_id', 'dob', 'sex', 'father', 'earmark', 'clipped_date',
+                        'state', 'cull_date', 'weaned', 'genotype'):
+            for sort_order in ('asc', 'desc'):
+                with self.subTest(sort_by=sort_by, sort_order=sort_order):
+                    forward, pages, backward = self.walk(sort_by, sort_order)
+                    self.assertEqual(sorted(forward), sorted(self.mice))
+                    self.assertEqual(backward, pages[:-1])
+                    self.assertEqual([len(page) for page in pages], [10, 10, 3])
+
+    def test_sort_order_respected(self):
+        """Tests rows come in sort order, ties broken by mouse ID and missing values last."""
+        forward, _, _ = self.walk('clipped_date', 'desc')
+        expected = list(Mouse.objects.order_by(F('clipped_date').desc(nulls_last=True), '-mouse_id').values_list('mouse_id', flat=True))
+        self.assertEqual(forward, expected)
+
+    def test_bad_or_foreign_cursor_starts_over(self):
+        """Tests an unreadable cursor, or one from another sort, shows the first page."""
+        first = self.client.get(reverse('index')).context['page_obj']
+        for cursor in ('garbage', first.next_cursor):
+            page = self.client.get(reverse('index'), {'sort_by': 'dob', 'after': cursor}).context['page_obj']
+            self.assertFalse(page.has_previous)
+
+    def test_cursor_with_wrong_value_type_starts_over(self):
+        """Tests a well-formed cursor whose value does not fit the sort field shows the first page."""
+        for sort_by, value in (('dob', {'a': 1}), ('dob', 'not a date'), ('tube_id', 'x'), ('weaned', [1])):
+            cursor = encode_cursor(f'{sort_by}:asc', value, 1)
+            for direction in ('after', 'before'):
+                response = self.client.get(reverse('index'), {'sort_by': sort_by, direction: cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.context['page_obj'].has_previous)
+
+    def test_deep_page_queries(self):
+        """Tests a later page costs the same queries as the first."""
+        self.client.get(reverse('index'))   # warm the cached mouse count
+        with CaptureQueriesContext(connection) as first_page:
+            first = self.client.get(reverse('index')).context['page_obj']
+        with self.assertNumQueries(len(first_page.captured_queries)):
+            self.client.get(reverse('index'), {'after': first.next_cursor})
+
 class TeamViewsTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -446,6 +584,14 @@ class TeamViewsTest(TestCase):
         self.assertTrue(Team.objects.filter(name='New Team').exists())
         self.assertTrue(TeamMembership.objects.filter(team__name='New Team', user=self.user).exists())
 
+    def test_search_users(self):
+        """Test user search lists prefix matches before substring matches."""
+        for username in ('bob', 'alice', 'testuser2', 'mytest'):
+            User.objects.create_user(username=username, email=f'{username}@abdn.ac.uk', password='testpass123')
+        response = self.client.get(reverse('search_users'), {'q': 'TEST'})
+        self.assertEqual([user['username'] for user in response.json()], ['testuser', 'testuser2', 'mytest'])
+        self.assertIn('max-age', response['Cache-Control'])
+
 class CageViewsTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -474,6 +620,52 @@ class CageViewsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn('cage_data', response.context)
 
+    def test_search_mice(self):
+        """Test mouse search is bounded, ranked and answered with an ETag."""
+        for tube_id in range(2, 30):
+            Mouse.objects.create(strain=self.strain, tube_id=tube_id, sex='F', state='alive', dob=date.today())
+        self.assertEqual(len(self.client.get(reverse('search_mice'), {'q': 'test'}).json()), 20)
+        response = self.client.get(reverse('search_mice'), {'q': str(self.mouse.mouse_id)})
+        results = response.json()
+        self.assertEqual(results[0]['id'], self.mouse.mouse_id)
+        self.assertEqual(results[0]['strain'], 'Test Strain')
+        self.assertEqual(self.client.get(reverse('search_mice'), {'q': ''}).json(), [])
+
+        # A repeat with the ETag is not modified until a mouse changes
+        etag = response['ETag']
+        response = self.client.get(reverse('search_mice'), {'q': str(self.mouse.mouse_id)}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.mouse.state = 'breeding'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mouse.save()
+        response = self.client.get(reverse('search_mice'), {'q': str(self.mouse.mouse_id)}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['state'], 'breeding')
+
+    def test_cage_typeahead(self):
+        """Test the cage typeahead suggests cages by number prefix."""
+        Cage.objects.create(cage_number='B7', cage_type='Standard', location='North')
+        Cage.objects.create(cage_number='C12', cage_type='Standard', location='North')
+        response = self.client.get(reverse('cage_typeahead'), {'q': 'c1'})
+        self.assertEqual([cage['text'] for cage in response.json()['results']], ['C12'])
+
+    def test_mouse_typeahead(self):
+        """Test the mouse typeahead matches ids, tube numbers and strains within the given filters."""
+        other = Strain.objects.create(name='BALB/c')
+        female = Mouse.objects.create(strain=other, tube_id=12, sex='F', state='alive', dob=date.today())
+        culled = Mouse.objects.create(strain=other, tube_id=13, sex='F', state='deceased', dob=date.today())
+
+        def suggest(**params):
+            response = self.client.get(reverse('mouse_typeahead'), params)
+            return [mouse['id'] for mouse in response.json()['results']]
+
+        self.assertCountEqual(suggest(q='bal'), [female.mouse_id, culled.mouse_id])
+        self.assertEqual(suggest(q='bal', exclude_state='deceased'), [female.mouse_id])
+        self.assertEqual(suggest(q='test', sex='F'), [])
+        self.assertEqual(suggest(q='12'), [female.mouse_id])
+        self.assertEqual(suggest(q=str(self.mouse.mouse_id))[0], self.mouse.mouse_id)
+        self.assertEqual(len(suggest()), 3)
+
     def test_cage_details_view(self):
         """
         Test the cage details view to ensure it returns a 200 status code
@@ -508,6 +700,100 @@ class CageViewsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIsInstance(response, JsonResponse)
 
+    def create_cages(self, count, location='Room 1'):
+        """Creates cages holding one mouse each."""
+        start = Cage.objects.count()
+        for i in range(start, start + count):
+            cage = Cage.objects.create(cage_number=f"Q-{i:04d}", cage_type='standard', location=location)
+            mouse = Mouse.objects.create(strain=self.strain, tube_id=100 + i, sex='F', state='alive', dob=date.today())
+            mouse.move_to_cage(cage)
+
+    def test_all_cages_shows_occupants(self):
+        """Test each cage on the page lists the mice currently in it."""
+        self.mouse.move_to_cage(self.cage)
+        response = self.client.get(reverse('cages'))
+        occupants = {item['cage'].cage_id: item['current_mice'] for item in response.context['cage_data']}
+        self.assertEqual(occupants[self.cage.cage_id], [self.mouse])
+
+    def test_all_cages_query_count_is_constant(self):
+        """Test the number of queries does not grow with the number of cages on the page."""
+        self.create_cages(3)
+        with self.assertNumQueries(6) as small:
+            self.client.get(reverse('cages'))
+        self.create_cages(30)
+        with self.assertNumQueries(len(small.captured_queries)):
+            self.client.get(reverse('cages'))
+
+    def test_all_cages_pagination_and_location(self):
+        """Test the cage list is paginated and can be filtered by location."""
+        self.create_cages(CAGES_PER_PAGE + 2, location='Room 1')
+        self.create_cages(2, location='Room 2')
+
+        response = self.client.get(reverse('cages'))
+        self.assertEqual(len(response.context['cage_data']), CAGES_PER_PAGE)
+
+        response = self.client.get(reverse('cages'), {'location': 'Room 2'})
+        self.assertEqual([item['cage'].location for item in response.context['cage_data']], ['Room 2', 'Room 2'])
+
+        response = self.client.get(reverse('cages'), {'location': 'Room 1', 'page': 2})
+        self.assertEqual(len(response.context['cage_data']), 2)
+        self.assertContains(response, 'location=Room+1')
+
+class OccupancyViewsTest(TestCase):
+    def setUp(self):
+        """Sets up two cages at one location and a mouse that moved between them."""
+        self.user = User.objects.create_user(username='testuser', email='test@abdn.ac.uk', password='testpass123')
+        self.cage = Cage.objects.create(cage_number='A-1', cage_type='standard', location='Room 1')
+        self.other_cage = Cage.objects.create(cage_number='A-2', cage_type='standard', location='Room 1')
+        self.strain = Strain.objects.create(name='Test Strain')
+        self.mouse = Mouse.objects.create(strain=self.strain, tube_id=1, sex='M', dob=date(2024, 1, 1))
+        self.moved = timezone.make_aware(datetime(2025, 3, 1, 12, 0))
+        self.mouse.move_to_cage(self.cage, when=self.moved - timezone.timedelta(days=30))
+        self.mouse.move_to_cage(self.other_cage, when=self.moved)
+        self.client.force_login(self.user)
+
+    def test_census_for_cage_at_moment(self):
+        """Test the census lists the mice in a cage at a given time."""
+        response = self.client.get(reverse('cage_census'), {'cage': self.cage.cage_id, 'at': '2025-02-15'})
+        cages = response.json()['cages']
+        self.assertEqual(len(cages), 1)
+        self.assertEqual(cages[0]['mice'][0]['mouse_id'], self.mouse.mouse_id)
+        self.assertEqual(cages[0]['mice'][0]['mouse'], "Strain Test Strain - TubeID 1")
+
+        response = self.client.get(reverse('cage_census'), {'cage': self.cage.cage_id})
+        self.assertEqual(response.json()['cages'], [])
+
+    def test_census_for_location_on_day(self):
+        """Test a whole-day census of a location includes both cages the mouse was in that day."""
+        response = self.client.get(reverse('cage_census'), {'location': 'Room 1', 'on': '2025-03-01'})
+        self.assertEqual([cage['cage_number'] for cage in response.json()['cages']], ['A-1', 'A-2'])
+
+    def test_census_is_single_query(self):
+        """Test the census is answered with one query however many cages match."""
+        with self.assertNumQueries(3):
+            self.client.get(reverse('cage_census'), {'location': 'Room 1'})
+
+    def test_census_rejects_bad_parameters(self):
+        """Test the census needs exactly one of cage or location and a valid time."""
+        self.assertEqual(self.client.get(reverse('cage_census')).status_code, 400)
+        response = self.client.get(reverse('cage_census'), {'location': 'Room 1', 'at': 'noon'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('cage_census'), {'cage': 'A-1'}).status_code, 400)
+        response = self.client.get(reverse('cage_census'), {'location': 'Room 1', 'on': '2025-02-30'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('cage_census'), {'location': 'Room 1', 'at': '2025-02-30'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_mouse_cage_timeline(self):
+        """Test the timeline lists a mouse's placements in order and can be windowed."""
+        response = self.client.get(reverse('mouse_cage_timeline', args=[self.mouse.mouse_id]))
+        placements = response.json()['placements']
+        self.assertEqual([p['cage_number'] for p in placements], ['A-1', 'A-2'])
+        self.assertIsNone(placements[1]['end_date'])
+
+        response = self.client.get(reverse('mouse_cage_timeline', args=[self.mouse.mouse_id]), {'start': '2025-03-02'})
+        self.assertEqual([p['cage_number'] for p in response.json()['placements']], ['A-2'])
+
 class RequestViewsTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -569,6 +855,56 @@ class RequestViewsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn('current_transfers', response.context)
 
+    def test_all_requests_inbox(self):
+        """Test the requests of every type are listed together, each section paged on its own."""
+        self.culling_request.status = 'rejected'
+        self.culling_request.save()
+        other = User.objects.create_user(username='other', email='other@abdn.ac.uk', password='testpass123', role='leader')
+        TransferRequest.objects.create(requester=other, mouse=self.mouse2, destination_cage=self.cage)
+
+        response = self.client.get(reverse('all_requests'))
+        current = [(row.request_type, row.id) for row in response.context['current_page_obj']]
+        self.assertEqual(current, [('transfer', self.transfer_request.id), ('breeding', self.breeding_request.id)])
+        self.assertEqual([row.request_type for row in response.context['completed_page_obj']], ['culling'])
+        self.assertEqual(response.context['counts']['completed_cullings'].value, 1)
+
+        self.client.force_login(self.breeder)
+        for tube_id in range(REQUESTS_PER_PAGE):
+            mouse = Mouse.objects.create(strain=self.strain, tube_id=10 + tube_id, sex='F', dob=date.today())
+            CullingRequest.objects.create(requester=self.user, mouse=mouse)
+        response = self.client.get(reverse('all_requests'), {'current_page': 2})
+        page = response.context['current_page_obj']
+        self.assertEqual(len(page), 3)
+        self.assertTrue(page.has_previous)
+        self.assertFalse(page.has_next)
+        self.assertEqual(response.context['completed_page_obj'].number, 1)
+        self.assertEqual(response.context['completed_page_query'], 'current_page=2')
+
+        # Requests written without signals leave the cached counts stale; the
+        # pages still list them
+        mice = Mouse.objects.bulk_create([
+            Mouse(strain=self.strain, tube_id=100 + n, sex='F', dob=date.today()) for n in range(2)
+        ])
+        CullingRequest.objects.bulk_create([CullingRequest(requester=self.user, mouse=mouse) for mouse in mice])
+        response = self.client.get(reverse('all_requests'), {'current_page': 2})
+        self.assertEqual(response.context['counts']['current_cullings'].value, REQUESTS_PER_PAGE)
+        self.assertEqual(len(response.context['current_page_obj']), 5)
+
+    def test_all_requests_query_count(self):
+        """Test listing more requests does not take more queries."""
+        self.client.force_login(self.breeder)
+
+        def list_requests(count):
+            for _ in range(count):
+                TransferRequest.objects.create(requester=self.user, mouse=self.mouse, source_cage=self.cage, destination_cage=self.cage)
+                BreedingRequest.objects.create(requester=self.user, male_mouse=self.mouse, female_mouse=self.mouse2, cage=self.cage, status='completed')
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('all_requests'))
+            return len(queries.captured_queries)
+
+        self.assertEqual(list_requests(1), list_requests(10))
+
     def test_create_transfer_request_view(self):
         """
         Test the 'create_transfer_request' view to ensure it returns a 200 status code.
@@ -693,6 +1029,73 @@ class RequestViewsTest(TestCase):
         with self.assertRaises(CullingRequest.DoesNotExist):
             CullingRequest.objects.get(id=self.culling_request.id)
 
+    def test_bulk_approve_reports_each_request(self):
+        """
+        Test a bulk approval applies what it can and reports why the rest
+        were skipped.
+        """
+        self.client.force_login(self.breeder)
+        items = [
+            ('transfer', self.transfer_request.id), ('breeding', self.breeding_request.id),
+            ('culling', self.culling_request.id), ('transfer', self.transfer_request.id),
+            ('culling', 999), ('cage', 1),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('bulk_requests'),
+                json.dumps({'action': 'approve', 'requests': [{'type': t, 'id': i} for t, i in items]}),
+                content_type='application/json',
+            )
+        results = response.json()['results']
+        self.assertEqual([result['ok'] for result in results], [True, False, False, False, False, False])
+        self.assertIn('already changed by another request', results[1]['message'])
+        self.assertEqual(results[3]['message'], 'Listed more than once.')
+
+        self.transfer_request.refresh_from_db()
+        self.breeding_request.refresh_from_db()
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.transfer_request.status, 'completed')
+        self.assertEqual(self.breeding_request.status, 'pending')
+        self.assertEqual(self.mouse.current_cage, self.cage)
+        self.assertEqual(Notification.objects.filter(recipient=self.user).count(), 1)
+
+    def test_bulk_reject_from_form(self):
+        """Test the request list's form rejects the selected requests."""
+        self.client.force_login(self.breeder)
+        response = self.client.post(reverse('bulk_requests'), {
+            'action': 'reject',
+            'requests': [f'breeding:{self.breeding_request.id}', f'culling:{self.culling_request.id}'],
+        })
+        self.assertRedirects(response, reverse('all_requests'))
+        self.breeding_request.refresh_from_db()
+        self.culling_request.refresh_from_db()
+        self.assertEqual(self.breeding_request.status, 'rejected')
+        self.assertEqual(self.culling_request.status, 'rejected')
+
+        response = self.client.post(reverse('bulk_requests'), {'action': 'approve', 'requests': ['transfer:x']})
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_approve_query_count(self):
+        """Test approving more requests at once does not take more queries."""
+        self.client.force_login(self.breeder)
+
+        def approve_cullings(count):
+            mice = [
+                Mouse.objects.create(strain=self.strain, tube_id=100 + Mouse.objects.count(), sex='F', dob=date.today())
+                for _ in range(count)
+            ]
+            for mouse in mice:
+                mouse.move_to_cage(self.cage)
+            requests = [CullingRequest.objects.create(requester=self.user, mouse=mouse) for mouse in mice]
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(reverse('bulk_requests'), {
+                    'action': 'approve', 'requests': [f'culling:{request.id}' for request in requests],
+                })
+            self.assertFalse(CullingRequest.objects.filter(id__in=[r.id for r in requests], status='pending').exists())
+            return len(queries.captured_queries)
+
+        self.assertEqual(approve_cullings(2), approve_cullings(8))
+
 class BreedingViewsTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(
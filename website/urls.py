@@ -10,6 +10,7 @@ urlpatterns = [
     path('legal/terms-of-service/', views.terms_of_service, name='terms_of_service'), # legal
     path('legal/privacy-policy/', views.privacy_policy, name='privacy_policy'), # legal
     path('download-database/', views.download_database_csv, name='download_database_csv'),
+    path('colony/at/', views.colony_snapshot, name='colony_snapshot'),
     path('', views.home_view, name='index'),  # Index page
     path('login/', auth_views.LoginView.as_view(), name='login'),  # Login page
     path('register/', views.register, name='register'), # Register page
@@ -35,7 +36,11 @@ urlpatterns = [
 
     # --- mice ---
     path('mice/<int:mouse_id>/', views.MouseClass.view_mouse, name='view_mouse'),
+    path('mice/<int:mouse_id>/pedigree/', views.MouseClass.pedigree, name='mouse_pedigree'),
+    path('mice/<int:mouse_id>/cages/', views.MouseClass.cage_timeline, name='mouse_cage_timeline'),
+    path('mice/typeahead/', views.MouseClass.typeahead, name='mouse_typeahead'),
     path('mice/add/', views.MouseClass.add_mouse, name='add_mouse'),
+    path('mice/import/', views.MouseClass.import_mice, name='import_mice'),
     path('mice/update/<int:mouse_id>/', views.MouseClass.MouseUpdateView.as_view(), name='update_mouse'),
     path('mice/delete/<int:mouse_id>/', views.MouseClass.delete_mouse, name='delete_mouse'),
 
@@ -53,6 +58,8 @@ urlpatterns = [
 
     # --- cage ---
     path('cages/', views.CageClass.all_cages, name='cages'),
+    path('cages/census/', views.CageClass.cage_census, name='cage_census'),
+    path('cages/typeahead/', views.CageClass.typeahead, name='cage_typeahead'),
     path('cage/create', views.CageClass.create_cage, name='create_cage'),
     path('cage/<int:cage_id>/add_mouse_to_cage/', views.CageClass.add_mouse_to_cage, name='add_mouse_to_cage'),
     path('cage/available-mice/', views.CageClass.fetch_available_mice, name='fetch_available_mice'),
@@ -62,6 +69,7 @@ urlpatterns = [
     # --- request ---
     # transfer
     path('requests/', views.AllRequestsClass.all_requests, name="all_requests"),
+    path('requests/bulk/', views.AllRequestsClass.bulk_action, name="bulk_requests"),
     path('requests/create/transfer-request', views.TransferRequestClass.create_transfer_request, name="create_transfer_request"),
     path('requests/get-transfer-data/', views.TransferRequestClass.get_transfer_data, name='get_transfer_data'),
     path('requests/cancel-transfer/<int:transfer_id>', views.TransferRequestClass.cancel_transfer_request, name="cancel_transfer_request"),
@@ -70,7 +78,9 @@ urlpatterns = [
     # breeding
     path('breedings/', views.BreedingsClass.all_breedings, name="all_breedings"),
     path('breedings/end-breeding/<int:breeding_id>/', views.BreedingsClass.end_breeding, name='end_breeding'),
+    path('breedings/recommend/', views.BreedingsClass.recommended_pairs, name='recommend_breeding_pairs'),
     path('requests/create/breeding-request', views.BreedingRequestClass.create_breeding_request, name="create_breeding_request"),
+    path('requests/breeding-kinship/', views.BreedingRequestClass.breeding_pair_kinship, name='breeding_pair_kinship'),
     path('requests/cancel-breeding/<int:breeding_id>', views.BreedingRequestClass.cancel_breeding_request, name="cancel_breeding_request"),
     path('requests/approve-breeding/<int:breeding_id>/', views.BreedingRequestClass.approve_breeding_request, name='approve_breeding'),
     path('requests/reject-breeding/<int:breeding_id>/', views.BreedingRequestClass.reject_breeding_request, name='reject_breeding'),
@@ -1,5 +1,5 @@
 import logging
-import re
+import datetime as dt
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
@@ -8,27 +8,71 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse
 from django.utils.decorators import method_decorator
 from django.http import JsonResponse
-from django.db.models import Q
+from django.db.models import F, Prefetch, Q, TextField
+from django.db.models.functions import Cast
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from .decorators import role_required
 from .models import *
 from .forms import *
+from .pedigree import PEDIGREE_MAX_DEPTH, ancestor_tree, family_cytoscape_data
+from .kinship import pair_kinship
+from .breeding import recommend_pairs
 import json
+from urllib.parse import urlencode
 
 from django.views.generic.edit import UpdateView
 from django.contrib.auth.forms import PasswordResetForm
-import csv
-from django.http import HttpResponse
-from django.apps import apps
-import zipfile
-from io import BytesIO, StringIO
+from django.http import HttpResponse, StreamingHttpResponse
+from .exports import EXPORT_FORMATS, stream_database_zip
+from .imports import REQUIRED_COLUMNS, OPTIONAL_COLUMNS, import_mice
+from .history import colony_at, earliest_moment
+from .search import normalize, search_filter
+from .counts import cached_count, count_version
+from .search_index import suggested_mouse_ids
+from .keyset import InvalidCursor, keyset_page
+from . import request_inbox, request_workflow
+import io
+import hashlib
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
 
 # --- Messages ---
 record_added = "Record has been added successfully."
 record_deleted = "Record has been deleted successfully."
 record_updated = "Record has been updated successfully."
 
+# Generations of the pedigree sent with the mouse details page
+PEDIGREE_INITIAL_DEPTH = 3
+
+# Kinship at or above which a breeding pair is flagged (half siblings = 0.125)
+KINSHIP_WARNING_THRESHOLD = 0.125
+
+# Upper bound on the number of pairs the recommendation endpoint returns
+MAX_RECOMMENDED_PAIRS = 100
+
+# Rejected lines listed on the import page; the count covers the rest
+MAX_IMPORT_ERRORS_SHOWN = 200
+
+CAGES_PER_PAGE = 48
+
+MICE_PER_PAGE = 10
+
+# Suggestions returned by the typeahead endpoints
+TYPEAHEAD_LIMIT = 20
+
+# Seconds search responses are reused, by the server and the browser
+SEARCH_RESPONSE_TIMEOUT = 30
+
+REQUESTS_PER_PAGE = 25
+
+# Requests one bulk approve/reject may cover
+MAX_BULK_REQUESTS = 500
+
+# Mice per page of the point-in-time colony
+SNAPSHOT_PAGE_SIZE = 500
+
 # Legal Boiler-plate Views
 def terms_of_service(request):
     return render(request, 'legal/terms-of-service.html')
@@ -37,32 +81,120 @@ def privacy_policy(request):
 
 @login_required
 def download_database_csv(request):
-    # Use binary buffer for zip file
-    zip_buffer = BytesIO()
-    
-    with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
-        for model in apps.get_models():
-            model_name = model._meta.model_name
-            file_name = f"{model_name}.csv"
-
-            # Use text buffer for CSV
-            csv_buffer = StringIO()
-            writer = csv.writer(csv_buffer)
-
-            fields = [field.name for field in model._meta.fields]
-            writer.writerow(fields)
-            for obj in model.objects.all():
-                writer.writerow([getattr(obj, field) for field in fields])
-
-            # Write the CSV string as a file inside the zip (encoded to bytes)
-            zip_file.writestr(file_name, csv_buffer.getvalue().encode('utf-8'))
-
-    # Prepare the response
-    zip_buffer.seek(0)
-    response = HttpResponse(zip_buffer.getvalue(), content_type='application/zip')
-    response['Content-Disposition'] = 'attachment; filename="database_dump.zip"'
+    # 'since' (or 'since_<table>' for a single table) switches to an incremental
+    # export holding only rows changed after that time, plus deletions
+    watermarks = None
+    for key, value in request.GET.items():
+        if key != 'since' and not key.startswith('since_'):
+            continue
+        mark = parse_moment(value)
+        if mark is None:
+            return HttpResponse(f"Invalid timestamp for '{key}'.", status=400)
+        watermarks = watermarks or {}
+        watermarks[None if key == 'since' else key[len('since_'):]] = mark
+
+    # 'format=parquet' writes typed Parquet tables for analytics instead of CSV
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponse(f"Unsupported format '{export_format}'.", status=400)
+
+    # Stream the zip as it is written so memory stays flat however big the tables are
+    response = StreamingHttpResponse(stream_database_zip(watermarks=watermarks, format=export_format),
+                                     content_type='application/zip')
+    filename = "database_dump.zip" if watermarks is None else "database_changes.zip"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def parse_moment(value):
+    """Parse an ISO date/time query parameter into an aware datetime, or None."""
+    try:
+        moment = parse_datetime(value)
+        day = None if moment is not None else parse_date(value)
+    except ValueError:   # well formed but not a real date, e.g. 2025-02-30
+        return None
+    if moment is None:
+        if day is None:
+            return None
+        moment = dt.datetime.combine(day, dt.time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+def placement_json(placement):
+    """Serialise a CageHistory ``values()`` row for the occupancy endpoints."""
+    return {
+        'cage_id': placement['cage_id'],
+        'cage_number': placement['cage_id__cage_number'],
+        'location': placement['cage_id__location'],
+        'mouse_id': placement['mouse_id'],
+        'mouse': f"Strain {placement['mouse_id__strain__name']} - TubeID {placement['mouse_id__tube_id']}",
+        'sex': placement['mouse_id__sex'],
+        'start_date': placement['start_date'].isoformat(),
+        'end_date': placement['end_date'].isoformat() if placement['end_date'] else None,
+    }
+
+PLACEMENT_FIELDS = (
+    'cage_id', 'cage_id__cage_number', 'cage_id__location', 'mouse_id', 'mouse_id__strain__name',
+    'mouse_id__tube_id', 'mouse_id__sex', 'start_date', 'end_date',
+)
+
+def cached_json(request, key, build):
+    """
+    JSON response for ``build()``, reused for SEARCH_RESPONSE_TIMEOUT seconds
+    under ``key``, which should include the ``count_version`` of the models
+    read. The body's hash is sent as ETag, so a browser repeating a search
+    gets an empty 304 while the result is unchanged.
+    """
+    key = f"json:{hashlib.md5(key.encode()).hexdigest()}"
+    body = cache.get(key)
+    if body is None:
+        body = json.dumps(build())
+        cache.set(key, body, SEARCH_RESPONSE_TIMEOUT)
+    etag = f'"{hashlib.md5(body.encode()).hexdigest()}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=SEARCH_RESPONSE_TIMEOUT)
     return response
 
+def _apply_transition(request, model, request_id, action):
+    """Approve or reject a request through request_workflow and go back to the request list."""
+    try:
+        request_workflow.transition(model, request_id, action)
+    except request_workflow.InvalidTransition as error:
+        messages.error(request, str(error))
+    return redirect('all_requests')
+
+@login_required
+@role_required(allowed_roles=['leader', 'staff', 'breeder'])
+def colony_snapshot(request):
+    # The colony (mouse fields, cages, keepers, breeding pairs) as it was at
+    # 'at', SNAPSHOT_PAGE_SIZE mice at a time from after the 'after' mouse_id
+    if not request.GET.get('at'):
+        return JsonResponse({'success': False, 'message': "Give a date or date/time as 'at'."}, status=400)
+    moment = parse_moment(request.GET['at'])
+    if moment is None:
+        return JsonResponse({'success': False, 'message': "'at' must be a date or date/time."}, status=400)
+    earliest = earliest_moment()
+    if moment > timezone.now() or earliest is None or moment < earliest:
+        return JsonResponse({'success': False, 'message': "'at' must lie between the start of the history and now."},
+                            status=400)
+    after = request.GET.get('after', '0')
+    if not after.isdigit():
+        return JsonResponse({'success': False, 'message': "'after' must be a mouse ID."}, status=400)
+
+    mouse_ids = list(Mouse.objects.filter(mouse_id__gt=int(after)).order_by('mouse_id')
+                     .values_list('mouse_id', flat=True)[:SNAPSHOT_PAGE_SIZE + 1])
+    has_more = len(mouse_ids) > SNAPSHOT_PAGE_SIZE
+    mouse_ids = mouse_ids[:SNAPSHOT_PAGE_SIZE]
+    colony = colony_at(moment, mouse_ids)
+    mice = [{'mouse_id': mouse_id, **values} for mouse_id, values in sorted(colony['mice'].items())]
+    return JsonResponse({
+        'success': True, 'at': moment.isoformat(), 'mice': mice, 'breeding_pairs': colony['breeding_pairs'],
+        'next_after': mouse_ids[-1] if has_more else None,
+    })
+
 def password_reset(request):
     if request.method == "POST":
         form = PasswordResetForm(request.POST)
@@ -84,258 +216,73 @@ def password_reset_complete(request):
 def home_view(request):
     query = request.GET.get('search', '').strip()
 
-    mice = Mouse.mice_managed_by_user(request.user).order_by("tube_id")
+    mice = Mouse.mice_managed_by_user(request.user).select_related('strain')
 
     if query:
-        # Case-insensitive check for OR operation
-        is_or_search = re.search(r"\s+\bOR\b\s+", query, re.IGNORECASE) is not None
-        query_filter = None  # Start with an empty query
-
-        # Split by OR (case-insensitive)
-        or_groups = re.split(r"\s+\bOR\b\s+", query, flags=re.IGNORECASE)  # Split OR groups
-
-        for or_group in or_groups:
-            subquery = Q()
-            and_parts = re.split(r"\s+\bAND\b\s+", or_group, flags=re.IGNORECASE)  # Split AND groups
-
-            for term in and_parts:
-                term = term.strip()
-
-                is_exclusion = term.lower().startswith("not ")
-                term = term[4:].strip() if is_exclusion else term
-
-                # Process the search term based on specific formats
-                filter_condition = process_search_term(term, is_exclusion)
-                
-                subquery &= filter_condition  # Apply AND within the OR group
-
-            if query_filter is None:
-                query_filter = subquery  # First condition
-            else:
-                query_filter |= subquery  # Apply OR between groups
-
-        if query_filter:
+        # Parsed and compiled once per distinct query, see search.py
+        query_filter = search_filter(query)
+        if query_filter is not None:
             mice = mice.filter(query_filter)
 
+    # Cached per user and normalized query; keeper and team changes alter
+    # which mice the user sees
+    mouse_count = cached_count(
+        mice, 'home', request.user, filters=normalize(query) if query else '',
+        depends_on=(MouseKeeper, TeamMembership),
+    )
+
     # Handle sorting
     sort_by = request.GET.get('sort_by', 'mouse_id')
     sort_order = request.GET.get('sort_order', 'asc')
 
-    # Mapping of safe model fields to sort keys
+    # Mapping of safe sort keys to the columns they order by
     valid_sort_fields = {
-        'mouse_id': 'mouse_id',
-        'strain': 'strain__name',
-        'tube_id': 'tube_id',
-        'dob': 'dob',
-        'sex': 'sex',
-        'father': 'father__mouse_id',
-        'mother': 'mother__mouse_id',
-        'earmark': 'earmark',
-        'clipped_date': 'clipped_date',
-        'state': 'state',
-        'cull_date': 'cull_date',
-        'weaned': 'weaned',
-        'weaned_date': 'weaned_date',
+        'mouse_id': F('mouse_id'),
+        'strain': F('strain__name'),
+        'tube_id': F('tube_id'),
+        'dob': F('dob'),
+        'sex': F('sex'),
+        'father': F('father_id'),
+        'mother': F('mother_id'),
+        # Compared as text so the position can be carried in the cursor
+        'earmark': Cast('earmark', TextField()),
+        'clipped_date': F('clipped_date'),
+        'state': F('state'),
+        'cull_date': F('cull_date'),
+        'weaned': F('weaned'),
+        'weaned_date': F('weaned_date'),
+        'genotype': F('genotype'),
     }
-
-    sort_field = valid_sort_fields.get(sort_by, 'mouse_id')
-    if sort_order == 'desc':
-        sort_field = f"-{sort_field}"
-
-    mice = mice.order_by(sort_field)
-
-    paginator = Paginator(mice, 10)
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    if sort_by not in valid_sort_fields:
+        sort_by = 'mouse_id'
+    if sort_order != 'desc':
+        sort_order = 'asc'
+
+    # Keyset pagination: 'after'/'before' cursors instead of page numbers, so
+    # deep pages cost the same as the first and no COUNT(*) is needed
+    page_kwargs = dict(
+        sort_key=f"{sort_by}:{sort_order}", sort_expression=valid_sort_fields[sort_by],
+        descending=sort_order == 'desc', per_page=MICE_PER_PAGE,
+    )
+    try:
+        page_obj = keyset_page(mice, after=request.GET.get('after'), before=request.GET.get('before'), **page_kwargs)
+    except InvalidCursor:
+        page_obj = keyset_page(mice, **page_kwargs)
+
+    page_query = {'sort_by': sort_by, 'sort_order': sort_order}
+    if query:
+        page_query = {'search': query, **page_query}
 
     return render(request, 'home.html', {
     'page_obj': page_obj,
+    'mouse_count': mouse_count,
+    'page_query': urlencode(page_query),
     'search_query': query,
     'sort_by': sort_by,
     'sort_order': sort_order
     })
 
 
-def process_search_term(term, is_exclusion=False):
-    """Process a search term and return the appropriate query filter."""
-    
-    # Handle specific column searches with colon format
-    if ":" in term:
-        field, value = term.split(":", 1)
-        field = field.strip().lower()
-        value = value.strip()
-        
-        # Mouse ID and Tube ID searches
-        if field == "mouse_id":
-            try:
-                mouse_id = int(value)
-                return ~Q(mouse_id=mouse_id) if is_exclusion else Q(mouse_id=mouse_id)
-            except ValueError:
-                # If not a valid integer, return no results
-                return ~Q(pk__in=[]) if is_exclusion else Q(pk__in=[])
-        
-        elif field == "tube_id":
-            try:
-                tube_id = int(value)
-                return ~Q(tube_id=tube_id) if is_exclusion else Q(tube_id=tube_id)
-            except ValueError:
-                return ~Q(pk__in=[]) if is_exclusion else Q(pk__in=[])
-        
-        # Earmark searches
-        elif field == "earmark":
-            earmark_value = value.upper()
-            valid_earmarks = {"TR", "TL", "BR", "BL"}
-    
-            if earmark_value in valid_earmarks:
-                return ~Q(earmark__icontains=earmark_value) if is_exclusion else Q(earmark__icontains=earmark_value)
-            else:
-                return ~Q(pk__in=[]) if is_exclusion else Q(pk__in=[])
-        
-        # Sex searches
-        elif field == "sex":
-            sex_map = {"male": "M", "female": "F"}
-            sex_code = sex_map.get(value.lower())
-            if sex_code:
-                return ~Q(sex=sex_code) if is_exclusion else Q(sex=sex_code)
-            else:
-                return ~Q(pk__in=[]) if is_exclusion else Q(pk__in=[])
-
-        # State searches
-        elif field == "state":
-            state_value = value.lower()
-            state_map = {
-                "alive": "alive",
-                "breeding": "breeding",
-                "to be culled": "to_be_culled",
-                "deceased": "deceased"
-            }
-            internal_value = state_map.get(state_value)
-
-            if internal_value:
-                return ~Q(state=internal_value) if is_exclusion else Q(state=internal_value)
-            else:
-                return ~Q(pk__in=[]) if is_exclusion else Q(pk__in=[])
-
-        # Weaned searches
-        elif field == "weaned":
-            is_weaned = value.lower() == "yes"
-            return ~Q(weaned=is_weaned) if is_exclusion else Q(weaned=is_weaned)
-        
-        # Date field searches with various formats
-        elif field in ["dob", "clipped_date", "weaned_date", "cull_date"]:
-            try:
-                # Try to parse the date with multiple formats
-                parsed_date = parse_date_with_formats(value)
-                if parsed_date:
-                    # Create date range to search whole day (for DOB, clipped_date, weaned_date)
-                    if field != "cull_date":  # For fields without time components
-                        next_day = parsed_date + timezone.timedelta(days=1)
-                        if is_exclusion:
-                            return ~(Q(**{f"{field}__gte": parsed_date}) & Q(**{f"{field}__lt": next_day}))
-                        else:
-                            return Q(**{f"{field}__gte": parsed_date}) & Q(**{f"{field}__lt": next_day})
-                    else:  # For cull_date which includes time
-                        if is_exclusion:
-                            return ~Q(**{f"{field}__date": parsed_date})
-                        else:
-                            return Q(**{f"{field}__date": parsed_date})
-                else:
-                    return ~Q(pk__in=[]) if is_exclusion else Q(pk__in=[])  # No results if date parsing fails
-            except:
-                return ~Q(pk__in=[]) if is_exclusion else Q(pk__in=[])
-        
-        # Strain searches
-        elif field == "strain":
-            return ~Q(strain__name__icontains=value) if is_exclusion else Q(strain__name__icontains=value)
-        
-        # Default to strain search if field not recognized
-        else:
-            return ~Q(strain__name__icontains=term) if is_exclusion else Q(strain__name__icontains=term)
-    
-    # Convert shorthand formats
-    elif term.isdigit():
-        # Pure digits - search by mouse_id
-        return ~Q(mouse_id=int(term)) if is_exclusion else Q(mouse_id=int(term))
-    
-    elif re.match(r"^m\d+$", term, re.IGNORECASE):
-        # m followed by digits - search by mouse_id 
-        mouse_id = int(term[1:])
-        return ~Q(mouse_id=mouse_id) if is_exclusion else Q(mouse_id=mouse_id)
-    
-    elif re.match(r"^t\d+$", term, re.IGNORECASE):
-        # t followed by digits - search by tube_id
-        tube_id = int(term[1:])
-        return ~Q(tube_id=tube_id) if is_exclusion else Q(tube_id=tube_id)
-    
-    elif term.upper() in ["TR", "TL", "BR", "BL"]:
-        return ~Q(earmark__icontains=term.upper()) if is_exclusion else Q(earmark__icontains=term.upper())
-    
-    elif term.lower() in ["alive", "breeding", "to be culled", "deceased"]:
-        # Direct state values
-        return ~Q(state=term.lower()) if is_exclusion else Q(state=term.lower())
-    
-    elif term.lower() in ["male", "female"]:
-        sex_code = "M" if term.lower() == "male" else "F"
-        return ~Q(sex=sex_code) if is_exclusion else Q(sex=sex_code)
-
-    elif term.lower() in ["yes", "no"]:
-        # Direct weaned values
-        is_weaned = term.lower() == "yes"
-        return ~Q(weaned=is_weaned) if is_exclusion else Q(weaned=is_weaned)
-    
-    # Try to parse as a date (default to DOB search)
-    elif is_date_format(term):
-        try:
-            parsed_date = parse_date_with_formats(term)
-            if parsed_date:
-                next_day = parsed_date + timezone.timedelta(days=1)
-                if is_exclusion:
-                    return ~(Q(dob__gte=parsed_date) & Q(dob__lt=next_day))
-                else:
-                    return Q(dob__gte=parsed_date) & Q(dob__lt=next_day)
-        except:
-            pass  # If date parsing fails, fallback to strain search
-    
-    # Default to searching by strain if no specific format is recognized
-    return ~Q(strain__name__icontains=term) if is_exclusion else Q(strain__name__icontains=term)
-
-def is_date_format(text):
-    """Check if the text appears to be in a date format."""
-    # Check for various date patterns
-    date_patterns = [
-        r'\d{1,2}[-.\/]\d{1,2}[-.\/](\d{2}|\d{4})',  # dd/mm/yy or dd/mm/yyyy
-        r'\d{4}[-.\/]\d{1,2}[-.\/]\d{1,2}',          # yyyy/mm/dd
-        r'\d{1,2}[-.\/]\d{1,2}[-.\/]\d{1,2}'         # dd/mm/yy
-    ]
-    
-    for pattern in date_patterns:
-        if re.match(pattern, text):
-            return True
-    return False
-
-def parse_date_with_formats(date_string):
-    """Try to parse a date string using multiple common formats."""
-    formats = [
-        '%d.%m.%y', '%d.%m.%Y',  # 24.1.25, 24.1.2025
-        '%d/%m/%y', '%d/%m/%Y',  # 24/1/25, 24/1/2025
-        '%d-%m-%y', '%d-%m-%Y',  # 24-1-25, 24-1-2025
-        '%Y-%m-%d',              # 2025-01-24
-        '%Y/%m/%d',              # 2025/01/24
-        '%Y.%m.%d',              # 2025.01.24
-        '%m/%d/%y', '%m/%d/%Y',  # American format: 1/24/25, 1/24/2025
-        '%m-%d-%y', '%m-%d-%Y',  # American format: 1-24-25, 1-24-2025
-        '%m.%d.%y', '%m.%d.%Y',  # American format: 1.24.25, 1.24.2025
-    ]
-    
-    for fmt in formats:
-        try:
-            return datetime.strptime(date_string, fmt).date()
-        except ValueError:
-            continue
-    
-    return None
-
-
 @login_required
 def logout_user(request):
     logout(request)
@@ -397,7 +344,11 @@ def edit_profile(request):
 def notifications(request, username):
     user = get_object_or_404(User, username=username)
     notifications = Notification.objects.filter(recipient=user).order_by('created_at').reverse()
-    return render(request, 'registration/notifications.html', {'notifications': notifications})
+    notification_count = cached_count(notifications, 'notifications', user)
+    return render(request, 'registration/notifications.html', {
+        'notifications': notifications,
+        'notification_count': notification_count,
+    })
 
 @login_required
 def mark_notification_as_read(request, username, notification_id):
@@ -419,58 +370,20 @@ def delete_notification(request, notification_id):
 # Generate genetic tree
 def genetic_tree(request, mouse_id):
     mouse = get_object_or_404(Mouse, mouse_id=mouse_id)
-    
-    # Build a comprehensive genetic network for Cytoscape
-    nodes = {}
-    edges = set()
-    
-    def add_mouse_and_relations(m, highlight_id, visited):
-        if m.mouse_id in visited:
-            return
-        visited.add(m.mouse_id)
-        # Add node
-        nodes[m.mouse_id] = {
-            'id': str(m.mouse_id),
-            'label': f"Strain {m.strain} - TubeID {m.tube_id}",
-            'highlight': m.mouse_id == highlight_id
-        }
-        # Add parents and parent-child edges
-        for parent in m.get_parents():
-            if parent and parent.mouse_id not in visited:
-                nodes[parent.mouse_id] = {
-                    'id': str(parent.mouse_id),
-                    'label': f"Strain {parent.strain} - TubeID {parent.tube_id}",
-                    'highlight': parent.mouse_id == highlight_id
-                }
-                edges.add((str(parent.mouse_id), str(m.mouse_id)))
-                add_mouse_and_relations(parent, highlight_id, visited)
-                # Add siblings (children of parent)
-                for sibling in list(parent.mother_of.all()) + list(parent.father_of.all()):
-                    if sibling.mouse_id != m.mouse_id and sibling.mouse_id not in visited:
-                        nodes[sibling.mouse_id] = {
-                            'id': str(sibling.mouse_id),
-                            'label': f"Strain {sibling.strain} - TubeID {sibling.tube_id}",
-                            'highlight': sibling.mouse_id == highlight_id
-                        }
-                        edges.add((str(parent.mouse_id), str(sibling.mouse_id)))
-                        add_mouse_and_relations(sibling, highlight_id, visited)
-        # Add children and child-parent edges
-        for child in list(m.mother_of.all()) + list(m.father_of.all()):
-            if child.mouse_id not in visited:
-                nodes[child.mouse_id] = {
-                    'id': str(child.mouse_id),
-                    'label': f"Strain {child.strain} - TubeID {child.tube_id}",
-                    'highlight': child.mouse_id == highlight_id
-                }
-                edges.add((str(m.mouse_id), str(child.mouse_id)))
-                add_mouse_and_relations(child, highlight_id, visited)
-    
-    add_mouse_and_relations(mouse, mouse.mouse_id, set())
 
-    cy_data = {
-        'nodes': [{'data': n} for n in nodes.values()],
-        'edges': [{'data': {'source': s, 'target': t}} for (s, t) in edges]
-    }
+    # Optionally limit the network to a number of parent/child links from the mouse
+    radius = request.GET.get('radius')
+    if radius is not None:
+        try:
+            radius = int(radius)
+        except ValueError:
+            radius = 0
+        if radius < 1:
+            return HttpResponse("'radius' must be a positive whole number.", status=400)
+        radius = min(radius, PEDIGREE_MAX_DEPTH)
+
+    # Build the whole genetic network for Cytoscape with a single recursive query
+    cy_data = family_cytoscape_data(mouse.mouse_id, radius)
 
     return render(request, 'genetictree.html', {
         'cy_data': json.dumps(cy_data),
@@ -525,25 +438,66 @@ class MouseClass:
     @role_required(allowed_roles=['leader', 'staff', 'new_staff'])
     def view_mouse(request, mouse_id):
         if request.user.is_authenticated:
-            mouse = get_object_or_404(Mouse, mouse_id=mouse_id)
-            # Generate genetic tree data
-            def get_direct_ancestor_structure(m):
-                ancestors = []
-                for parent in m.get_parents():
-                    ancestors.append({
-                        'name': f"Strain {parent.strain} - TubeID {parent.tube_id}",
-                        'children': get_direct_ancestor_structure(parent)
-                    })
-                return ancestors
-            tree_data = {
-                'name': f"Strain {mouse.strain} - TubeID {mouse.tube_id}",
-                'children': get_direct_ancestor_structure(mouse)
-            }
-            return render(request, 'mice/mouse_details.html', {'mouse': mouse, 'tree_data': json.dumps(tree_data)})
+            mouse = get_object_or_404(Mouse.objects.select_related('strain'), mouse_id=mouse_id)
+            # Only the first few generations are sent with the page, the rest is
+            # loaded through the pedigree endpoint as the user expands nodes
+            tree_data = ancestor_tree(mouse, PEDIGREE_INITIAL_DEPTH)
+            return render(request, 'mice/mouse_details.html', {'mouse': mouse, 'tree_data': tree_data})
         else:
             messages.success(request, 'You must be logged in to view this page.')
             return redirect('index')
 
+    @login_required
+    @role_required(allowed_roles=['leader', 'staff', 'new_staff'])
+    def pedigree(request, mouse_id):
+        """Return the ancestor tree of a mouse, 'depth' generations at a time."""
+        mouse = get_object_or_404(Mouse.objects.select_related('strain'), mouse_id=mouse_id)
+        try:
+            depth = int(request.GET.get('depth', PEDIGREE_INITIAL_DEPTH))
+        except ValueError:
+            return JsonResponse({'success': False, 'message': 'Depth must be a whole number.'}, status=400)
+        return JsonResponse({'success': True, 'tree': ancestor_tree(mouse, depth)})
+
+    @login_required
+    def cage_timeline(request, mouse_id):
+        """Return every cage a mouse has been in, optionally only those overlapping 'start'..'end'."""
+        mouse = get_object_or_404(Mouse, mouse_id=mouse_id)
+        bounds = {}
+        for key in ('start', 'end'):
+            if request.GET.get(key):
+                bounds[key] = parse_moment(request.GET[key])
+                if bounds[key] is None:
+                    return JsonResponse({'success': False, 'message': f"'{key}' must be a date or date/time."}, status=400)
+
+        placements = CageHistory.objects.filter(mouse_id=mouse).overlapping(bounds.get('start'), bounds.get('end'))
+        timeline = [placement_json(p) for p in placements.order_by('start_date').values(*PLACEMENT_FIELDS)]
+        return JsonResponse({'success': True, 'mouse_id': mouse.mouse_id, 'placements': timeline})
+
+    @login_required
+    def typeahead(request):
+        """
+        Suggest up to TYPEAHEAD_LIMIT mice for 'q': a mouse ID, or the start
+        of a tube number, strain, genotype or keeper name. 'sex', 'state' and
+        'exclude_state' narrow the suggestions.
+        """
+        mice = Mouse.objects.all()
+        if request.GET.get('sex'):
+            mice = mice.filter(sex=request.GET['sex'])
+        if request.GET.getlist('state'):
+            mice = mice.filter(state__in=request.GET.getlist('state'))
+        if request.GET.getlist('exclude_state'):
+            mice = mice.exclude(state__in=request.GET.getlist('exclude_state'))
+
+        query = request.GET.get('q', '').strip()
+        if query:
+            # Prefix lookups in the full-text index, best matches first
+            ids = suggested_mouse_ids(query, TYPEAHEAD_LIMIT, mice)
+            found = mice.select_related('strain').in_bulk(ids)
+            suggestions = [found[i] for i in ids if i in found]
+        else:
+            suggestions = mice.select_related('strain').order_by('-mouse_id')[:TYPEAHEAD_LIMIT]
+        return JsonResponse({'results': [{'id': mouse.mouse_id, 'text': str(mouse)} for mouse in suggestions]})
+
     @login_required
     @role_required(allowed_roles=['leader', 'staff'])
     def add_mouse(request):
@@ -568,7 +522,43 @@ class MouseClass:
         
         return render(request, 'mice/add_mouse.html', {'form': form})
 
-    
+
+    @login_required
+    @role_required(allowed_roles=['leader', 'staff'])
+    def import_mice(request):
+        """Import a CSV/TSV of mice in bulk and show which lines were rejected."""
+        report = None
+        if request.method == 'POST':
+            form = ImportMiceForm(request.POST, request.FILES, user=request.user)
+            if form.is_valid():
+                # utf-8-sig drops the byte order mark spreadsheet programs like to add
+                file = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+                try:
+                    report = import_mice(
+                        file,
+                        user=request.user,
+                        team=form.cleaned_data['team'],
+                        create_strains=form.cleaned_data['create_strains'],
+                        dry_run=form.cleaned_data['dry_run'],
+                    )
+                except UnicodeDecodeError:
+                    form.add_error('file', 'The file must be UTF-8 encoded text.')
+                else:
+                    if form.cleaned_data['dry_run']:
+                        messages.info(request, f"Checked the file: {report.created} mice can be imported.")
+                    else:
+                        messages.success(request, f"Imported {report.created} mice.")
+        else:
+            form = ImportMiceForm(user=request.user)
+
+        return render(request, 'mice/import_mice.html', {
+            'form': form,
+            'report': report,
+            'errors': report.errors[:MAX_IMPORT_ERRORS_SHOWN] if report else [],
+            'required_columns': REQUIRED_COLUMNS,
+            'optional_columns': OPTIONAL_COLUMNS,
+        })
+
     class MouseUpdateView(UpdateView):
         model = Mouse
         form_class = AddMouseForm
@@ -676,27 +666,46 @@ class TeamClass:
     # AJAX search view for users
     @login_required
     def search_users(request):
-        query = request.GET.get('q', '')
-        users = User.objects.filter(username__icontains=query)
-        results = [{'id': user.id, 'username': user.username} for user in users]
-        return JsonResponse(results, safe=False)
+        # Usernames starting with 'q' first (served by username_prefix_idx,
+        # migration 0024), then those containing it, TYPEAHEAD_LIMIT at most
+        query = request.GET.get('q', '').strip()
+
+        def results():
+            if not query:
+                return []
+            users = User.objects.order_by('username').values('id', 'username')
+            found = list(users.filter(username__istartswith=query)[:TYPEAHEAD_LIMIT])
+            if len(found) < TYPEAHEAD_LIMIT:
+                found += users.filter(username__icontains=query).exclude(
+                    username__istartswith=query)[:TYPEAHEAD_LIMIT - len(found)]
+            return found
+
+        return cached_json(request, f"search-users:{query.lower()}:{count_version([User])}", results)
 
 class CageClass:
     @login_required
     def all_cages(request):
-        cages = Cage.objects.all()
-        cage_data = []
-
-        for cage in cages:
-            # Filter for mice currently in the cage (i.e., with no end_date)
-            current_mice = CageHistory.objects.filter(cage_id=cage, end_date__isnull=True)
-            cage_data.append({
-                'cage': cage,
-                'current_mice': [history.mouse_id for history in current_mice]
-            })
+        location = request.GET.get('location', '').strip()
+        cages = Cage.objects.order_by('cage_number')
+        if location:
+            cages = cages.filter(location=location)
+
+        # Occupants of every cage on the page come from one extra query
+        cages = cages.prefetch_related(Prefetch(
+            'current_mice',
+            queryset=Mouse.objects.only('mouse_id', 'sex', 'current_cage').order_by('mouse_id'),
+            to_attr='occupants',
+        ))
+        page_obj = Paginator(cages, CAGES_PER_PAGE).get_page(request.GET.get('page', 1))
+
+        cage_data = [{'cage': cage, 'current_mice': cage.occupants} for cage in page_obj]
 
         context = {
             'cage_data': cage_data,
+            'page_obj': page_obj,
+            'location': location,
+            'locations': Cage.objects.order_by('location').values_list('location', flat=True).distinct(),
+            'page_query': urlencode({'location': location}) if location else '',
         }
         return render(request, 'cage/all_cages.html', context)
     
@@ -720,14 +729,12 @@ class CageClass:
                 return JsonResponse({'success': False, 'message': 'Mouse not found.'}, status=404)
 
             # Check if the mouse is already in a cage
-            current_cage_history = CageHistory.objects.filter(mouse_id=mouse.mouse_id, end_date__isnull=True).first()
-
-            if current_cage_history:
+            if mouse.current_cage_id:
                 # Create a transfer request if the mouse is already in a cage
                 TransferRequest.objects.create(
                     requester=request.user,
                     mouse=mouse,
-                    source_cage=current_cage_history.cage_id,
+                    source_cage_id=mouse.current_cage_id,
                     destination_cage=cage,
                     status='pending',
                     request_date=timezone.now(),
@@ -735,7 +742,7 @@ class CageClass:
                 return JsonResponse({'success': True, 'message': 'Transfer request created successfully!'})
 
             # Mouse is not currently in a cage; add it to the new cage
-            CageHistory.objects.create(cage_id=cage, mouse_id=mouse, start_date=timezone.now(), end_date=None)
+            mouse.move_to_cage(cage)
             return JsonResponse({'success': True, 'message': 'Mouse added to cage successfully!'})
 
         return JsonResponse({'success': False, 'message': 'Invalid request method.'}, status=400)
@@ -766,7 +773,7 @@ class CageClass:
                 ~Q(cagehistory__end_date__isnull=True) | Q(cagehistory__isnull=True)
             )"""
             available_mice = Mouse.objects.exclude(
-                cagehistory__cage_id=cage_id
+                current_cage_id=cage_id
             ).exclude(
                 Q(transfer_requests__status="pending")
             )
@@ -782,14 +789,10 @@ class CageClass:
     def remove_mouse_from_cage(request, cage_id, mouse_id):
         """Remove a mouse from a cage."""
         cage = get_object_or_404(Cage, cage_id=cage_id)
-        mouse = get_object_or_404(Mouse, id=mouse_id)
+        mouse = get_object_or_404(Mouse, mouse_id=mouse_id, current_cage=cage)
 
-        # Find the CageHistory entry for the specific mouse in the cage
-        cage_history_entry = get_object_or_404(CageHistory, cage_id=cage, mouse_id=mouse, end_date=None)
-
-        # Set the end_date to now, effectively removing the mouse from the cage
-        cage_history_entry.end_date = timezone.now()
-        cage_history_entry.save()
+        # Close the open CageHistory entry, effectively removing the mouse from the cage
+        mouse.leave_cage()
 
         return redirect('cage_details', cage_id=cage.cage_id)
 
@@ -799,7 +802,7 @@ class CageClass:
         cage = get_object_or_404(Cage, cage_id=cage_id)
 
         # Get all current mice in this cage
-        current_mice = cage.cagehistory_set.filter(end_date=None).select_related('mouse_id')
+        current_mice = cage.current_mice.select_related('strain')
 
         # Get the pending transfer requests for this cage (destination_cage = current cage)
         pending_transfers = TransferRequest.objects.filter(destination_cage=cage, status='pending')
@@ -811,6 +814,48 @@ class CageClass:
         }
         return render(request, 'cage/cage_details.html', context)
     
+    @login_required
+    def cage_census(request):
+        """
+        List the mice in a cage, or in every cage at a location, at a point in
+        time ('at', default now) or at any time during a day ('on').
+        """
+        cage_id = request.GET.get('cage')
+        location = request.GET.get('location')
+        if bool(cage_id) == bool(location):
+            return JsonResponse({'success': False, 'message': 'Give either a cage or a location.'}, status=400)
+        if cage_id and not cage_id.isdigit():
+            return JsonResponse({'success': False, 'message': 'Cage must be a numeric cage ID.'}, status=400)
+
+        placements = CageHistory.objects.in_cage(cage_id) if cage_id else CageHistory.objects.at_location(location)
+        if request.GET.get('on'):
+            try:
+                day = parse_date(request.GET['on'])
+            except ValueError:   # well formed but not a real date, e.g. 2025-02-30
+                day = None
+            if day is None:
+                return JsonResponse({'success': False, 'message': "'on' must be a date (YYYY-MM-DD)."}, status=400)
+            start = timezone.make_aware(dt.datetime.combine(day, dt.time.min))
+            placements = placements.overlapping(start, start + dt.timedelta(days=1))
+            moment = start
+        else:
+            moment = parse_moment(request.GET['at']) if request.GET.get('at') else timezone.now()
+            if moment is None:
+                return JsonResponse({'success': False, 'message': "'at' must be a date or date/time."}, status=400)
+            placements = placements.at(moment)
+
+        cages = {}
+        for placement in placements.order_by('cage_id__cage_number', 'mouse_id', 'start_date').values(*PLACEMENT_FIELDS):
+            cage = cages.setdefault(placement['cage_id'], {
+                'cage_id': placement['cage_id'],
+                'cage_number': placement['cage_id__cage_number'],
+                'location': placement['cage_id__location'],
+                'mice': [],
+            })
+            cage['mice'].append(placement_json(placement))
+
+        return JsonResponse({'success': True, 'at': moment.isoformat(), 'cages': list(cages.values())})
+
     # Cage creation view
     @login_required
     @role_required(allowed_roles=['leader'])
@@ -822,29 +867,22 @@ class CageClass:
                 mouse_ids = request.POST.getlist('mice')  # Get selected mouse IDs
 
                 for mouse_id in mouse_ids:
-                    mouse = Mouse.objects.get(id=mouse_id)
+                    mouse = Mouse.objects.get(mouse_id=mouse_id)
                     
                     # Check if the mouse is already in a different cage
-                    current_cage_history = CageHistory.objects.filter(mouse_id=mouse, end_date__isnull=True).first()
-                    
-                    if current_cage_history:
+                    if mouse.current_cage_id:
                         # Mouse is already in a cage - create a transfer request
                         TransferRequest.objects.create(
                             requester=request.user,
                             mouse=mouse,
-                            source_cage=current_cage_history.cage_id,
+                            source_cage_id=mouse.current_cage_id,
                             destination_cage=cage,
                             status='pending',
                             request_date=timezone.now(),
                         )
                     else:
                         # Mouse is not in any cage, so add it directly
-                        CageHistory.objects.create(
-                            cage_id=cage,
-                            mouse_id=mouse,
-                            start_date=timezone.now(),
-                            end_date=None
-                        )
+                        mouse.move_to_cage(cage)
 
                 return redirect('cages')  # Redirect to the cage list
         else:
@@ -875,46 +913,109 @@ class CageClass:
         
     #     return JsonResponse(results, safe=False)
     
+    @login_required
+    def typeahead(request):
+        """Suggest up to TYPEAHEAD_LIMIT cages whose number starts with 'q'."""
+        # The prefix match is served by cage_number_prefix_idx (migration 0023)
+        cages = Cage.objects.order_by('cage_number')
+        query = request.GET.get('q', '').strip()
+        if query:
+            cages = cages.filter(cage_number__istartswith=query)
+        results = [{'id': cage_id, 'text': number} for cage_id, number in cages.values_list('cage_id', 'cage_number')[:TYPEAHEAD_LIMIT]]
+        return JsonResponse({'results': results})
+
     @login_required
     def search_mice(request):
-        query = request.GET.get('q', '')
-        mice = Mouse.objects.filter(state__icontains=query)
-        results = [{'mouse_id': mouse.mouse_id, 'sex': mouse.sex} for mouse in mice]
-        return JsonResponse(results, safe=False)
+        # Same matching as MouseClass.typeahead: the mouse with ID 'q', then
+        # prefix matches from the full-text index, TYPEAHEAD_LIMIT at most
+        query = request.GET.get('q', '').strip()
+
+        def results():
+            if not query:
+                return []
+            ids = suggested_mouse_ids(query, TYPEAHEAD_LIMIT)
+            rows = Mouse.objects.filter(mouse_id__in=ids).values('mouse_id', 'tube_id', 'strain__name', 'sex', 'state')
+            found = {row['mouse_id']: row for row in rows}
+            return [
+                {
+                    'id': row['mouse_id'], 'mouse_id': row['mouse_id'], 'tube_id': row['tube_id'],
+                    'strain': row['strain__name'], 'sex': row['sex'], 'state': row['state'],
+                }
+                for row in (found.get(mouse_id) for mouse_id in ids) if row
+            ]
+
+        versions = count_version([Mouse, MouseKeeper, Strain, CageHistory, User])
+        return cached_json(request, f"search-mice:{query.lower()}:{versions}", results)
     
 class AllRequestsClass:
     @login_required
     # @role_required(allowed_roles=["breeder"])
     def all_requests(request):
-        # Filter requests based on user role
-        if request.user.role == 'breeder':
-            # If the user is a breeder, show all requests
-            transfers = TransferRequest.objects.all().exclude(status="completed").exclude(status="rejected")
-            breedings = BreedingRequest.objects.all().exclude(status="completed").exclude(status="rejected")
-            cullings = CullingRequest.objects.all().exclude(status="completed").exclude(status="rejected")
-            completed_transfers = TransferRequest.objects.all().exclude(status="pending").exclude(status="approved")
-            completed_breedings = BreedingRequest.objects.all().exclude(status="pending").exclude(status="approved")
-            completed_cullings = CullingRequest.objects.all().exclude(status="pending").exclude(status="approved")
-        else:
-            # If the user is not a breeder, show only their requests
-            transfers = TransferRequest.objects.filter(requester=request.user).exclude(status="completed").exclude(status="rejected")
-            breedings = BreedingRequest.objects.filter(requester=request.user).exclude(status="completed").exclude(status="rejected")
-            cullings = CullingRequest.objects.filter(requester=request.user).exclude(status="completed").exclude(status="rejected")
-            completed_transfers = TransferRequest.objects.filter(requester=request.user).exclude(status="pending").exclude(status="approved")
-            completed_breedings = BreedingRequest.objects.filter(requester=request.user).exclude(status="pending").exclude(status="approved")
-            completed_cullings = CullingRequest.objects.filter(requester=request.user).exclude(status="pending").exclude(status="approved")
-        
-        context = {
-            "current_transfers": transfers,
-            "current_breedings": breedings,
-            "current_cullings": cullings,
-            "completed_transfers": completed_transfers,
-            "completed_breedings": completed_breedings,
-            "completed_cullings": completed_cullings,
-        }
+        # Breeders see every request, everyone else only their own
+        requester = None if request.user.role == 'breeder' else request.user
+        context = {"counts": {}}
+        query = {key: request.GET[key] for key in ('current_page', 'completed_page') if key in request.GET}
+        for section in request_inbox.SECTIONS:
+            requests = request_inbox.section_requests(section, requester)
+            for request_type, queryset in requests.items():
+                name = f"{section}_{request_type}s"
+                context[name] = queryset
+                # Breeders all see the same lists, so they share the cached counts
+                context["counts"][name] = cached_count(queryset, f"requests:{name}", requester)
+
+            # Each section pages on its own, keeping the other's page in its links
+            try:
+                number = max(int(request.GET.get(f"{section}_page", 1)), 1)
+            except ValueError:
+                number = 1
+            context[f"{section}_page_obj"] = request_inbox.inbox_page(section, requests, number, REQUESTS_PER_PAGE)
+            context[f"{section}_page_query"] = urlencode({key: value for key, value in query.items() if key != f"{section}_page"})
 
         return render(request, 'requests/all_requests.html', context)
 
+    @login_required
+    @role_required(allowed_roles=['breeder'])
+    def bulk_action(request):
+        """
+        Approve or reject many requests at once. Takes 'action' and 'requests'
+        ("transfer:12", "culling:5", ...) from the request list's form, or
+        {"action": ..., "requests": [{"type": ..., "id": ...}]} as JSON, which
+        is answered with a result per request.
+        """
+        if request.method != 'POST':
+            return JsonResponse({'success': False, 'message': 'Use POST.'}, status=405)
+
+        as_json = request.content_type == 'application/json'
+        try:
+            if as_json:
+                data = json.loads(request.body)
+                action = data.get('action')
+                items = [(str(item['type']), int(item['id'])) for item in data.get('requests', [])]
+            else:
+                action = request.POST.get('action')
+                items = [
+                    (request_type, int(request_id))
+                    for request_type, _, request_id in (value.partition(':') for value in request.POST.getlist('requests'))
+                ]
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return JsonResponse({'success': False, 'message': 'Requests must be given as type and numeric id.'}, status=400)
+        if action not in ('approve', 'reject'):
+            return JsonResponse({'success': False, 'message': "Action must be 'approve' or 'reject'."}, status=400)
+        if len(items) > MAX_BULK_REQUESTS:
+            return JsonResponse({'success': False, 'message': f'At most {MAX_BULK_REQUESTS} requests at a time.'}, status=400)
+
+        results = request_workflow.bulk_transition(items, action)
+        if as_json:
+            return JsonResponse({'success': True, 'results': [result._asdict() for result in results]})
+
+        done = sum(result.ok for result in results)
+        if done:
+            messages.success(request, f"{done} request{'s' if done != 1 else ''} {'approved' if action == 'approve' else 'rejected'}.")
+        for result in results:
+            if not result.ok:
+                messages.error(request, f"{result.request_type.capitalize()} request {result.request_id}: {result.message}")
+        return redirect('all_requests')
+
 class TransferRequestClass:
     @login_required
     @role_required(allowed_roles=['leader'])
@@ -950,83 +1051,30 @@ class TransferRequestClass:
     @role_required(allowed_roles=['breeder'])
     def approve_transfer_request(request, transfer_id):
         """Approve a transfer request and move the mouse to the new cage."""
-        transfer_request = get_object_or_404(TransferRequest, id=transfer_id)
-
-        if transfer_request.status == 'pending':
-            # Complete the transfer: close current CageHistory and create a new one
-            current_cage_history = CageHistory.objects.filter(
-                mouse_id=transfer_request.mouse,
-                cage_id=transfer_request.source_cage,
-                end_date__isnull=True
-            ).first()
-
-            if current_cage_history:
-                current_cage_history.end_date = timezone.now()
-                current_cage_history.save()
-
-            # Start a new CageHistory for the destination cage
-            CageHistory.objects.create(
-                cage_id=transfer_request.destination_cage,
-                mouse_id=transfer_request.mouse,
-                start_date=timezone.now(),
-                end_date=None
-            )
-
-            # Mark the transfer request as completed
-            transfer_request.status = 'completed'
-            transfer_request.save()
-        
-        # Create a notification object to notify the requester about the approval
-        Notification.objects.create(
-            recipient=transfer_request.requester,
-            message=f"Your transfer request for {transfer_request.mouse} has been approved.",
-            created_at=timezone.now(),
-            request_type = 'transfer',
-        )
-
-        return redirect('all_requests')  # Redirect to a list of all requests
+        get_object_or_404(TransferRequest, id=transfer_id)
+        return _apply_transition(request, TransferRequest, transfer_id, 'approve')
     
     @login_required
     @role_required(allowed_roles=['breeder'])
     def reject_transfer_request(request, transfer_id):
         """Reject a transfer request, leaving the mouse in its original cage."""
-        transfer_request = get_object_or_404(TransferRequest, id=transfer_id)
-
-        if transfer_request.status == 'pending':
-            transfer_request.status = 'rejected'
-            transfer_request.save()
-        
-        # Create a notification object to notify the requester about the rejected
-        Notification.objects.create(
-            recipient=transfer_request.requester,
-            message=f"Your transfer request for {transfer_request.mouse} has been rejected.",
-            created_at=timezone.now(),
-            request_type = 'transfer',
-        )
-
-        return redirect('all_requests')
+        get_object_or_404(TransferRequest, id=transfer_id)
+        return _apply_transition(request, TransferRequest, transfer_id, 'reject')
     
     def get_transfer_data(request):
         if request.method == 'GET':
             mouse_id = request.GET.get('mouse_id')
-            current_cage_id = None
-            destination_cages = []
+            current_cage = None
 
             if mouse_id:
-                # Get the current cage for the selected mouse
-                current_cage_history = CageHistory.objects.filter(
-                    mouse_id=mouse_id,
-                    end_date__isnull=True
-                ).first()
-
-                if current_cage_history:
-                    current_cage_id = current_cage_history.cage_id.cage_id
-                    # Get all cages except the current cage for destination
-                    destination_cages = Cage.objects.exclude(cage_id=current_cage_id).values('cage_id', 'cage_number', 'cage_type')
+                # Get the current cage for the selected mouse; the destination
+                # is picked through the cage typeahead
+                current_cage = Mouse.objects.filter(mouse_id=mouse_id).values_list(
+                    'current_cage_id', 'current_cage__cage_number').first()
 
             return JsonResponse({
-                'current_cage_id': current_cage_id,
-                'destination_cages': list(destination_cages)
+                'current_cage_id': current_cage[0] if current_cage else None,
+                'current_cage_number': current_cage[1] if current_cage else None,
             })
     
 class BreedingRequestClass:
@@ -1039,12 +1087,32 @@ class BreedingRequestClass:
                 breeding_request = form.save(commit=False)
                 breeding_request.requester = request.user  # Set the requester to the current user
                 breeding_request.save()
+                # Warn when the offspring would be noticeably inbred
+                if form.kinship is not None and form.kinship >= KINSHIP_WARNING_THRESHOLD:
+                    messages.warning(request, f"The selected mice are closely related (kinship coefficient {form.kinship:.3f}).")
                 return redirect('all_requests')  # Redirect after successful submission
         else:
             form = BreedingRequestForm()
         
         return render(request, 'requests/create_breeding_request.html', {'form': form})
     
+    @login_required
+    def breeding_pair_kinship(request):
+        """Return the kinship coefficient of a male and female mouse as JSON."""
+        try:
+            male_id = int(request.GET['male_mouse'])
+            female_id = int(request.GET['female_mouse'])
+        except (KeyError, ValueError):
+            return JsonResponse({'success': False, 'message': 'Give numeric male_mouse and female_mouse IDs.'}, status=400)
+        male = get_object_or_404(Mouse, mouse_id=male_id, sex='M')
+        female = get_object_or_404(Mouse, mouse_id=female_id, sex='F')
+        kinship = pair_kinship(male, female)
+        return JsonResponse({
+            'success': True,
+            'kinship': kinship,
+            'warning': kinship >= KINSHIP_WARNING_THRESHOLD,
+        })
+
     @login_required
     def cancel_breeding_request(request, breeding_id):
         breeding_request = get_object_or_404(BreedingRequest, id=breeding_id)
@@ -1064,83 +1132,15 @@ class BreedingRequestClass:
     @role_required(allowed_roles=['breeder'])
     def approve_breeding_request(request, breeding_id):
         """Approve a breeding request and move both mice to the breeding cage."""
-        breeding_request = get_object_or_404(BreedingRequest, id=breeding_id)
-
-        if breeding_request.status == 'pending':
-            # Check if both mice are currently in different cages and available for breeding
-            for mouse in [breeding_request.male_mouse, breeding_request.female_mouse]:
-                current_cage_history = CageHistory.objects.filter(
-                    mouse_id=mouse,
-                    end_date__isnull=True
-                ).first()
-
-                if current_cage_history:
-                    # Set the end date of the current cage history entry to mark the mouse leaving
-                    current_cage_history.end_date = timezone.now()
-                    current_cage_history.save()
-
-            # Start new CageHistory entries for both mice in the breeding cage
-            CageHistory.objects.create(
-                cage_id=breeding_request.cage,
-                mouse_id=breeding_request.male_mouse,
-                start_date=timezone.now(),
-                end_date=None
-            )
-
-            CageHistory.objects.create(
-                cage_id=breeding_request.cage,
-                mouse_id=breeding_request.female_mouse,
-                start_date=timezone.now(),
-                end_date=None
-            )
-
-            # Update the status of the mice to 'breeding'
-            breeding_request.male_mouse.state = 'breeding'
-            breeding_request.female_mouse.state = 'breeding'
-            breeding_request.male_mouse.save()
-            breeding_request.female_mouse.save()
-
-            # Mark the breeding request as completed
-            breeding_request.status = 'completed'
-            breeding_request.save()
-
-            # Create a Breed object matching the request data
-            Breed.objects.create(
-                male=breeding_request.male_mouse,
-                female=breeding_request.female_mouse,
-                cage=breeding_request.cage,
-                start_date=timezone.now(),
-            )
-
-        # Create a notification object to notify the requester about the approval
-        Notification.objects.create(
-            recipient=breeding_request.requester,
-            message=f"Your breeding request for {breeding_request.male_mouse} and {breeding_request.female_mouse} has been approved.",
-            created_at=timezone.now(),
-            request_type = 'breeding',
-        )
-
-        return redirect('all_requests')  # Redirect to a list of all requests
+        get_object_or_404(BreedingRequest, id=breeding_id)
+        return _apply_transition(request, BreedingRequest, breeding_id, 'approve')
 
     @login_required
     @role_required(allowed_roles=['breeder'])
     def reject_breeding_request(request, breeding_id):
         """Reject a breeding request, leaving both mice in their original cages."""
-        breeding_request = get_object_or_404(BreedingRequest, id=breeding_id)
-
-        if breeding_request.status == 'pending':
-            breeding_request.status = 'rejected'
-            breeding_request.save()
-        
-        # Notify the requester about the rejection
-        Notification.objects.create(
-            recipient=breeding_request.requester,
-            message=f"Your breeding request for {breeding_request.male_mouse} and {breeding_request.female_mouse} has been rejected.",
-            created_at=timezone.now(),
-            request_type = 'breeding',
-        )
-
-        return redirect('all_requests')
+        get_object_or_404(BreedingRequest, id=breeding_id)
+        return _apply_transition(request, BreedingRequest, breeding_id, 'reject')
 
 class CullingRequestClass:
     @login_required
@@ -1177,59 +1177,15 @@ class CullingRequestClass:
     @role_required(allowed_roles=['breeder'])
     def approve_culling_request(request, culling_id):
         """Approve a culling request and mark the mouse as deceased."""
-        culling_request = get_object_or_404(CullingRequest, id=culling_id)
-
-        if culling_request.status == 'pending':
-            # Retrieve the current cage history of the mouse, if it exists
-            current_cage_history = CageHistory.objects.filter(
-                mouse_id=culling_request.mouse,
-                end_date__isnull=True
-            ).first()
-
-            if current_cage_history:
-                # End the current cage history, as the mouse is being culled
-                current_cage_history.end_date = timezone.now()
-                current_cage_history.save()
-
-            # Mark the mouse as deceased and set the cull date
-            culling_request.mouse.state = 'deceased'
-            culling_request.mouse.cull_date = timezone.now()
-            culling_request.mouse.save()
-
-            # Mark the culling request as completed
-            culling_request.status = 'completed'
-            culling_request.save()
-        
-        # Create a notification object to notify the requester about the approval
-        Notification.objects.create(
-            recipient=culling_request.requester,
-            message=f"Your culling request for {culling_request.mouse} has been approved.",
-            created_at=timezone.now(),
-            request_type = 'culling',
-        )
-
-        return redirect('all_requests')  # Redirect to a list of all requests
+        get_object_or_404(CullingRequest, id=culling_id)
+        return _apply_transition(request, CullingRequest, culling_id, 'approve')
 
     @login_required
     @role_required(allowed_roles=['breeder'])
     def reject_culling_request(request, culling_id):
         """Reject a culling request, leaving the mouse in its original cage."""
-        culling_request = get_object_or_404(CullingRequest, id=culling_id)
-
-        if culling_request.status == 'pending':
-            # Set the culling request status to rejected
-            culling_request.status = 'rejected'
-            culling_request.save()
-
-        # Create a notification object to notify the requester about the approval
-        Notification.objects.create(
-            recipient=culling_request.requester,
-            message=f"Your culling request for {culling_request.mouse} has been rejected.",
-            created_at=timezone.now(),
-            request_type = 'culling',
-        )
-
-        return redirect('all_requests')
+        get_object_or_404(CullingRequest, id=culling_id)
+        return _apply_transition(request, CullingRequest, culling_id, 'reject')
     
 class BreedingsClass:
     @login_required
@@ -1239,8 +1195,34 @@ class BreedingsClass:
         # Separate breedings into current and completed
         current_breedings = breedings.filter(end_date__isnull=True)
         completed_breedings = breedings.filter(end_date__isnull=False)
-        return render(request, 'breeding/breeds.html', {'current_breedings': current_breedings, 'completed_breedings': completed_breedings})
+        return render(request, 'breeding/breeds.html', {
+            'current_breedings': current_breedings,
+            'completed_breedings': completed_breedings,
+            'current_count': cached_count(current_breedings, 'breedings:current'),
+            'completed_count': cached_count(completed_breedings, 'breedings:completed'),
+        })
     
+    @login_required
+    def recommended_pairs(request):
+        """Return the best available breeding pairs of a strain as JSON."""
+        try:
+            strain_id = int(request.GET['strain'])
+        except (KeyError, ValueError):
+            return JsonResponse({'success': False, 'message': 'Give a numeric strain ID.'}, status=400)
+        strain = get_object_or_404(Strain, id=strain_id)
+
+        target_genotype = request.GET.get('genotype') or None
+        if target_genotype not in (None, 'wt', 'ht', 'ko'):
+            return JsonResponse({'success': False, 'message': 'Genotype must be one of wt, ht or ko.'}, status=400)
+
+        try:
+            limit = min(int(request.GET.get('limit', 10)), MAX_RECOMMENDED_PAIRS)
+        except ValueError:
+            return JsonResponse({'success': False, 'message': 'Limit must be a whole number.'}, status=400)
+
+        pairs = recommend_pairs(strain.id, target_genotype=target_genotype, limit=max(limit, 1))
+        return JsonResponse({'success': True, 'strain': strain.name, 'pairs': pairs})
+
     @login_required
     @role_required(allowed_roles=['breeder'])
     def end_breeding(request, breeding_id):